@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.models.purchase import Purchase, PurchaseStatus
 from datetime import date
+import uuid
 
 router = APIRouter()
 
@@ -49,7 +50,7 @@ async def create_purchase(
 ):
     """Create a manual purchase."""
     # TODO: Get user_id from auth
-    user_id = "00000000-0000-0000-0000-000000000000"
+    user_id = uuid.UUID("00000000-0000-0000-0000-000000000000")
     
     purchase = Purchase(
         user_id=user_id,
@@ -80,9 +81,10 @@ async def upload_invoice(
     """Upload invoice PDF for processing."""
     import os
     from app.core.config import settings
+    from app.core.uploads import save_upload
     
     # TODO: Get user_id from auth
-    user_id = "00000000-0000-0000-0000-000000000000"
+    user_id = uuid.UUID("00000000-0000-0000-0000-000000000000")
     
     # Save file
     upload_dir = os.path.join(settings.UPLOAD_DIR, "invoices")
@@ -90,9 +92,8 @@ async def upload_invoice(
     
     file_path = os.path.join(upload_dir, f"{date.today().isoformat()}_{file.filename}")
     
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Stream to disk in chunks instead of reading the whole file into memory
+    await save_upload(file, file_path, settings.MAX_UPLOAD_SIZE)
     
     # Create purchase
     purchase = Purchase(
@@ -107,8 +108,14 @@ async def upload_invoice(
     await db.commit()
     await db.refresh(purchase)
     
-    # TODO: Queue Celery task to process invoice
-    # process_invoice_task.delay(str(purchase.id))
+    # Extraction, parsing, item creation and matching run in the worker;
+    # progress shows up in status and invoice_parsed_data["stages"] (status
+    # "failed" if a stage gives up). Imported on first upload so the Celery
+    # app and its task modules stay out of API startup; the matching model
+    # itself only loads in the worker (ml_tasks.get_model).
+    from app.workers.invoice_processor import process_invoice
+
+    process_invoice.delay(str(purchase.id))
     
     return {
         "purchase_id": str(purchase.id),
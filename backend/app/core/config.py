@@ -21,6 +21,8 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
+    CELERY_TASK_ALWAYS_EAGER: bool = False  # Run tasks inline (tests, no Redis)
+    INVOICE_TASK_MAX_RETRIES: int = 3
     
     # JWT
     JWT_SECRET_KEY: str
@@ -32,6 +34,11 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     
+    # PDF text extraction
+    PDF_WORKERS: int = 2  # Processes per invoice worker for long PDFs (not under prefork)
+    PDF_PARALLEL_MIN_PAGES: int = 8
+    PDF_FAST_TEXT_LAYER: bool = True  # PyPDF2 for pages with a clean text layer
+    
     # ML Models
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     SIMILARITY_THRESHOLD: float = 0.75
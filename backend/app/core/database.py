@@ -1,5 +1,6 @@
+from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.pool import NullPool
 from app.core.config import settings
 
@@ -20,6 +21,21 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+# Sync engine for Celery workers (tasks run outside the event loop)
+sync_engine = create_engine(
+    settings.DATABASE_SYNC_URL,
+    echo=settings.DEBUG,
+    pool_pre_ping=True,
+    future=True
+)
+
+SyncSessionLocal = sessionmaker(
+    sync_engine,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+)
+
 # Base class for models
 Base = declarative_base()
 
@@ -0,0 +1,40 @@
+"""Streaming file upload handling."""
+import os
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+async def save_upload(file: UploadFile, file_path: str, max_size: int) -> int:
+    """
+    Stream an upload to file_path in chunks and return its size.
+
+    Raises 413 as soon as more than max_size bytes have been copied; the
+    partial file is removed and file_path is left untouched.
+    """
+    return await run_in_threadpool(_copy_upload, file.file, file_path, max_size)
+
+
+def _copy_upload(source, file_path: str, max_size: int) -> int:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".part")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            source.seek(0)
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum upload size of {max_size} bytes"
+                    )
+                f.write(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return size
@@ -13,6 +13,7 @@ class PurchaseStatus(str, enum.Enum):
     PROCESSED = "processed"
     MATCHED = "matched"
     COMPLETED = "completed"
+    FAILED = "failed"
 
 
 class Purchase(Base):
@@ -0,0 +1,155 @@
+"""Text extraction from invoice PDFs.
+
+Pages are split into contiguous ranges that worker processes extract in
+parallel; the page texts are joined once at the end. Pages with a clean text
+layer go through PyPDF2, which reads the content stream without pdfplumber's
+per-character layout work. Pages where that text looks broken (missing
+glyph mappings, no word spacing) fall back to pdfplumber.
+
+The page-range pool needs a caller that may start processes: the invoice
+worker runs with Celery's threads pool (see docker-compose.yml) and shares
+one pool between its task threads. A prefork child is daemonic and cannot
+have children, so there every document is extracted in-process.
+"""
+import atexit
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+# Ranges handed out per worker: a little over one so a slow range
+# (scanned page, big table) does not leave the other workers idle
+CHUNKS_PER_WORKER = 2
+
+# Glyphs without a unicode mapping: "(cid:42)" from pdfminer, U+FFFD from PyPDF2
+_BROKEN_GLYPHS = re.compile(r"\(cid:\d+\)|\ufffd")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+# Celery's threads pool runs several tasks at once in this process
+_executor_lock = threading.Lock()
+
+
+def extract_pdf_text(
+    file_path: str,
+    workers: int = 1,
+    min_parallel_pages: int = 8,
+    fast_text_layer: bool = True,
+) -> str:
+    """
+    Text of every page of the PDF, pages separated by a newline.
+
+    Documents shorter than min_parallel_pages (or workers <= 1) are extracted
+    in-process: starting the pool costs more than it saves on a short invoice.
+    So is everything inside a daemonic process (a Celery prefork child),
+    which is not allowed to start children of its own.
+    """
+    page_count = pdf_page_count(file_path)
+    if page_count == 0:
+        return ""
+    if workers <= 1 or page_count < min_parallel_pages or multiprocessing.current_process().daemon:
+        return "\n".join(extract_page_range(file_path, 0, page_count, fast_text_layer))
+
+    ranges = page_ranges(page_count, workers * CHUNKS_PER_WORKER)
+    executor = None
+    try:
+        executor = _get_executor(workers)
+        futures = [
+            executor.submit(extract_page_range, file_path, first, last, fast_text_layer)
+            for first, last in ranges
+        ]
+        pages = [text for future in futures for text in future.result()]
+    except (BrokenProcessPool, AssertionError, OSError):
+        # A worker died (out of memory on a huge scan) or the pool could not
+        # start its processes: start a fresh pool next time and do this
+        # document in-process
+        _shutdown_executor(executor)
+        pages = extract_page_range(file_path, 0, page_count, fast_text_layer)
+    return "\n".join(pages)
+
+
+def pdf_page_count(file_path: str) -> int:
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def page_ranges(page_count: int, chunks: int) -> List[Tuple[int, int]]:
+    """[first, last) ranges covering all pages, as even as possible."""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    first = 0
+    for index in range(chunks):
+        last = first + size + (1 if index < extra else 0)
+        ranges.append((first, last))
+        first = last
+    return ranges
+
+
+def extract_page_range(file_path: str, first: int, last: int, fast_text_layer: bool = True) -> List[str]:
+    """Texts of pages [first, last); runs in the worker processes."""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path) if fast_text_layer else None
+    plumber = None
+    texts = []
+    try:
+        for index in range(first, last):
+            text = None
+            if reader is not None:
+                try:
+                    text = reader.pages[index].extract_text()
+                except Exception:
+                    text = None
+                if not has_clean_text(text):
+                    text = None
+            if text is None:
+                if plumber is None:
+                    import pdfplumber
+
+                    plumber = pdfplumber.open(file_path)
+                text = plumber.pages[index].extract_text() or ""
+            texts.append(text)
+    finally:
+        if plumber is not None:
+            plumber.close()
+    return texts
+
+
+def has_clean_text(text: Optional[str]) -> bool:
+    """True if PyPDF2's text can be used as is: every glyph mapped and words spaced."""
+    if not text or not text.strip():
+        return False
+    if _BROKEN_GLYPHS.search(text):
+        return False
+    # Some generators position every word separately and PyPDF2 glues them
+    # together; pdfplumber recovers the spaces from the character positions
+    return sum(char.isspace() for char in text) >= len(text) * 0.05
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: Celery workers hold database connections and threads that
+            # must not be copied into the children
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def _shutdown_executor(executor: Optional[ProcessPoolExecutor] = None) -> None:
+    """Shut down the shared pool (only if it is still `executor`, when given)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and (executor is None or executor is _executor):
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(_shutdown_executor)
@@ -11,7 +11,12 @@ celery_app.conf.task_routes = {
     "app.workers.invoice_processor.*": "main-queue",
 }
 
-celery_app.conf.update(task_track_started=True)
+celery_app.conf.update(
+    task_track_started=True,
+    # Eager mode runs the whole chain inline, retries included; leave
+    # task_eager_propagates off or a retry surfaces as celery.exceptions.Retry
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+)
 
 # Import tasks
 from app.workers import invoice_processor  # noqa
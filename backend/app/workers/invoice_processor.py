@@ -1,74 +1,321 @@
-"""Invoice processing tasks."""
-from app.workers.celery_app import celery_app
-import pdfplumber
+"""Invoice processing tasks.
+
+The pipeline is a Celery chain of four stages, each passing the purchase id
+to the next:
+
+    extract_invoice_text -> parse_invoice -> create_purchase_items -> match_purchase_items
+
+Every stage records its outcome in ``Purchase.invoice_parsed_data["stages"]``
+and skips itself if it already finished, so re-dispatching a purchase (or a
+retried task) never extracts twice or creates duplicate items. Writes happen
+under a row lock on the purchase, in the same transaction as the stage mark.
+"""
 import re
-from decimal import Decimal
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from celery import Task, chain
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.core.database import SyncSessionLocal
+from app.models.ingredient import Ingredient
+from app.models.purchase import Purchase, PurchaseItem, PurchaseStatus
+from app.services.pdf_text import extract_pdf_text
+from app.workers.celery_app import celery_app
+from app.workers import ml_tasks
+
+STAGES = ("extract", "parse", "items", "match")
+
+# Candidates kept per invoice line (best one decides the match)
+MATCH_TOP_K = 3
+
+# Transient failures worth retrying (database restarts, lost connections)
+RETRYABLE_ERRORS = (OperationalError,)
+
+
+class PurchaseNotFound(Exception):
+    pass
+
+
+class InvoiceStageTask(Task):
+    """Base task for pipeline stages: records permanent failures on the purchase (stage and status)."""
+
+    autoretry_for = RETRYABLE_ERRORS
+    retry_backoff = True
+    retry_jitter = True
+    max_retries = settings.INVOICE_TASK_MAX_RETRIES
+    stage: str = None
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if not args or isinstance(exc, PurchaseNotFound):
+            return
+        try:
+            with _locked_purchase(args[0]) as purchase:
+                purchase.status = PurchaseStatus.FAILED
+                _mark_stage(purchase, self.stage, "failed", error=str(exc))
+        except Exception:
+            # The database itself may be the reason the task failed
+            pass
 
 
 @celery_app.task(name="app.workers.invoice_processor.process_invoice")
 def process_invoice(purchase_id: str):
     """Process invoice PDF and extract data."""
-    # TODO: Implement full invoice processing
-    # 1. Load purchase from DB
-    # 2. Extract text from PDF with pdfplumber
-    # 3. Parse with regex
-    # 4. Create purchase items
-    # 5. Match with ML embeddings
-    # 6. Update purchase status
-    
-    print(f"Processing invoice for purchase {purchase_id}")
-    return {"status": "completed", "purchase_id": purchase_id}
+    with SyncSessionLocal() as db:
+        purchase = db.get(Purchase, uuid.UUID(purchase_id))
+        if purchase is None:
+            return {"status": "not_found", "purchase_id": purchase_id}
+        if _stage_status(purchase, STAGES[-1]) == "done":
+            return {"status": "completed", "purchase_id": purchase_id}
+
+    pipeline = chain(
+        extract_invoice_text.s(purchase_id),
+        parse_invoice.s(),
+        create_purchase_items.s(),
+        match_purchase_items.s(),
+    )
+    result = pipeline.apply_async()
+    return {"status": "queued", "purchase_id": purchase_id, "task_id": result.id}
+
+
+@celery_app.task(
+    name="app.workers.invoice_processor.extract_invoice_text",
+    base=InvoiceStageTask,
+    bind=True,
+    stage="extract",
+)
+def extract_invoice_text(self, purchase_id: str) -> str:
+    """Stage 1: text of the uploaded PDF."""
+    with _locked_purchase(purchase_id) as purchase:
+        if _stage_status(purchase, self.stage) == "done":
+            return purchase_id
+        file_path = purchase.invoice_file_path
+        if not file_path:
+            raise ValueError("Purchase has no invoice file")
+        purchase.status = PurchaseStatus.PROCESSING
+        _mark_stage(purchase, self.stage, "running")
+
+    # Extraction can take a while: done outside the row lock. It is pure, so
+    # a concurrent duplicate run only wastes time, the first write wins.
+    text = extract_text_from_pdf(file_path)
+
+    with _locked_purchase(purchase_id) as purchase:
+        if _stage_status(purchase, self.stage) != "done":
+            _mark_stage(purchase, self.stage, "done", text=text)
+    return purchase_id
+
+
+@celery_app.task(
+    name="app.workers.invoice_processor.parse_invoice",
+    base=InvoiceStageTask,
+    bind=True,
+    stage="parse",
+)
+def parse_invoice(self, purchase_id: str) -> str:
+    """Stage 2: structured data from the extracted text."""
+    with _locked_purchase(purchase_id) as purchase:
+        if _stage_status(purchase, self.stage) == "done":
+            return purchase_id
+        parsed = parse_invoice_text((purchase.invoice_parsed_data or {}).get("text") or "")
+
+        # Fill in header fields the user did not provide on upload
+        if parsed["supplier"] and not purchase.supplier:
+            purchase.supplier = parsed["supplier"]
+        if parsed["invoice_number"] and not purchase.invoice_number:
+            purchase.invoice_number = parsed["invoice_number"]
+        if parsed["date"]:
+            try:
+                purchase.purchase_date = datetime.strptime(parsed["date"], "%d/%m/%Y").date()
+            except ValueError:
+                pass
+        if parsed["items"] and purchase.total_cost is None:
+            purchase.total_cost = sum(item["total_price"] for item in parsed["items"])
+
+        _mark_stage(purchase, self.stage, "done", parsed=_jsonable(parsed))
+    return purchase_id
+
+
+@celery_app.task(
+    name="app.workers.invoice_processor.create_purchase_items",
+    base=InvoiceStageTask,
+    bind=True,
+    stage="items",
+)
+def create_purchase_items(self, purchase_id: str) -> str:
+    """Stage 3: one PurchaseItem per parsed invoice line."""
+    with _locked_purchase(purchase_id) as purchase:
+        if _stage_status(purchase, self.stage) == "done":
+            return purchase_id
+        parsed = (purchase.invoice_parsed_data or {}).get("parsed") or {}
+        items = [_purchase_item(purchase.id, line) for line in parsed.get("items", [])]
+        purchase.items.extend(items)
+        purchase.status = PurchaseStatus.PROCESSED
+        _mark_stage(purchase, self.stage, "done", item_count=len(items))
+    return purchase_id
+
+
+@celery_app.task(
+    name="app.workers.invoice_processor.match_purchase_items",
+    base=InvoiceStageTask,
+    bind=True,
+    stage="match",
+    autoretry_for=RETRYABLE_ERRORS + (OSError,),  # Model download on first use
+)
+def match_purchase_items(self, purchase_id: str) -> str:
+    """Stage 4: link each item to the closest ingredient in the user's inventory."""
+    with SyncSessionLocal() as db:
+        purchase = _get_purchase(db, purchase_id)
+        if _stage_status(purchase, self.stage) == "done":
+            return purchase_id
+        pending = {str(item.id): item.product_name_raw for item in purchase.items if item.ingredient_id is None}
+        result = db.execute(select(Ingredient.id, Ingredient.name).where(Ingredient.user_id == purchase.user_id))
+        candidates = [{"id": str(row.id), "name": row.name} for row in result]
+
+    # Embeddings outside the row lock; one batch for every line of the invoice
+    item_ids = list(pending)
+    ranked = ml_tasks.match_ingredients_batch([pending[item_id] for item_id in item_ids], candidates, top_k=MATCH_TOP_K)
+    matches = {item_id: top for item_id, top in zip(item_ids, ranked) if top}
+
+    with _locked_purchase(purchase_id) as purchase:
+        if _stage_status(purchase, self.stage) == "done":
+            return purchase_id
+        matched = 0
+        for item in purchase.items:
+            top = matches.get(str(item.id))
+            if top is None or item.ingredient_id is not None:
+                continue
+            best = top[0]
+            item.matched_confidence = round(Decimal(str(best["confidence"])), 3)
+            if best["confidence"] >= settings.SIMILARITY_THRESHOLD:
+                item.ingredient_id = uuid.UUID(best["ingredient_id"])
+                matched += 1
+        purchase.status = PurchaseStatus.MATCHED
+        # Alternatives for lines below the threshold (or a wrong best match)
+        _mark_stage(purchase, self.stage, "done", matched=matched, matches=matches)
+    return purchase_id
 
 
 def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file."""
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
+    """Extract text from PDF file (page ranges in parallel on long documents)."""
+    return extract_pdf_text(
+        file_path,
+        workers=settings.PDF_WORKERS,
+        min_parallel_pages=settings.PDF_PARALLEL_MIN_PAGES,
+        fast_text_layer=settings.PDF_FAST_TEXT_LAYER,
+    )
 
 
 def parse_invoice_text(text: str) -> dict:
     """Parse invoice text to extract structured data."""
     # TODO: Implement regex patterns for common suppliers
     # Castle Malting, Bestmalz, etc.
-    
+
     data = {
         "supplier": None,
         "date": None,
         "invoice_number": None,
         "items": []
     }
-    
+
     # Example regex patterns (customize per supplier)
     supplier_pattern = r"(?:Supplier|Proveedor):?\s*(.+)"
     date_pattern = r"(?:Date|Fecha):?\s*(\d{2}/\d{2}/\d{4})"
     invoice_pattern = r"(?:Invoice|Factura)\s*(?:Number|Nº|#):?\s*(\S+)"
-    
+
     supplier_match = re.search(supplier_pattern, text, re.IGNORECASE)
     if supplier_match:
         data["supplier"] = supplier_match.group(1).strip()
-    
+
     date_match = re.search(date_pattern, text)
     if date_match:
         data["date"] = date_match.group(1)
-    
+
     invoice_match = re.search(invoice_pattern, text, re.IGNORECASE)
     if invoice_match:
         data["invoice_number"] = invoice_match.group(1)
-    
+
     # Parse line items (example pattern)
     # "Pale Malt 25kg 2 50.00 100.00"
-    item_pattern = r"(.+?)\s+(\d+(?:\.\d+)?)\s*(?:kg|g|L|units?)\s+(\d+)\s+(\d+\.\d{2})\s+(\d+\.\d{2})"
-    
+    item_pattern = r"(.+?)\s+(\d+(?:\.\d+)?)\s*(kg|g|L|units?)\s+(\d+)\s+(\d+\.\d{2})\s+(\d+\.\d{2})"
+
     for match in re.finditer(item_pattern, text):
         data["items"].append({
             "product_name": match.group(1).strip(),
             "unit_size": match.group(2),
-            "quantity": int(match.group(3)),
-            "unit_price": Decimal(match.group(4)),
-            "total_price": Decimal(match.group(5))
+            "unit": match.group(3),
+            "quantity": int(match.group(4)),
+            "unit_price": Decimal(match.group(5)),
+            "total_price": Decimal(match.group(6))
         })
-    
+
     return data
+
+
+def _purchase_item(purchase_id, line: dict) -> PurchaseItem:
+    """PurchaseItem for a parsed line: quantity in the line's unit (2 x 25kg -> 50 kg)."""
+    try:
+        unit_size = Decimal(line["unit_size"])
+    except (InvalidOperation, TypeError):
+        unit_size = Decimal(1)
+    quantity = unit_size * line["quantity"]
+    total_price = Decimal(line["total_price"])
+    unit_price = (total_price / quantity).quantize(Decimal("0.01")) if quantity else None
+    return PurchaseItem(
+        purchase_id=purchase_id,
+        product_name_raw=line["product_name"],
+        quantity=quantity,
+        unit=line.get("unit") or "units",
+        unit_price=unit_price,
+        total_price=total_price,
+        notes=f"{line['quantity']} x {line['unit_size']} {line.get('unit') or ''}".strip(),
+    )
+
+
+def _get_purchase(db, purchase_id: str, lock: bool = False) -> Purchase:
+    query = select(Purchase).where(Purchase.id == uuid.UUID(purchase_id))
+    if lock:
+        query = query.with_for_update()
+    purchase = db.execute(query).scalar_one_or_none()
+    if purchase is None:
+        raise PurchaseNotFound(purchase_id)
+    return purchase
+
+
+@contextmanager
+def _locked_purchase(purchase_id: str):
+    """Purchase row locked for update; committed on exit, rolled back on error."""
+    with SyncSessionLocal() as db:
+        purchase = _get_purchase(db, purchase_id, lock=True)
+        yield purchase
+        db.commit()
+
+
+def _stage_status(purchase: Purchase, stage: str):
+    return ((purchase.invoice_parsed_data or {}).get("stages") or {}).get(stage, {}).get("status")
+
+
+def _mark_stage(purchase: Purchase, stage: str, status: str, error: str = None, **data) -> None:
+    """Record a stage outcome (and its output) in invoice_parsed_data."""
+    # JSONB columns only detect reassignment, so build a new dict
+    parsed_data = dict(purchase.invoice_parsed_data or {})
+    stages = dict(parsed_data.get("stages") or {})
+    stages[stage] = {"status": status, "at": datetime.now(timezone.utc).isoformat()}
+    if error:
+        stages[stage]["error"] = error
+    parsed_data["stages"] = stages
+    parsed_data.update(data)
+    purchase.invoice_parsed_data = parsed_data
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    return value
@@ -1,50 +1,98 @@
 """ML tasks for ingredient matching and recommendations."""
 from app.workers.celery_app import celery_app
-from sentence_transformers import SentenceTransformer
 import numpy as np
+from collections import OrderedDict
 from typing import List, Dict
 
 
 # Load model (cached)
 _model = None
 
+# Normalized embeddings of candidate lists, keyed by their (id, name) pairs.
+# A user's catalog only changes when the inventory does, so invoice after
+# invoice reuses the same matrix.
+_candidate_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+CANDIDATE_CACHE_SIZE = 16
+
 
 def get_model():
     """Get or load sentence transformer model."""
     global _model
     if _model is None:
+        # Imported on first use: torch is only loaded where matching runs
+        from sentence_transformers import SentenceTransformer
         _model = SentenceTransformer('all-MiniLM-L6-v2')
     return _model
 
 
+def candidate_matrix(candidate_ingredients: List[Dict]) -> np.ndarray:
+    """Unit-length embeddings of the candidate names (one row each), cached."""
+    key = tuple((str(ing["id"]), ing["name"]) for ing in candidate_ingredients)
+    matrix = _candidate_cache.get(key)
+    if matrix is not None:
+        _candidate_cache.move_to_end(key)
+        return matrix
+    names = [ing["name"] for ing in candidate_ingredients]
+    matrix = get_model().encode(names, normalize_embeddings=True, convert_to_numpy=True)
+    _candidate_cache[key] = matrix
+    if len(_candidate_cache) > CANDIDATE_CACHE_SIZE:
+        _candidate_cache.popitem(last=False)
+    return matrix
+
+
 @celery_app.task(name="app.workers.ml_tasks.match_ingredient")
 def match_ingredient(product_name: str, candidate_ingredients: List[Dict]) -> Dict:
     """Match a product name to existing ingredients using embeddings."""
-    model = get_model()
-    
-    # Generate embedding for product name
-    product_embedding = model.encode(product_name)
-    
-    # Generate embeddings for candidates
-    candidate_names = [ing["name"] for ing in candidate_ingredients]
-    candidate_embeddings = model.encode(candidate_names)
-    
-    # Calculate cosine similarities
-    similarities = np.dot(candidate_embeddings, product_embedding) / (
-        np.linalg.norm(candidate_embeddings, axis=1) * np.linalg.norm(product_embedding)
-    )
-    
-    # Find best match
-    best_idx = int(np.argmax(similarities))
-    best_score = float(similarities[best_idx])
-    
+    best = match_ingredients_batch([product_name], candidate_ingredients, top_k=1)[0][0]
     return {
-        "matched_ingredient_id": candidate_ingredients[best_idx]["id"],
-        "confidence": best_score,
-        "matched_name": candidate_ingredients[best_idx]["name"]
+        "matched_ingredient_id": best["ingredient_id"],
+        "confidence": best["confidence"],
+        "matched_name": best["name"]
     }
 
 
+@celery_app.task(name="app.workers.ml_tasks.match_ingredients_batch")
+def match_ingredients_batch(
+    product_names: List[str],
+    candidate_ingredients: List[Dict],
+    top_k: int = 3
+) -> List[List[Dict]]:
+    """
+    Best top_k candidates for each product name, best first.
+
+    All product names go through the model in a single encode call and are
+    scored against the cached candidate matrix with one matrix product.
+    """
+    if not product_names:
+        return []
+    if not candidate_ingredients:
+        return [[] for _ in product_names]
+
+    candidates = candidate_matrix(candidate_ingredients)
+    products = get_model().encode(product_names, normalize_embeddings=True, convert_to_numpy=True)
+    # Unit vectors: the dot product is the cosine similarity
+    similarities = products @ candidates.T
+
+    k = min(top_k, len(candidate_ingredients))
+    if k < len(candidate_ingredients):
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(k), (len(product_names), 1))
+
+    results = []
+    for row, indices in enumerate(top):
+        ranked = sorted(indices, key=lambda idx: similarities[row, idx], reverse=True)
+        results.append([
+            {
+                "ingredient_id": candidate_ingredients[idx]["id"],
+                "name": candidate_ingredients[idx]["name"],
+                "confidence": float(similarities[row, idx])
+            }
+            for idx in ranked
+        ])
+    return results
+
+
 @celery_app.task(name="app.workers.ml_tasks.find_substitutions")
 def find_substitutions(ingredient_id: str, all_ingredients: List[Dict]) -> List[Dict]:
     """Find similar ingredients for substitution."""
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Invoice PDF text extraction: old serial pdfplumber loop vs app.services.pdf_text
+
+Generates invoice-like PDFs with a text layer (1, 10 and 100 pages by
+default) and times:
+  - legacy:    pdfplumber page by page, text built with +=
+  - fast:      in-process, PyPDF2 on clean pages
+  - parallel:  page ranges over --workers processes (pool already warm)
+
+Also checks that every variant finds the same words as pdfplumber.
+
+Usage:
+    python benchmarks/bench_pdf_text.py [--pages 1 10 100] [--lines 45] [--workers 2] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pdfplumber
+
+from app.services.pdf_text import extract_pdf_text
+
+PRODUCTS = [
+    "Pale Ale Malt", "Pilsner Malt", "Munich Malt", "Crystal 60", "Chocolate Malt",
+    "Cascade Hops", "Citra Hops", "Saaz Hops", "Magnum Hops", "Safale US-05",
+    "Irish Moss", "Gypsum", "Lactose", "Oak Chips", "Wheat Malt",
+]
+UNITS = ["kg", "g", "L", "units"]
+
+
+def invoice_lines(rng, n_lines):
+    lines = ["Supplier: Castle Malting", f"Invoice Number: F-{rng.randint(1000, 9999)}", "Date: 12/03/2024", ""]
+    for _ in range(n_lines):
+        qty = rng.randint(1, 10)
+        price = rng.uniform(2, 90)
+        lines.append(
+            f"{rng.choice(PRODUCTS)} {rng.choice([1, 5, 25, 100, 500])}{rng.choice(UNITS)} "
+            f"{qty} {price:.2f} {qty * price:.2f}"
+        )
+    return lines
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with a Helvetica text layer, one list of lines per page."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_obj = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 800 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def legacy_extract(file_path):
+    """extract_text_from_pdf before the change."""
+    text = ""
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            text += page.extract_text() or ""
+    return text
+
+
+def best_of(repeat, fn, *args, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--lines", type=int, default=45, help="Invoice lines per page")
+    parser.add_argument("--workers", type=int, default=max(2, min(4, os.cpu_count() or 1)))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(19)
+    print(f"{args.workers} workers, {os.cpu_count()} CPUs, best of {args.repeat}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm the pool so the parallel numbers measure extraction, not process start-up
+        warm = os.path.join(tmp, "warm.pdf")
+        write_pdf(warm, [invoice_lines(rng, 5)] * 2)
+        extract_pdf_text(warm, workers=args.workers, min_parallel_pages=1)
+
+        for n_pages in args.pages:
+            path = os.path.join(tmp, f"invoice_{n_pages}.pdf")
+            write_pdf(path, [invoice_lines(rng, args.lines) for _ in range(n_pages)])
+
+            legacy_time, legacy_text = best_of(args.repeat, legacy_extract, path)
+            fast_time, fast_text = best_of(args.repeat, extract_pdf_text, path, workers=1)
+            parallel_time, parallel_text = best_of(
+                args.repeat, extract_pdf_text, path, workers=args.workers, min_parallel_pages=1)
+            plumber_time, _ = best_of(
+                args.repeat, extract_pdf_text, path, workers=args.workers, min_parallel_pages=1,
+                fast_text_layer=False)
+
+            # Word by word: the old loop glued the last line of a page to the
+            # first line of the next one, so its raw text is not comparable
+            expected = pdfplumber_words(path)
+            for label, text in (("fast", fast_text), ("parallel", parallel_text)):
+                if text.split() != expected:
+                    print(f"  {n_pages} pages: {label} text differs from pdfplumber")
+
+            print(f"  {n_pages:>4} pages  legacy {legacy_time * 1000:8.1f} ms"
+                  f"  fast {fast_time * 1000:8.1f} ms ({legacy_time / fast_time:4.1f}x)"
+                  f"  parallel {parallel_time * 1000:8.1f} ms ({legacy_time / parallel_time:4.1f}x)"
+                  f"  parallel/pdfplumber {plumber_time * 1000:8.1f} ms")
+
+
+def pdfplumber_words(path):
+    with pdfplumber.open(path) as pdf:
+        return [word for page in pdf.pages for word in (page.extract_text() or "").split()]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Test settings: SQLite instead of PostgreSQL, Celery tasks run inline (no Redis)."""
+import os
+import tempfile
+
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="beergate-tests-"), "test.db")
+
+# Set before anything imports app.core.config
+os.environ.update(
+    DATABASE_URL=f"sqlite+aiosqlite:///{_DB_PATH}",
+    DATABASE_SYNC_URL=f"sqlite:///{_DB_PATH}",
+    CELERY_BROKER_URL="memory://",
+    CELERY_RESULT_BACKEND="cache+memory://",
+    CELERY_TASK_ALWAYS_EAGER="true",
+    DEBUG="false",
+)
+for name, value in (("SECRET_KEY", "test"), ("JWT_SECRET_KEY", "test"), ("REDIS_URL", "redis://localhost:6379/0")):
+    os.environ.setdefault(name, value)
+
+
+# PostgreSQL column types as their closest SQLite equivalents
+@compiles(UUID, "sqlite")
+def _uuid_on_sqlite(type_, compiler, **kw):
+    return "CHAR(36)"
+
+
+@compiles(JSONB, "sqlite")
+@compiles(ARRAY, "sqlite")
+def _json_on_sqlite(type_, compiler, **kw):
+    return "JSON"
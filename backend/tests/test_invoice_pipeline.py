@@ -0,0 +1,150 @@
+"""The invoice chain end to end in Celery eager mode: extract, parse, items, match."""
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app import models
+from app.core.database import Base, SyncSessionLocal, sync_engine
+from app.models.ingredient import Ingredient, IngredientCategory
+from app.models.purchase import Purchase, PurchaseItem, PurchaseStatus
+from app.workers import invoice_processor, ml_tasks
+
+INVOICE_TEXT = """Proveedor: Castle Malting
+Factura Nº: F-2024-17
+Fecha: 12/03/2024
+Pale Ale Malt 25kg 2 50.00 100.00
+Cascade Hops 100g 3 4.50 13.50
+"""
+
+
+class LetterCountEncoder:
+    """Stand-in for the sentence transformer: bag of letters, unit length."""
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        vectors = np.array(
+            [[text.lower().count(char) for char in "abcdefghijklmnopqrstuvwxyz"] for text in texts], dtype=float
+        ) + 1e-3
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def database():
+    assert models  # every table registered on Base
+    Base.metadata.create_all(sync_engine)
+    yield
+    Base.metadata.drop_all(sync_engine)
+
+
+@pytest.fixture(autouse=True)
+def stub_pipeline(monkeypatch):
+    monkeypatch.setattr(ml_tasks, "get_model", lambda: LetterCountEncoder())
+    ml_tasks._candidate_cache.clear()
+    monkeypatch.setattr(invoice_processor, "extract_text_from_pdf", lambda file_path: INVOICE_TEXT)
+
+
+def create_purchase() -> str:
+    user_id = uuid.uuid4()
+    with SyncSessionLocal() as db:
+        db.add_all([
+            Ingredient(user_id=user_id, name="Pale Ale Malt", category=IngredientCategory.MALT, quantity=0, unit="kg"),
+            Ingredient(user_id=user_id, name="Cascade Hops", category=IngredientCategory.HOP, quantity=0, unit="g"),
+        ])
+        purchase = Purchase(
+            user_id=user_id,
+            purchase_date=date.today(),
+            invoice_file_path="/uploads/invoice.pdf",
+            status=PurchaseStatus.PENDING,
+        )
+        db.add(purchase)
+        db.commit()
+        return str(purchase.id)
+
+
+def load(purchase_id: str):
+    with SyncSessionLocal() as db:
+        purchase = db.get(Purchase, uuid.UUID(purchase_id))
+        return purchase, list(purchase.items)
+
+
+def test_process_invoice_runs_every_stage():
+    purchase_id = create_purchase()
+
+    result = invoice_processor.process_invoice.delay(purchase_id).get()
+
+    assert result["status"] == "queued"
+    purchase, items = load(purchase_id)
+    stages = purchase.invoice_parsed_data["stages"]
+    assert {stage: stages[stage]["status"] for stage in invoice_processor.STAGES} == {
+        "extract": "done", "parse": "done", "items": "done", "match": "done",
+    }
+    assert purchase.status == PurchaseStatus.MATCHED
+    assert purchase.supplier == "Castle Malting"
+    assert purchase.purchase_date == date(2024, 3, 12)
+    assert purchase.total_cost == Decimal("113.50")
+
+    by_name = {item.product_name_raw: item for item in items}
+    assert set(by_name) == {"Pale Ale Malt", "Cascade Hops"}
+    malt = by_name["Pale Ale Malt"]
+    assert malt.quantity == Decimal("50") and malt.unit == "kg" and malt.unit_price == Decimal("2.00")
+    for item in items:
+        assert item.matched_confidence is not None
+        assert item.ingredient_id is not None
+
+
+def test_redispatch_creates_no_duplicate_items():
+    purchase_id = create_purchase()
+    invoice_processor.process_invoice.delay(purchase_id).get()
+
+    again = invoice_processor.process_invoice.delay(purchase_id).get()
+    # A retried stage that was already done skips itself too
+    invoice_processor.create_purchase_items.delay(purchase_id).get()
+
+    assert again["status"] == "completed"
+    with SyncSessionLocal() as db:
+        count = db.query(PurchaseItem).filter(PurchaseItem.purchase_id == uuid.UUID(purchase_id)).count()
+    assert count == 2
+
+
+def test_failed_stage_is_recorded(monkeypatch):
+    def missing_file(file_path):
+        raise FileNotFoundError(file_path)
+
+    monkeypatch.setattr(invoice_processor, "extract_text_from_pdf", missing_file)
+    purchase_id = create_purchase()
+
+    with pytest.raises(FileNotFoundError):
+        invoice_processor.process_invoice.delay(purchase_id).get()
+
+    purchase, items = load(purchase_id)
+    assert purchase.invoice_parsed_data["stages"]["extract"]["status"] == "failed"
+    assert purchase.status == PurchaseStatus.FAILED
+    assert items == []
+
+
+def test_upload_endpoint_dispatches_the_pipeline(tmp_path, monkeypatch):
+    # app.api.v1 imports the auth endpoints and their JWT/password libraries
+    pytest.importorskip("jose")
+    pytest.importorskip("passlib")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1.endpoints import purchases
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(purchases.router, prefix="/purchases")
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/purchases/upload-invoice", files={"file": ("invoice.pdf", b"%PDF-1.4", "application/pdf")}
+        )
+
+    assert response.status_code == 200
+    purchase, items = load(response.json()["purchase_id"])
+    assert purchase.invoice_parsed_data["stages"]["match"]["status"] == "done"
+    assert purchase.status == PurchaseStatus.MATCHED
+    assert len(items) == 2
@@ -0,0 +1,66 @@
+"""PDF text extraction where the invoice worker runs it: threads of Celery's threads pool."""
+import multiprocessing
+
+import pytest
+from celery.concurrency import get_implementation
+
+from app.core.config import settings
+from app.services import pdf_text
+from app.workers import invoice_processor
+from bench_pdf_text import write_pdf
+
+
+@pytest.fixture
+def long_pdf(tmp_path):
+    path = str(tmp_path / "invoice.pdf")
+    write_pdf(path, [[f"Pale Ale Malt 25kg {page} 2 40.00 80.00"] * 10 for page in range(12)])
+    return path
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    pdf_text._shutdown_executor()
+    yield
+    pdf_text._shutdown_executor()
+
+
+def test_threads_pool_worker_extracts_pages_in_processes(long_pdf, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_WORKERS", 2)
+    monkeypatch.setattr(settings, "PDF_PARALLEL_MIN_PAGES", 8)
+    expected = pdf_text.extract_pdf_text(long_pdf)
+
+    texts = []
+    pool = get_implementation("threads")(limit=2)
+    pool.start()
+    try:
+        # Two invoices at once, as with the worker's --concurrency 2
+        results = [
+            pool.apply_async(invoice_processor.extract_text_from_pdf, args=(long_pdf,), callback=texts.append)
+            for _ in range(2)
+        ]
+        for result in results:
+            result.get()
+    finally:
+        pool.stop()
+
+    assert texts == [expected, expected]
+    assert "Pale Ale Malt 25kg 11" in expected
+    # Both tasks shared one pool of PDF_WORKERS processes
+    assert pdf_text._executor is not None
+    assert len(pdf_text._executor._processes) == 2
+
+
+def _extract_in_child(path, queue):
+    queue.put(pdf_text.extract_pdf_text(path, workers=2, min_parallel_pages=8))
+
+
+def test_prefork_child_extracts_in_process(long_pdf):
+    expected = pdf_text.extract_pdf_text(long_pdf)
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=_extract_in_child, args=(long_pdf, queue), daemon=True)
+    child.start()
+    try:
+        assert queue.get(timeout=30) == expected
+    finally:
+        child.join()
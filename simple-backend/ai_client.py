@@ -0,0 +1,229 @@
+"""
+Cliente de IA compartido por toda la app
+Un único AsyncOpenAI con su pool de conexiones HTTP (keep-alive: sin un
+handshake TLS nuevo por petición), creado al arrancar la app y cerrado al
+pararla. Las llamadas no bloquean el bucle de eventos, tienen tiempo máximo
+y como mucho `concurrency` van a la vez; el resto espera turno.
+
+Proveedores (create_ai_client, BEERGATE_AI_PROVIDER):
+- openai: la API de OpenAI (gpt-4o)
+- local:  un servidor compatible en la propia máquina (Ollama, llama.cpp
+          server...) para usar el recomendador sin internet
+- fake:   respuesta fija generada en el propio proceso, sin red: para medir
+          lo que tarda el endpoint en sí (carga, prompt, guardar la conversación)
+"""
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+
+from recipe_prompt import CATEGORY_TITLES
+
+# Tiempo máximo para conectar con la API (la respuesta completa tiene el suyo)
+CONNECT_TIMEOUT = 10.0
+
+
+class AIClient:
+    """
+    - open() crea el cliente (lifespan de la app); si se usa sin abrir se
+      abre solo, para scripts y tests sin lifespan.
+    - base_url permite apuntar a cualquier servidor compatible con la API
+      de OpenAI (uno local para pruebas, sin red).
+    """
+
+    label = "OpenAI"  # para los logs y los mensajes de error
+
+    def __init__(self, api_key: str = "", base_url: Optional[str] = None, model: str = "gpt-4o",
+                 timeout: float = 120.0, concurrency: int = 4, max_retries: int = 2):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.model = model
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._client: Optional[AsyncOpenAI] = None
+        # Un semáforo por bucle de eventos (TestClient crea uno por sesión)
+        self._semaphores = {}
+
+    def open(self) -> AsyncOpenAI:
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.concurrency,
+                                    max_keepalive_connections=self.concurrency),
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key or "sin-clave",
+                base_url=self.base_url,
+                max_retries=self.max_retries,
+                http_client=http_client,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.close()
+
+    async def chat(self, messages, **kwargs):
+        """chat.completions.create con el modelo configurado y turno en el semáforo"""
+        client = self.open()
+        kwargs.setdefault("model", self.model)
+        async with self._semaphore():
+            return await client.chat.completions.create(messages=messages, **kwargs)
+
+    async def chat_stream(self, messages, **kwargs) -> AsyncIterator[str]:
+        """Como chat() pero va devolviendo el texto según llega; ocupa turno hasta el final"""
+        client = self.open()
+        kwargs.setdefault("model", self.model)
+        async with self._semaphore():
+            stream = await client.chat.completions.create(messages=messages, stream=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[loop]
+
+
+class LocalAIClient(AIClient):
+    """
+    Servidor compatible con la API de OpenAI en la propia máquina: Ollama
+    (http://localhost:11434/v1, por defecto) o llama.cpp server
+    (http://localhost:8080/v1). Un modelo local es mucho más lento que
+    gpt-4o y atiende las peticiones de una en una: más tiempo máximo, una
+    llamada a la vez y sin reintentos.
+    """
+
+    label = "IA local"
+
+    def __init__(self, api_key: str = "", base_url: Optional[str] = None, model: str = "llama3.1",
+                 timeout: float = 600.0, concurrency: int = 1, max_retries: int = 0):
+        super().__init__(api_key=api_key or "local", base_url=base_url or "http://localhost:11434/v1",
+                         model=model, timeout=timeout, concurrency=concurrency, max_retries=max_retries)
+
+
+class FakeAIClient(AIClient):
+    """
+    Sin red ni modelo: devuelve una recomendación fija con el estilo pedido y
+    los primeros ingredientes que lista el prompt, siempre la misma para los
+    mismos mensajes. `delay` simula lo que tardaría la IA (0 por defecto).
+    """
+
+    label = "IA simulada"
+
+    def __init__(self, api_key: str = "", base_url: Optional[str] = None, model: str = "fake",
+                 timeout: float = 120.0, concurrency: int = 4, max_retries: int = 0, delay: float = 0.0):
+        super().__init__(model=model, timeout=timeout, concurrency=concurrency)
+        self.delay = delay
+
+    def open(self):
+        return None
+
+    async def close(self) -> None:
+        pass
+
+    async def chat(self, messages, **kwargs) -> ChatCompletion:
+        async with self._semaphore():
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return ChatCompletion.model_validate({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": self.model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": fake_content(messages)}}],
+            })
+
+    async def chat_stream(self, messages, **kwargs) -> AsyncIterator[str]:
+        content = fake_content(messages)
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        async with self._semaphore():
+            for piece in pieces:
+                if self.delay:
+                    await asyncio.sleep(self.delay / len(pieces))
+                yield piece
+
+
+def _listed_ingredients(prompt: str) -> dict:
+    """{"Maltas": [(nombre, cantidad, unidad), ...], ...} de las líneas "- Nombre: 4 kg" del prompt"""
+    listed, section = {}, None
+    for line in prompt.splitlines():
+        if line.endswith(":") and line[:-1] in CATEGORY_TITLES.values():
+            section = line[:-1]
+        elif section and line.startswith("- "):
+            match = re.match(r"- (.+?): ([\d.]+) (\S+)", line)
+            if match:
+                listed.setdefault(section, []).append(
+                    (match.group(1), float(match.group(2)), match.group(3).rstrip(",")))
+        else:
+            section = None
+    return listed
+
+
+def fake_content(messages) -> str:
+    """JSON de la recomendación de FakeAIClient para estos mensajes"""
+    prompt = messages[-1]["content"]
+    request = prompt.rsplit("SOLICITUD DEL USUARIO:", 1)[-1].strip()[:80] or "Pale Ale"
+    listed = _listed_ingredients(prompt)
+
+    def first(category: str, default: Tuple[str, float, str], amount: float) -> Tuple[str, float, str]:
+        name, quantity, unit = (listed.get(CATEGORY_TITLES[category]) or [default])[0]
+        return name, min(amount, quantity), unit
+
+    malt = first("malt", ("Pale Ale", 4.5, "kg"), 4.5)
+    hop = first("hop", ("Cascade", 30, "g"), 30)
+    yeast = first("yeast", ("US-05", 1, "pkt"), 1)
+    deductions: List[dict] = [{"item": name, "amount": amount, "unit": unit} for name, amount, unit in (malt, hop, yeast)]
+    recommendation = {
+        "style_analysis": f"Respuesta simulada para: {request}",
+        "recommended_style": request,
+        "expiring_priority": [],
+        "hop_recommendations": [hop[0]],
+        "competition_inspiration": {"competition": "Simulada", "year": "2024", "brewer": "Beergate",
+                                    "style": request, "notes": "Receta generada sin IA"},
+        "recipe": {
+            "name": f"Simulada: {request}", "style": request, "batch_size": 20, "og": 1.050, "fg": 1.012,
+            "abv": 5.0, "ibu": 35, "srm": 8,
+            "malts": [{"name": malt[0], "amount_kg": malt[1], "percentage": 100}],
+            "hops": [{"name": hop[0], "amount_g": hop[1], "time_min": 60, "use": "Boil"}],
+            "yeast": {"name": yeast[0], "amount": yeast[1], "temp_range": "18-20°C"},
+            "mash": {"temperature": 66, "time": 60, "water_liters": 13},
+            "boil_time": 60,
+        },
+        "water_adjustments": {
+            "target_profile": {"calcium": 100, "magnesium": 10, "sodium": 15, "chloride": 75,
+                               "sulfate": 150, "bicarbonate": 50},
+            "salts_needed": [{"name": "Sulfato de Calcio (Gypsum)", "amount_g": 3.5, "reason": "Sulfatos"}],
+            "final_ph_target": 5.4,
+        },
+        "inventory_deductions": deductions,
+    }
+    return json.dumps(recommendation, ensure_ascii=False)
+
+
+def create_ai_client(provider: str = "openai", **settings) -> AIClient:
+    """
+    Cliente según BEERGATE_AI_PROVIDER: 'openai' (por defecto), 'local' o 'fake'
+    Los ajustes que no se pasen (o sean None) toman el valor del proveedor.
+    """
+    settings = {key: value for key, value in settings.items() if value is not None}
+    if provider == "openai":
+        return AIClient(**settings)
+    if provider == "local":
+        return LocalAIClient(**settings)
+    if provider == "fake":
+        return FakeAIClient(**settings)
+    raise ValueError(f"Proveedor de IA desconocido: {provider}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Caché semántica del recomendador: tasa de acierto y latencia ahorrada
+
+Con la IA local de bench_ai_latency (tarda --delay segundos) manda a
+POST /ai-recipe-recommender una tanda de peticiones: varias formas de pedir
+lo mismo y estilos distintos que NO deben salir de la caché. Compara con la
+caché desactivada y muestra lo que cuenta GET /ai-recipe-recommender/cache.
+
+Uso:
+    python benchmarks/bench_ai_cache.py [--delay 2] [--threshold 0.9]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from ai_client import AIClient
+from bench_ai_latency import start_stub
+from semantic_cache import SemanticCache
+
+# (petición, grupo): las del mismo grupo piden lo mismo con otras palabras
+PROMPTS = [
+    ("Quiero hacer una IPA con lo que tengo", "ipa"),
+    ("Una APA", "apa"),
+    ("quiero hacer una ipa con lo que tengo!", "ipa"),
+    ("Hazme una IPA usando mi inventario", "ipa"),
+    ("Una stout seca para invierno", "stout"),
+    ("Una APA por favor", "apa"),
+    ("Una NEIPA con mucho dry hop", "neipa"),
+    ("una stout seca para el invierno", "stout"),
+    ("Una IPA de 6%", "ipa6"),
+    ("Una IPA de 8%", "ipa8"),
+    ("Receta de una APA", "apa"),
+    ("Una NEIPA con mucho dry hop", "neipa"),
+]
+
+
+def run(app_main, cache):
+    from fastapi.testclient import TestClient
+
+    app_main.ai_cache = cache
+    seen, latencies, wrong = set(), {"IA": [], "caché": []}, []
+    with TestClient(app_main.app) as client:
+        for prompt, group in PROMPTS:
+            start = time.perf_counter()
+            response = client.post("/ai-recipe-recommender", json={"user_prompt": prompt})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            hit = "cache" in response.json()
+            latencies["caché" if hit else "IA"].append(elapsed)
+            if hit and group not in seen:
+                wrong.append(prompt)  # reutilizó la respuesta de otra cosa
+            seen.add(group)
+        stats = client.get("/ai-recipe-recommender/cache").json()
+    return latencies, wrong, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=2.0, help="Segundos que tarda la IA simulada")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Similitud mínima para reutilizar")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.delay)
+    os.environ["BEERGATE_DATA_DIR"] = tempfile.mkdtemp(prefix="beergate-bench-")
+    import main as app_main
+
+    app_main.ai_client = AIClient(base_url=base_url)
+    groups = len({group for _, group in PROMPTS})
+    print(f"{len(PROMPTS)} peticiones ({groups} distintas), IA local de {args.delay:g} s")
+    try:
+        for label, cache in (("sin caché", SemanticCache(max_entries=0)),
+                             ("con caché", SemanticCache(threshold=args.threshold))):
+            start = time.perf_counter()
+            latencies, wrong, stats = run(app_main, cache)
+            total = time.perf_counter() - start
+            line = f"  {label:<10} total {total:6.2f} s"
+            for source, values in latencies.items():
+                if values:
+                    line += f"  {source}: {len(values):2d} x {statistics.median(values) * 1000:7.1f} ms"
+            print(line)
+            if cache.max_entries:
+                print(f"             aciertos {stats['hits']}/{stats['lookups']} ({stats['hit_rate']:.0%}),"
+                      f" IA ahorrada {stats['saved_seconds']:.2f} s,"
+                      f" respuestas ajenas {len(wrong)} {wrong if wrong else ''}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Latencia de GET /inventory mientras se piden recetas a /ai-recipe-recommender
+
+La IA es un servidor local compatible con la API de OpenAI (sin red ni
+clave) que tarda --delay segundos en contestar. Compara:
+  - antes:      un OpenAI(...) síncrono nuevo por petición, dentro del handler
+  - compartido: ai_client.AIClient (AsyncOpenAI con pool de conexiones)
+y cuenta las conexiones TCP que le llegan al servidor.
+
+Uso:
+    python benchmarks/bench_ai_latency.py [--requests 6] [--delay 1.0] [--concurrency 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from ai_client import AIClient
+
+STUB_RECOMMENDATION = {
+    "style_analysis": "Una American Pale Ale encaja bien con el inventario: hay malta base de sobra "
+                      "y lúpulos americanos que caducan pronto.",
+    "recommended_style": "American Pale Ale",
+    "expiring_priority": ["Cascade", "US-05"],
+    "hop_recommendations": ["Cascade", "Citra"],
+    "competition_inspiration": {"competition": "NHC", "year": "2019", "brewer": "Desconocido",
+                                "style": "American Pale Ale", "notes": "Receta de prueba"},
+    "recipe": {
+        "name": "Prueba", "style": "18B", "batch_size": 20, "og": 1.050, "fg": 1.012, "abv": 5.0,
+        "ibu": 35, "srm": 8,
+        "malts": [{"name": "Pale Ale", "amount_kg": 4.5, "percentage": 100}],
+        "hops": [{"name": "Cascade", "amount_g": 30, "time_min": 60, "use": "Boil"}],
+        "yeast": {"name": "US-05", "amount": 1, "temp_range": "18-20°C"},
+        "mash": {"temperature": 66, "time": 60, "water_liters": 13},
+        "boil_time": 60,
+    },
+    "water_adjustments": {
+        "target_profile": {"calcium": 100, "magnesium": 10, "sodium": 15, "chloride": 75,
+                           "sulfate": 150, "bicarbonate": 50},
+        "salts_needed": [{"name": "Gypsum", "amount_g": 3.5, "reason": "Sulfatos"}],
+        "final_ph_target": 5.4,
+    },
+    "inventory_deductions": [{"item": "Pale Ale", "amount": 4.5, "unit": "kg"}],
+}
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    """
+    POST /v1/chat/completions: tarda `delay` segundos en devolver
+    STUB_RECOMMENDATION; con "stream": true lo manda en trozos de unos
+    4 caracteres repartidos a lo largo de esos segundos, como la API real.
+    Cuenta las conexiones y el máximo de peticiones atendidas a la vez.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    delay = 1.0
+    connections = set()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            self.connections.add(self.client_address)
+
+    def do_POST(self):
+        with self.lock:
+            StubOpenAI.in_flight += 1
+            StubOpenAI.max_in_flight = max(StubOpenAI.max_in_flight, StubOpenAI.in_flight)
+        try:
+            self.answer()
+        finally:
+            with self.lock:
+                StubOpenAI.in_flight -= 1
+
+    def answer(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = json.dumps(STUB_RECOMMENDATION, ensure_ascii=False)
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": request.get("model", "stub")}
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+            for piece in pieces:
+                time.sleep(self.delay / len(pieces))
+                chunk = dict(base, object="chat.completion.chunk", choices=[
+                    {"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        time.sleep(self.delay)
+        body = json.dumps(dict(
+            base,
+            object="chat.completion",
+            choices=[{"index": 0, "finish_reason": "stop",
+                      "message": {"role": "assistant", "content": content}}],
+            usage={"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        )).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(delay):
+    """Servidor compatible con OpenAI en un hilo; devuelve (servidor, base_url)"""
+    StubOpenAI.delay = delay
+    StubOpenAI.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+class LegacyClient(AIClient):
+    """Comportamiento anterior: cliente síncrono nuevo en cada petición"""
+
+    async def chat(self, messages, **kwargs):
+        from openai import OpenAI
+
+        client = OpenAI(api_key=self.api_key or "sin-clave", base_url=self.base_url, timeout=self.timeout)
+        kwargs.setdefault("model", self.model)
+        return client.chat.completions.create(messages=messages, **kwargs)
+
+
+def run(label, main, client_factory, n_requests):
+    from fastapi.testclient import TestClient
+
+    main.ai_client = client_factory()
+    StubOpenAI.connections.clear()
+    latencies = []
+    done = threading.Event()
+
+    with TestClient(main.app) as client:
+        client.get("/inventory")  # calentar caché
+
+        def poll():
+            while not done.is_set():
+                start = time.perf_counter()
+                client.get("/inventory?summary=true")
+                latencies.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.01)
+
+        def recommend(i):
+            response = client.post("/ai-recipe-recommender", json={"user_prompt": f"Una APA número {i}"})
+            return response.status_code == 200
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n_requests) as executor:
+            ok = list(executor.map(recommend, range(n_requests)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        poller.join()
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {label:<12} recetas {ok.count(True)}/{n_requests} en {elapsed:5.2f} s,"
+          f" {len(StubOpenAI.connections)} conexiones"
+          f"  GET /inventory: p50 {statistics.median(latencies):7.1f} ms,"
+          f" p95 {p95:7.1f} ms, máx {latencies[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=6, help="Peticiones de receta a la vez")
+    parser.add_argument("--delay", type=float, default=1.0, help="Segundos que tarda la IA simulada")
+    parser.add_argument("--concurrency", type=int, default=4, help="Llamadas a la IA a la vez (AIClient)")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.delay)
+
+    # Sin caché semántica: cada receta tiene que llegar a la IA
+    os.environ.update(BEERGATE_DATA_DIR=tempfile.mkdtemp(prefix="beergate-bench-"), BEERGATE_AI_CACHE_SIZE="0")
+    import main as app_main
+
+    print(f"{args.requests} recetas concurrentes, IA local de {args.delay:g} s, "
+          f"sondeando GET /inventory cada 10 ms")
+    try:
+        run("antes", app_main, lambda: LegacyClient(base_url=base_url), args.requests)
+        run("compartido", app_main,
+            lambda: AIClient(base_url=base_url, concurrency=args.concurrency), args.requests)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tamaño del prompt del recomendador según crece el inventario
+
+Multiplica data/inventory.json (lotes ficticios) hasta cada tamaño y cuenta
+los tokens del prompt de recipe_prompt.build_messages:
+  - sin límite:  todo el inventario listado (lo que crecía antes)
+  - con límite:  --max-tokens, listando los ingredientes más útiles
+También comprueba que el prefijo fijo es idéntico entre peticiones distintas.
+
+Uso:
+    python benchmarks/bench_ai_prompt.py [--sizes 55,200,1000] [--max-tokens 2500]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from recipe_prompt import EXPIRY_DAYS, build_messages, load_ingredients_info
+
+PROMPTS = ["Quiero hacer una NEIPA con Citra", "Una pilsner checa", "Una stout seca para invierno"]
+
+
+def inventory_of(size, base):
+    random.seed(size)
+    items = list(base)
+    while len(items) < size:
+        item = dict(random.choice(base))
+        item["name"] += f" lote {len(items)}"
+        items.append(item)
+    return items
+
+
+def expiring_of(items):
+    today = datetime.now()
+    expiring = []
+    for item in items:
+        if item["category"] in ("hop", "yeast") and item.get("expiry_date"):
+            days = (datetime.strptime(item["expiry_date"], "%Y-%m-%d") - today).days
+            if days < EXPIRY_DAYS:
+                expiring.append({"name": item["name"], "category": item["category"], "quantity": item["quantity"],
+                                 "days_to_expire": days, "expiry_date": item["expiry_date"]})
+    return expiring
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="55,200,1000", help="Tamaños de inventario, separados por comas")
+    parser.add_argument("--max-tokens", type=int, default=2500)
+    args = parser.parse_args()
+
+    base = json.loads((BACKEND_DIR / "data" / "inventory.json").read_text(encoding="utf-8"))
+    water = json.loads((BACKEND_DIR / "data" / "water_profile.json").read_text(encoding="utf-8"))
+    info = load_ingredients_info(BACKEND_DIR / "ingredients_info.json")
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        items = inventory_of(size, base)
+        inventory = {category: [item for item in items if item["category"] == category]
+                     for category in ("malt", "hop", "yeast")}
+        expiring = expiring_of(items)
+        everything = build_messages(PROMPTS[0], inventory, expiring, water, info, max_tokens=10**9)
+        start = time.perf_counter()
+        bounded = [build_messages(prompt, inventory, expiring, water, info, max_tokens=args.max_tokens)
+                   for prompt in PROMPTS]
+        elapsed = (time.perf_counter() - start) / len(PROMPTS)
+        assert len({parts.messages[0]["content"] for parts in bounded}) == 1, "el prefijo fijo ha cambiado"
+        print(f"  {size:5d} items  sin límite {everything.tokens:6d} tokens"
+              f"  con límite {max(parts.tokens for parts in bounded):5d} tokens"
+              f" ({bounded[0].prefix_tokens} fijos, {bounded[0].listed} listados)"
+              f"  {elapsed * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
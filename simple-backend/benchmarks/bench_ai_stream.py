@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tiempo hasta el primer contenido del recomendador: respuesta completa vs streaming
+
+Con la IA local de bench_ai_latency (tarda --delay segundos en escribir la
+respuesta entera) mide, desde que se envía la petición:
+  - POST /ai-recipe-recommender          hasta tener la respuesta
+  - POST /ai-recipe-recommender/stream   hasta el primer "partial"
+    (style_analysis empieza a verse), hasta cada "field" y hasta "done"
+La app se sirve con uvicorn en un hilo: el TestClient de Starlette no
+entrega nada hasta que la respuesta termina.
+
+Uso:
+    python benchmarks/bench_ai_stream.py [--delay 8] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from ai_client import AIClient
+from bench_ai_latency import STUB_RECOMMENDATION, start_stub
+
+
+def sse_events(lines):
+    """(evento, datos) de un stream de server-sent events, línea a línea"""
+    event, data = None, []
+    for line in lines:
+        if line == "":
+            if event is not None:
+                yield event, json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data.append(line[len("data: "):])
+
+
+def stream_timings(client):
+    """Segundos hasta el primer partial, hasta cada field y hasta done"""
+    timings = {}
+    start = time.perf_counter()
+    with client.stream("POST", "/ai-recipe-recommender/stream", json={"user_prompt": "Una APA"}) as response:
+        for event, data in sse_events(response.iter_lines()):
+            elapsed = time.perf_counter() - start
+            if event == "partial":
+                timings.setdefault("primer texto", elapsed)
+            elif event == "field":
+                timings.setdefault(data["field"], elapsed)
+            elif event == "done":
+                timings["done"] = elapsed
+                assert data["recommendation"] == STUB_RECOMMENDATION
+            elif event == "error":
+                raise RuntimeError(data["detail"])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=8.0, help="Segundos que tarda la IA en escribir la respuesta")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.delay)
+    # Sin caché semántica: cada receta tiene que llegar a la IA
+    os.environ.update(BEERGATE_DATA_DIR=tempfile.mkdtemp(prefix="beergate-bench-"), BEERGATE_AI_CACHE_SIZE="0")
+    import main as app_main
+    import httpx
+    import uvicorn
+
+    app_main.ai_client = AIClient(base_url=base_url)
+    app_server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=app_server.run, daemon=True).start()
+    while not app_server.started:
+        time.sleep(0.05)
+    port = app_server.servers[0].sockets[0].getsockname()[1]
+
+    full, streamed = [], []
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.post("/ai-recipe-recommender", json={"user_prompt": "Una APA"})
+                assert response.status_code == 200, response.text
+                full.append(time.perf_counter() - start)
+                streamed.append(stream_timings(client))
+    finally:
+        app_server.should_exit = True
+        server.shutdown()
+
+    print(f"IA local de {args.delay:g} s, mediana de {args.repeat}")
+    print(f"  respuesta completa          {statistics.median(full):6.2f} s")
+    for key in streamed[0]:
+        print(f"  streaming: {key:<24} {statistics.median(t[key] for t in streamed):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Rendimiento del propio recomendador, sin IA de por medio
+
+Con BEERGATE_AI_PROVIDER=fake (ai_client.FakeAIClient: respuesta en el
+propio proceso, sin red) lo que se mide es solo el endpoint: cargar
+inventario y agua, construir el prompt, parsear la respuesta y guardar la
+conversación. Sirve la app con uvicorn en un hilo y lanza --requests
+peticiones desde --clients clientes a la vez, con la caché semántica
+desactivada y una petición distinta cada vez. Al final de cada tanda
+comprueba que se ha guardado una conversación por petición.
+
+Uso:
+    python benchmarks/bench_ai_throughput.py [--requests 300] [--clients 8] [--storage memory]
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bench_ai_stream import sse_events
+
+STYLES = ["APA", "IPA", "NEIPA", "stout", "porter", "pilsner checa", "märzen", "weissbier", "saison", "bitter"]
+
+
+def run(app_main, client, path, n_requests, n_clients, out):
+    def request(i):
+        prompt = f"Una {STYLES[i % len(STYLES)]} número {i}"
+        start = time.perf_counter()
+        if path.endswith("/stream"):
+            with client.stream("POST", path, json={"user_prompt": prompt}) as response:
+                events = [event for event, _ in sse_events(response.iter_lines())]
+            assert events[-1] == "done", events[-3:]
+        else:
+            response = client.post(path, json={"user_prompt": prompt})
+            assert response.status_code == 200, response.text
+        return time.perf_counter() - start
+
+    saved_before = len(app_main.store.load(app_main.CONVERSATIONS_FILE))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_clients) as executor:
+        latencies = sorted(executor.map(request, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    saved = len(app_main.store.load(app_main.CONVERSATIONS_FILE)) - saved_before
+    assert saved == n_requests, f"{path}: {saved} conversaciones guardadas de {n_requests} peticiones"
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {path:<32} {n_requests / elapsed:7.1f} peticiones/s"
+          f"  p50 {statistics.median(latencies) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=8, help="Clientes a la vez")
+    parser.add_argument("--storage", default="memory", help="BEERGATE_STORAGE: memory, journal o sqlite")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="beergate-bench-")
+    for name in ("inventory.json", "water_profile.json"):
+        shutil.copy(BACKEND_DIR / "data" / name, data_dir)
+    os.environ.update(BEERGATE_DATA_DIR=data_dir, BEERGATE_STORAGE=args.storage,
+                      BEERGATE_AI_PROVIDER="fake", BEERGATE_AI_CACHE_SIZE="0",
+                      BEERGATE_AI_CONCURRENCY=str(args.clients))
+    os.chdir(BACKEND_DIR)  # ingredients_info.json
+    import httpx
+    import uvicorn
+    import main as app_main
+
+    app_server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=app_server.run, daemon=True).start()
+    while not app_server.started:
+        time.sleep(0.05)
+    port = app_server.servers[0].sockets[0].getsockname()[1]
+
+    print(f"{args.requests} recetas, {args.clients} clientes, IA simulada, almacenamiento {args.storage}")
+    out = sys.stdout
+    limits = httpx.Limits(max_connections=args.clients)
+    # Los logs [AI] de cada petición se descartan: solo cuenta el endpoint
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+                client.post("/ai-recipe-recommender", json={"user_prompt": "calentar"})
+                for path in ("/ai-recipe-recommender", "/ai-recipe-recommender/stream"):
+                    run(app_main, client, path, args.requests, args.clients, out)
+        finally:
+            app_server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
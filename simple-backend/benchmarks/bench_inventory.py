@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark de GET /inventory y POST /inventory
+
+Compara el almacén en memoria (JsonStore) con el comportamiento anterior,
+que releía y reescribía el fichero JSON completo en cada petición.
+
+Uso:
+    python benchmarks/bench_inventory.py [--items 500] [--requests 200] [--threads 8]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+CATEGORIES = ["malt", "hop", "yeast", "other"]
+SUPPLIERS = ["Cocinista", "Castle Malting", "Bestmalz", "La Tienda del Cervecero"]
+
+
+def make_inventory(n_items):
+    """Inventario sintético de n_items lotes"""
+    rng = random.Random(42)
+    items = []
+    for i in range(n_items):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        items.append({
+            "id": f"{category}_{i + 1}",
+            "name": f"Ingrediente {i}",
+            "category": category,
+            "quantity": round(rng.uniform(0.1, 25), 2),
+            "unit": "g" if category == "hop" else "kg",
+            "cost": round(rng.uniform(1, 20), 2),
+            "notes": "",
+            "expiry_date": "2027-01-01" if category in ("hop", "yeast") else None,
+            "supplier": rng.choice(SUPPLIERS),
+            "created_at": "2026-01-16T00:00:00",
+        })
+    return items
+
+
+def payload(i):
+    return {
+        "name": f"Bench Malt {i % 50}",
+        "category": "malt",
+        "quantity": 1.0,
+        "unit": "kg",
+        "cost": 2.5,
+        "supplier": "Cocinista",
+    }
+
+
+def measure(client, method, n_requests, threads):
+    """Peticiones por segundo de un endpoint y número de peticiones fallidas"""
+    def call(i):
+        try:
+            if method == "GET":
+                response = client.get("/inventory")
+            else:
+                response = client.post("/inventory", json=payload(i))
+            return response.status_code == 200
+        except Exception:
+            # p.ej. JSON a medio escribir por otra petición concurrente
+            return False
+
+    start = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            ok = list(pool.map(call, range(n_requests)))
+    else:
+        ok = [call(i) for i in range(n_requests)]
+    return n_requests / (time.perf_counter() - start), ok.count(False)
+
+
+def run(label, main, store, n_items, n_requests, threads):
+    from fastapi.testclient import TestClient
+    from starlette.requests import Request
+
+    main.store = store
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    main.save_json(main.INVENTORY_FILE, make_inventory(n_items))
+    store.flush()
+
+    results = {}
+
+    # Coste del manejador sin la serialización HTTP de FastAPI
+    for method in ("GET", "POST"):
+        start = time.perf_counter()
+        for i in range(n_requests):
+            if method == "GET":
+                main.get_inventory(request)
+            else:
+                main.add_ingredient(main.IngredientCreate(**payload(i)))
+        rps = n_requests / (time.perf_counter() - start)
+        results[(method, "handler")] = rps
+        print(f"  {label:<8} {method:<5} solo manejador {rps:10.1f} llamadas/s")
+
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        for method in ("GET", "POST"):
+            for n_threads in (1, threads):
+                rps, errors = measure(client, method, n_requests, n_threads)
+                results[(method, n_threads)] = rps
+                print(f"  {label:<8} {method:<5} threads={n_threads:<3} {rps:10.1f} req/s"
+                      f"  errores={errors}")
+
+    # Cada POST suma 1 kg a un lote "Bench Malt": lo que falte se ha perdido
+    store.flush()
+    try:
+        added = sum(
+            item["quantity"] for item in main.load_json(main.INVENTORY_FILE)
+            if item["name"].startswith("Bench Malt")
+        )
+        print(f"  {label:<8} actualizaciones perdidas: {3 * n_requests - round(added)}")
+    except ValueError:
+        print(f"  {label:<8} inventory.json corrupto al terminar")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=500, help="Lotes en inventory.json")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por medida")
+    parser.add_argument("--threads", type=int, default=8, help="Clientes concurrentes")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="beergate-bench-")
+    os.environ["BEERGATE_DATA_DIR"] = data_dir
+
+    import main as app_main
+    from storage import JsonStore
+
+    class UncachedStore(JsonStore):
+        """Comportamiento anterior: leer y escribir el fichero en cada petición, sin locks"""
+
+        def lock(self, file_path):
+            return threading.RLock()
+
+        def load(self, file_path, default=list):
+            return self._read_file(Path(file_path), default)
+
+        def save(self, file_path, data):
+            self._write_file(Path(file_path), data)
+
+        @contextmanager
+        def edit(self, file_path, default=list):
+            data = self.load(file_path, default)
+            yield data
+            self.save(file_path, data)
+
+    print(f"inventory.json con {args.items} items, {args.requests} peticiones por medida")
+    before = run("antes", app_main, UncachedStore(), args.items, args.requests, args.threads)
+    after = run("después", app_main, JsonStore(), args.items, args.requests, args.threads)
+
+    print("\nMejora (después / antes):")
+    for key in before:
+        method, mode = key
+        mode = "solo manejador" if mode == "handler" else f"threads={mode:<3}"
+        print(f"  {method:<5} {mode:<14} x{after[key] / before[key]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Latencia de GET /inventory mientras se procesan facturas en /analyze-invoice
+
+Compara la extracción dentro del bucle de eventos (comportamiento anterior,
+workers=0) con el pool de procesos de 1 y de --workers procesos (el tiempo
+total de las facturas debería bajar con el número de núcleos). Por defecto
+cada factura simula un OCR con --ocr-seconds de CPU; con --pdf se usa un
+PDF real (necesita pdfplumber).
+
+Cada factura de cada medida lleva bytes distintos (un comentario al final),
+así que la caché de contenido de main.invoice_cache no acierta nunca: son
+tiempos en frío. Al final se reenvían las facturas de la última medida para
+ver la caché en caliente por separado.
+
+Uso:
+    python benchmarks/bench_invoice_latency.py [--invoices 4] [--ocr-seconds 1.5] [--workers 2] [--pdf factura.pdf]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from invoice_extraction import ExtractionPool
+
+SAMPLE_INVOICE = """Malta Pale Ale - 25 kg
+33,75 € 10,00 % 37,13 € 2 74,25 €
+Levadura Safale US-05
+Cantidad: 3
+"""
+
+
+def simulated_ocr(filename, path):
+    """Ocupa la CPU tantos segundos como indique el fichero, como un OCR"""
+    deadline = time.process_time() + float(Path(path).read_text().split()[0])
+    while time.process_time() < deadline:
+        sum(i * i for i in range(1000))
+    return SAMPLE_INVOICE
+
+
+class SimulatedPool(ExtractionPool):
+    """Pool cuya extracción es simulated_ocr()"""
+
+    async def extract(self, filename, path, region=None, progress=None):
+        text = await self.run(simulated_ocr, filename, path, label=filename)
+        if progress is not None:
+            progress(1, 1, text)
+        return text
+
+
+def uploads_for(tag, template, n_invoices):
+    """n_invoices copias de la factura con bytes únicos (comentario al final, que el PDF y el texto ignoran)"""
+    name, content, content_type = template
+    comment = b"\n% " if content_type == "application/pdf" else b"\n# "
+    return [(name, content + comment + f"{tag} {i}".encode() + b"\n", content_type) for i in range(n_invoices)]
+
+
+def run(label, main, pool, uploads):
+    from fastapi.testclient import TestClient
+
+    main.extraction_pool = pool
+    latencies = []
+    done = threading.Event()
+
+    with TestClient(main.app) as client:
+        client.get("/inventory")  # calentar caché
+        if pool.workers:
+            # Arrancar los procesos del pool fuera de la medida
+            client.post("/analyze-invoice", files=[("files", ("warmup.txt", b"0", "text/plain"))])
+
+        def poll():
+            while not done.is_set():
+                start = time.perf_counter()
+                client.get("/inventory?summary=true")
+                latencies.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.01)
+
+        def analyze(upload):
+            response = client.post("/analyze-invoice", files=[("files", upload)])
+            return response.status_code == 200 and bool(response.json().get("items"))
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+            ok = list(executor.map(analyze, uploads))
+        elapsed = time.perf_counter() - start
+        done.set()
+        poller.join()
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {label:<26} facturas {ok.count(True)}/{len(uploads)} en {elapsed:5.2f} s"
+          f"  GET /inventory: {len(latencies):4d} peticiones, p50 {statistics.median(latencies):7.1f} ms,"
+          f" p95 {p95:7.1f} ms, máx {latencies[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invoices", type=int, default=4, help="Facturas enviadas a la vez")
+    parser.add_argument("--ocr-seconds", type=float, default=1.5, help="CPU por factura simulada")
+    parser.add_argument("--workers", type=int, default=2, help="Procesos del pool")
+    parser.add_argument("--pdf", help="PDF real en lugar de la factura simulada")
+    args = parser.parse_args()
+
+    os.environ["BEERGATE_DATA_DIR"] = tempfile.mkdtemp(prefix="beergate-bench-")
+    import main as app_main
+
+    if args.pdf:
+        make_pool = ExtractionPool
+        template = (Path(args.pdf).name, Path(args.pdf).read_bytes(), "application/pdf")
+    else:
+        make_pool = SimulatedPool
+        template = ("factura.txt", str(args.ocr_seconds).encode(), "text/plain")
+
+    print(f"{args.invoices} facturas concurrentes, sondeando GET /inventory cada 10 ms "
+          f"({os.cpu_count()} núcleos)")
+    print("En frío (sin aciertos de caché):")
+    run("en el bucle (antes)", app_main, make_pool(0), uploads_for("bucle", template, args.invoices))
+    pools = {workers: make_pool(workers, timeout=120) for workers in sorted({1, args.workers})}
+    try:
+        for workers, pool in pools.items():
+            run(f"pool de {workers} procesos", app_main, pool, uploads_for(f"pool{workers}", template, args.invoices))
+        print("En caliente (las mismas facturas otra vez):")
+        workers = max(pools)
+        run(f"pool de {workers} procesos", app_main, pools[workers],
+            uploads_for(f"pool{workers}", template, args.invoices))
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
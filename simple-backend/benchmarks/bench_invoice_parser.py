@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del parser de líneas de factura
+
+Compara el parser anterior (un re.search por patrón y línea, con las
+palabras clave comprobadas una a una) con invoice_parser (clasificación
+con una sola regex combinada y patrones precompilados del perfil del
+proveedor) sobre facturas sintéticas de --lines líneas, y comprueba que
+ambos devuelven exactamente los mismos items.
+
+Uso:
+    python benchmarks/bench_invoice_parser.py [--invoices 50] [--lines 500] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from invoice_parser import parse_invoice_text
+
+MALTS = ["Pale Ale", "Pilsner", "Munich Tipo I", "Crystal 150", "Viena", "Trigo ENTERA", "Chocolate"]
+HOPS = ["Cascade", "Citra", "Mosaic", "Saaz", "Hallertau Mittelfrüh", "Simcoe"]
+YEASTS = ["Safale US-05", "Saflager W-34/70", "Wyeast 1056", "White Labs WLP001"]
+NOISE = [
+    "Cocinista S.L. - C/ Mayor 12, 28013 Madrid",
+    "Factura simplificada n.º {n}",
+    "Fecha: {d:02d}/03/2025",
+    "Ref. {n} Envío 24/48 h",
+    "Subtotal {p},{c:02d} € IVA 21,00 %",
+    "Tienda online: www.cocinista.es - Shop de cocina y cerveza casera",
+    "Gracias por su compra",
+    "Fermentador de 30 litros con tapa",
+    "",
+]
+
+
+def price(rng):
+    return f"{rng.randint(1, 90)},{rng.randint(0, 99):02d}"
+
+
+def make_invoice(rng, n_lines):
+    """Factura con el formato de Cocinista: items con sus líneas de precio entre ruido"""
+    lines = []
+    while len(lines) < n_lines:
+        kind = rng.random()
+        if kind < 0.15:
+            weight = rng.choice(["25 kg", "5 kg", "1 kg", "500 g", "1,5 kg"])
+            lines.append(f"Malta {rng.choice(MALTS)} - {weight}")
+            if rng.random() < 0.7:
+                lines.append(f"{price(rng)} € 10,00 % {price(rng)} € {rng.randint(1, 4)} {price(rng)} €")
+            else:
+                lines.append(f"{price(rng)} € {rng.randint(1, 4)} {price(rng)} €")
+        elif kind < 0.25:
+            lines.append(f"Lúpulo {rng.choice(HOPS)} - {rng.choice([25, 50, 100])} g")
+            lines.append(f"Cantidad: {rng.randint(1, 5)}")
+        elif kind < 0.32:
+            lines.append(f"Levadura {rng.choice(YEASTS)}")
+            lines.append(f"Cantidad: {rng.randint(1, 3)}")
+        elif kind < 0.36:
+            lines.append(rng.choice(["Clarificante para cerveza 10 pastillas", "Grifo para fermentador"]))
+            lines.append(f"{price(rng)} € {rng.randint(1, 3)} {price(rng)} €")
+        else:
+            lines.append(rng.choice(NOISE).format(n=rng.randint(1000, 99999), d=rng.randint(1, 28),
+                                                  p=rng.randint(10, 400), c=rng.randint(0, 99)))
+    return "\n".join(lines[:n_lines])
+
+
+def legacy_parse_invoice_text(text: str) -> List[dict]:
+    """Copia del parser anterior de main.py (referencia)"""
+    items = []
+    
+    # ESTRATEGIA: Buscar líneas con estructura de factura
+    # Formato típico: "NOMBRE DEL PRODUCTO ... Cantidad: X Precio: Y"
+    lines = text.split('\n')
+    
+    # Patrones para líneas de items
+    # Buscar patrones como "MALTA PALE ALE - 25 KG" seguido de cantidad
+    item_patterns = [
+        # Formato: Malta NOMBRE - CANTIDAD KG/G ... Cantidad: X
+        r'Malta\s+(.+?)\s+-\s+(\d+(?:[.,]\d+)?)\s*(kg|g)\s+.*?Cantidad:\s*(\d+)',
+        # Formato: MALTA NOMBRE ... Cantidad: X
+        r'MALTA\s+(.+?)\s+.*?Cantidad:\s*(\d+)',
+        # Formato general: palabra clave + nombre + cantidad
+        r'(Carapils|Amber|Clarificante|Grifo)\s+(.+?)\s+.*?Cantidad:\s*(\d+)',
+    ]
+    
+    # Diccionario para mapear nombres a categorías
+    malt_keywords = ['malta', 'malt', 'pale', 'pilsner', 'munich', 'vienna', 'wheat', 'trigo', 
+                   'crystal', 'caramel', 'chocolate', 'cara', 'melano', 'aroma', 'biscuit',
+                   'amber', 'carapils']
+    hop_keywords = ['lúpulo', 'lupulo', 'hop', 'cascade', 'centennial', 'chinook', 'citra', 
+                  'mosaic', 'simcoe', 'amarillo', 'saaz', 'hallertau']
+    yeast_keywords = ['levadura', 'yeast', 'safale', 'saflager', 'wyeast', 'white labs']
+    
+    # Buscar items línea por línea con contexto
+    for i, line in enumerate(lines):
+        line_lower = line.lower()
+        
+        # Buscar patrones de malta con cantidad en la misma línea o siguiente
+        if 'malta' in line_lower or 'malt' in line_lower or 'carapils' in line_lower or 'amber' in line_lower:
+            # Intentar extraer nombre y cantidad
+            # Formato: "Malta NOMBRE - CANTIDAD KG"
+            match = re.search(r'(?:Malta|MALTA|Carapils|CARAPILS|Amber|AMBER)\s+(.+?)\s+-\s+(\d+(?:[.,]\d+)?)\s*(kg|g|KG|G)', line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                quantity_str = match.group(2).replace(',', '.')
+                unit = match.group(3).lower()
+                
+                # Buscar cantidad: está en el mismo contexto, formato "Cantidad: ... número"
+                # El número suele estar al final después de precios
+                # Ejemplo: "33,75 € 10,00 % 37,13 € 2 74,25 €"
+                # Donde: precio base, IVA%, precio unitario, cantidad, precio total
+                context = ' '.join(lines[i:min(i+3, len(lines))])
+                
+                # Buscar patrón más específico que incluye el IVA
+                # Formato: "precio € IVA% precio_unit € cantidad precio_total €"
+                qty_match = re.search(r'(\d+,\d+)\s+€\s+\d+,\d+\s+%\s+(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
+                qty_count = 1
+                price_total = 0
+                if qty_match:
+                    qty_count = int(qty_match.group(3))
+                    price_total = float(qty_match.group(4).replace(',', '.'))
+                else:
+                    # Patrón alternativo sin IVA
+                    qty_match = re.search(r'(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
+                    if qty_match:
+                        qty_count = int(qty_match.group(2))
+                        price_total = float(qty_match.group(3).replace(',', '.'))
+                
+                # Calcular cantidad total
+                base_quantity = float(quantity_str)
+                if unit == 'g' and base_quantity >= 100:
+                    base_quantity = base_quantity / 1000
+                    unit = 'kg'
+                
+                total_quantity = base_quantity * qty_count
+                
+                # Calcular precio por kg (precio total / cantidad total)
+                if price_total > 0 and total_quantity > 0:
+                    price_per_kg = price_total / total_quantity
+                else:
+                    price_per_kg = 3.0  # Estimación por defecto
+                
+                # Limpiar nombre
+                name = re.sub(r'\s+(ENTERA|Entera|entera)$', '', name).strip()
+                
+                items.append({
+                    "name": name,
+                    "category": "malt",
+                    "quantity": round(total_quantity, 2),
+                    "unit": unit,
+                    "cost": round(price_per_kg, 2)
+                })
+        
+        # Buscar lúpulos
+        elif any(kw in line_lower for kw in hop_keywords):
+            match = re.search(r'(?:Lúpulo|LÚPULO|Hop|HOP)\s+(.+?)\s+-?\s*(\d+)\s*g', line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                quantity = int(match.group(2))
+                
+                # Buscar multiplicador de cantidad
+                for j in range(i+1, min(i+4, len(lines))):
+                    qty_match = re.search(r'Cantidad:\s*(\d+)', lines[j])
+                    if qty_match:
+                        quantity *= int(qty_match.group(1))
+                        break
+                
+                items.append({
+                    "name": name,
+                    "category": "hop",
+                    "quantity": quantity,
+                    "unit": "g",
+                    "cost": round(quantity * 0.05, 2)
+                })
+        
+        # Buscar levaduras
+        elif any(kw in line_lower for kw in yeast_keywords):
+            match = re.search(r'(?:Levadura|LEVADURA|Yeast|YEAST)\s+(.+)', line, re.IGNORECASE)
+            if match:
+                name = match.group(1).strip()
+                quantity = 1
+                
+                for j in range(i+1, min(i+4, len(lines))):
+                    qty_match = re.search(r'Cantidad:\s*(\d+)', lines[j])
+                    if qty_match:
+                        quantity = int(qty_match.group(1))
+                        break
+                
+                items.append({
+                    "name": name,
+                    "category": "yeast",
+                    "quantity": quantity,
+                    "unit": "pkt",
+                    "cost": round(quantity * 3.5, 2)
+                })
+        
+        # Buscar clarificantes y otros ingredientes
+        elif 'clarificante' in line_lower or 'grifo' in line_lower or 'fermentador' in line_lower:
+            # Buscar nombre del producto
+            if 'clarificante' in line_lower:
+                name = "Clarificante para Cerveza"
+            elif 'grifo' in line_lower:
+                name = "Grifo para Fermentador"
+            else:
+                continue
+            
+            quantity = 1
+            unit = "unidad"
+            
+            # Buscar cantidad y unidad en el contexto
+            context = ' '.join(lines[i:min(i+4, len(lines))])
+            
+            # Buscar patrones como "10 pastillas", "25 g", etc.
+            unit_match = re.search(r'(\d+)\s+(pastillas|pastilla|g|ml|unidades)', context, re.IGNORECASE)
+            if unit_match:
+                unit = f"{unit_match.group(1)} {unit_match.group(2)}"
+            
+            # Buscar cantidad pedida (patrón de precio)
+            qty_match = re.search(r'(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
+            if qty_match:
+                quantity = int(qty_match.group(2))
+            
+            items.append({
+                "name": name,
+                "category": "other",
+                "quantity": quantity,
+                "unit": unit,
+                "cost": round(quantity * 3.0, 2)
+            })
+    
+    return items
+
+
+def timed(parse, invoices, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in invoices:
+            parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invoices", type=int, default=50, help="Facturas sintéticas")
+    parser.add_argument("--lines", type=int, default=500, help="Líneas por factura")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    rng = random.Random(14)
+    invoices = [make_invoice(rng, args.lines) for _ in range(args.invoices)]
+    n_items = 0
+    for text in invoices:
+        expected = legacy_parse_invoice_text(text)
+        if parse_invoice_text(text) != expected:
+            sys.exit("invoice_parser no devuelve los mismos items que el parser anterior")
+        n_items += len(expected)
+
+    print(f"{args.invoices} facturas de {args.lines} líneas ({n_items} items), mejor de {args.repeat}")
+    baseline = timed(legacy_parse_invoice_text, invoices, args.repeat)
+    for label, parse in (("anterior", legacy_parse_invoice_text), ("invoice_parser", parse_invoice_text)):
+        elapsed = baseline if parse is legacy_parse_invoice_text else timed(parse, invoices, args.repeat)
+        per_invoice = elapsed / args.invoices * 1000
+        print(f"  {label:<16} {per_invoice:7.2f} ms/factura  {args.invoices / elapsed:8.1f} facturas/s"
+              f"  x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de codificación y decodificación JSON de los ficheros de datos
+
+Compara el formato anterior (json estándar, indent=2, ensure_ascii=False)
+con jsoncodec (orjson compacto y orjson con sangría) sobre un inventory.json,
+purchases.json y ai_conversations.json sintéticos de tamaño realista.
+
+Uso:
+    python benchmarks/bench_json.py [--items 500] [--purchases 300] [--conversations 200] [--repeat 20]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import jsoncodec
+from bench_inventory import make_inventory
+
+HOPS = ["Cascade", "Citra", "Mosaic", "Saaz", "Nelson Sauvin", "Magnum", "Perle"]
+MALTS = ["Malta Pale Ale", "Malta Crystal 150", "Malta Munich Tipo I", "Malta Viena", "Carapils"]
+
+
+def make_purchases(n_purchases, inventory):
+    """Compras de 3 a 12 líneas tomadas del inventario"""
+    rng = random.Random(7)
+    purchases = []
+    for i in range(n_purchases):
+        lines = [dict(item) for item in rng.sample(inventory, rng.randint(3, 12))]
+        for line in lines:
+            line.pop("id"), line.pop("created_at")
+        purchases.append({
+            "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "supplier": lines[0]["supplier"],
+            "items": lines,
+            "total_cost": round(sum(line["cost"] * line["quantity"] for line in lines), 2),
+            "notes": "Importado automáticamente desde factura_ñ.pdf",
+            "id": f"purchase_{i + 1}",
+            "created_at": "2026-01-16T00:00:00",
+        })
+    return purchases
+
+
+def make_conversations(n_conversations):
+    """Conversaciones del recomendador con la estructura que guarda main.py"""
+    rng = random.Random(11)
+    conversations = []
+    for i in range(n_conversations):
+        recipe = {
+            "name": f"Receta {i}",
+            "style": "American IPA",
+            "batch_size": 20, "og": 1.062, "fg": 1.012, "abv": 6.5, "ibu": 60, "srm": 7,
+            "malts": [{"name": m, "amount_kg": round(rng.uniform(0.2, 5), 2), "percentage": 20} for m in MALTS],
+            "hops": [{"name": h, "amount_g": rng.randint(10, 80), "time_min": rng.choice([60, 15, 0]), "use": "Boil"}
+                     for h in rng.sample(HOPS, 4)],
+            "yeast": {"name": "US-05", "amount": 1, "temp_range": "18-20°C"},
+            "mash": {"temperature": 66, "time": 60, "water_liters": 16},
+            "boil_time": 60,
+        }
+        ai_response = {
+            "style_analysis": "Análisis del estilo solicitado frente al inventario disponible. " * 8,
+            "recommended_style": "American IPA",
+            "expiring_priority": rng.sample(HOPS, 3),
+            "hop_recommendations": rng.sample(HOPS, 3),
+            "competition_inspiration": {"competition": "Concurso Nacional", "year": "2023",
+                                        "brewer": "Desconocido", "style": "IPA", "notes": "Notas " * 20},
+            "recipe": recipe,
+            "water_adjustments": {"target_profile": {"calcium": 100, "sulfate": 250, "chloride": 60},
+                                  "salts_needed": [{"name": "Sulfato de Calcio", "amount_g": 4.5, "reason": "Amargor seco"}],
+                                  "final_ph_target": 5.4},
+            "inventory_deductions": [{"name": h["name"], "amount": h["amount_g"]} for h in recipe["hops"]],
+        }
+        conversations.append({
+            "id": f"conv_{i + 1}",
+            "timestamp": "2026-01-16T12:00:00",
+            "user_prompt": "Quiero hacer una IPA con los lúpulos que caducan antes",
+            "ai_response": ai_response,
+            "context": {"inventory_snapshot": {"hops": [{"name": h, "quantity": 100, "expiry": "2026-06-01"} for h in HOPS]},
+                        "expiring_items": HOPS[:2], "water_profile": "Valsaín"},
+            "recipe_generated": recipe,
+            "style_requested": "American IPA",
+            "applied_to_inventory": False,
+        })
+    return conversations
+
+
+CODECS = {
+    "json indent=2 (antes)": (
+        lambda data: json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8"),
+        json.loads,
+    ),
+    "jsoncodec compacto": (jsoncodec.dumps, jsoncodec.loads),
+    "jsoncodec con sangría": (lambda data: jsoncodec.dumps(data, pretty=True), jsoncodec.loads),
+}
+
+
+def best_of(fn, arg, repeat):
+    """Mejor tiempo de `repeat` ejecuciones, en milisegundos"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=500, help="Lotes en inventory.json")
+    parser.add_argument("--purchases", type=int, default=300, help="Compras en purchases.json")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversaciones en ai_conversations.json")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medida (se toma la mejor)")
+    args = parser.parse_args()
+
+    inventory = make_inventory(args.items)
+    datasets = {
+        "inventory.json": inventory,
+        "purchases.json": make_purchases(args.purchases, inventory),
+        "ai_conversations.json": make_conversations(args.conversations),
+    }
+
+    print(f"orjson: {'sí' if jsoncodec.orjson else 'no (json estándar)'}")
+    for name, data in datasets.items():
+        print(f"\n{name}")
+        baseline = None
+        for label, (encode, decode) in CODECS.items():
+            encoded = encode(data)
+            enc_ms = best_of(encode, data, args.repeat)
+            dec_ms = best_of(decode, encoded, args.repeat)
+            if baseline is None:
+                baseline = (enc_ms, dec_ms)
+            print(f"  {label:<22} {len(encoded) / 1024:8.1f} KB"
+                  f"  encode {enc_ms:7.2f} ms (x{baseline[0] / enc_ms:4.1f})"
+                  f"  decode {dec_ms:7.2f} ms (x{baseline[1] / dec_ms:4.1f})")
+
+
+if __name__ == "__main__":
+    main()
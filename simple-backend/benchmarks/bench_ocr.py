@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Tiempo de OCR y recall de items con y sin preprocesado de imagen
+
+Compara la foto tal cual (comportamiento anterior: PIL.Image.open directo a
+pytesseract) con ocr_preprocess.preprocess_image (grises, enderezado,
+recorte y reducción), y esta limitada a la tabla de líneas del proveedor
+(--supplier, su table_region). Mide el tiempo de OCR (preprocesado
+incluido) y la fracción de los items esperados que encuentra
+invoice_parser en el texto reconocido, y al final el cambio respecto a la
+foto tal cual.
+
+Fotos:
+  - por defecto, sintéticas de 12 MP: factura de --lines líneas impresa
+    desde el navegador (cabecera y pie), sobre una mesa, girada y con sombra
+  - --pdf: las páginas de un PDF con capa de texto (pedidos/Pedido
+    Cocinista.pdf) fotografiadas igual; los items esperados salen de su texto
+  - --images: fotos reales; cada foto.jpg necesita al lado un foto.txt con
+    la transcripción de la factura, de la que salen los items esperados
+Sin Tesseract instalado solo se mide el preprocesado (tiempo y tamaño).
+
+Uso:
+    python benchmarks/bench_ocr.py [--samples 3] [--lines 40] [--pdf factura.pdf] [--images fotos/*.jpg]
+                                   [--supplier Cocinista]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from bench_invoice_parser import make_invoice
+from invoice_parser import get_profile, parse_invoice_text
+from ocr_preprocess import preprocess_image
+
+try:
+    import pytesseract
+    pytesseract.get_tesseract_version()
+except Exception:  # Sin pytesseract o sin el binario de Tesseract
+    pytesseract = None
+
+PHOTO_SIZE = (3000, 4000)  # 12 MP en vertical
+FONT_PATHS = ["/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "DejaVuSans.ttf", "Arial.ttf"]
+
+
+def load_font(size):
+    for path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def print_page(text, page_w=2480):
+    """Página A4 impresa desde el navegador: cabecera y pie arriba y abajo del todo"""
+    page_h = int(page_w * 1.414)
+    page = Image.new("L", (page_w, page_h), 245)
+    draw = ImageDraw.Draw(page)
+    small = load_font(page_w // 70)
+    draw.text((page_w // 2, page_h // 100), "Pedido Cocinista", fill=20, font=small, anchor="mt")
+    draw.text((page_w // 100, page_h - page_h // 100), "1 de 1", fill=20, font=small, anchor="lb")
+    draw.text((page_w - page_w // 100, page_h - page_h // 100), "16/1/26, 19:29", fill=20, font=small, anchor="rb")
+    font = load_font(page_w // 55)
+    y = page_h // 15  # hueco tras la cabecera como en la impresión real (~4 líneas)
+    for line in text.split("\n"):
+        draw.text((page_w // 10, y), line, fill=20, font=font)
+        y += int(font.size * 1.5)
+    return page
+
+
+def make_photo(rng, page):
+    """Página fotografiada: sobre una mesa, algo girada y con sombra"""
+    width, height = PHOTO_SIZE
+    page_w = int(width * rng.uniform(0.75, 0.9))
+    page = page.convert("L").resize((page_w, round(page_w * page.height / page.width)), Image.Resampling.LANCZOS)
+
+    photo = Image.new("L", PHOTO_SIZE, 90)
+    page = page.rotate(rng.uniform(-4, 4), resample=Image.Resampling.BICUBIC, expand=True, fillcolor=90)
+    photo.paste(page, ((width - page.width) // 2, (height - page.height) // 2))
+    # Sombra suave de un lado a otro
+    shade = Image.linear_gradient("L").rotate(90).resize(PHOTO_SIZE).point(lambda p: 255 - p // 5)
+    photo = Image.composite(photo, Image.new("L", PHOTO_SIZE, 0), shade)
+    return photo.filter(ImageFilter.GaussianBlur(1.2)).convert("RGB")
+
+
+def recall(expected, text):
+    if not expected:
+        return 1.0
+    found = {(item["category"], item["name"]) for item in parse_invoice_text(text)}
+    return sum((item["category"], item["name"]) in found for item in expected) / len(expected)
+
+
+def load_samples(args):
+    """[(nombre, imagen, items esperados)]"""
+    if args.images:
+        samples = []
+        for image_path in map(Path, args.images):
+            transcript = image_path.with_suffix(".txt")
+            if not transcript.exists():
+                print(f"  {image_path.name}: falta {transcript.name}, se omite")
+                continue
+            samples.append((image_path.name, Image.open(image_path),
+                            parse_invoice_text(transcript.read_text(encoding="utf-8"))))
+        return samples
+    rng = random.Random(16)
+    if args.pdf:
+        import pdfplumber
+        import pypdfium2
+
+        samples = []
+        with pdfplumber.open(args.pdf) as pdf:
+            for index, page in enumerate(pypdfium2.PdfDocument(args.pdf)):
+                image = page.render(scale=300 / 72).to_pil()
+                expected = parse_invoice_text(pdf.pages[index].extract_text() or "")
+                samples.append((f"página {index + 1}", make_photo(rng, image), expected))
+        return samples
+    samples = []
+    for i in range(args.samples):
+        text = make_invoice(rng, args.lines)
+        samples.append((f"sintética {i + 1}", make_photo(rng, print_page(text)), parse_invoice_text(text)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=3, help="Fotos sintéticas")
+    parser.add_argument("--lines", type=int, default=40, help="Líneas de cada factura sintética")
+    parser.add_argument("--pdf", help="PDF con capa de texto cuyas páginas se fotografían")
+    parser.add_argument("--images", nargs="*", help="Fotos reales (cada una con su .txt)")
+    parser.add_argument("--supplier", default="Cocinista", help="Perfil cuya table_region se prueba")
+    args = parser.parse_args()
+
+    samples = load_samples(args)
+    profile = get_profile(args.supplier)
+    variants = [("directo", None), ("preprocesado", None)]
+    if profile is not None and profile.table_region:
+        variants.append(("tabla", profile.table_region))
+    if pytesseract is None:
+        print("Tesseract no disponible: solo se mide el preprocesado")
+    print(f"{len(samples)} fotos")
+
+    totals = {label: [0.0, 0.0, 0] for label, _ in variants}  # segundos, recall, píxeles
+    for name, image, expected in samples:
+        print(f"  {name:<14} {image.width}x{image.height}")
+        for label, region in variants:
+            start = time.perf_counter()
+            ocr_input = image if label == "directo" else preprocess_image(image, region)
+            elapsed = time.perf_counter() - start
+            line = f"    {label:<13} {ocr_input.width}x{ocr_input.height}  preparación {elapsed * 1000:6.0f} ms"
+            if pytesseract is not None:
+                start = time.perf_counter()
+                text = pytesseract.image_to_string(ocr_input, lang="spa+eng")
+                elapsed += time.perf_counter() - start
+                found = recall(expected, text)
+                totals[label][1] += found
+                line += f"  OCR total {elapsed:6.2f} s  recall {found:4.0%}"
+            totals[label][0] += elapsed
+            totals[label][2] += ocr_input.width * ocr_input.height
+            print(line)
+
+    if not samples:
+        return
+    base_time, base_recall, base_pixels = totals["directo"]
+    print("Respecto a la foto tal cual:")
+    for label, (elapsed, found, pixels) in totals.items():
+        line = f"  {label:<13} {pixels / base_pixels:5.0%} de los píxeles"
+        if pytesseract is not None:
+            line += (f"  tiempo total {elapsed:7.2f} s (x{base_time / elapsed:.1f})"
+                     f"  recall medio {found / len(samples):4.0%}"
+                     f" ({(found - base_recall) / len(samples) * 100:+.0f} puntos)")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
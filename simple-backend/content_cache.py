@@ -0,0 +1,106 @@
+"""
+Caché en disco por clave de contenido
+Guarda resultados caros (texto extraído de una factura, items parseados)
+bajo una clave derivada del SHA-256 de los bytes subidos, con un tamaño
+total máximo y expulsión LRU
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+import jsoncodec
+
+
+class ContentCache:
+    """
+    Una entrada = un fichero JSON <clave>.json en `directory`.
+
+    - Si el total supera `max_bytes` se borran las entradas usadas hace más
+      tiempo. El último uso se guarda en el mtime del fichero, así que el
+      orden LRU sobrevive a los reinicios.
+    - Una entrada ilegible (disco lleno, edición a mano) cuenta como fallo
+      de caché y se borra.
+    - max_bytes=0 desactiva la caché.
+    """
+
+    def __init__(self, directory, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # clave -> tamaño, de más antigua a más reciente
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Valor guardado para `key`, o None"""
+        if self.max_bytes <= 0:
+            return None
+        path = self._path(key)
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            value = jsoncodec.loads(path.read_bytes())
+            os.utime(path)
+        except (OSError, jsoncodec.DecodeError):
+            self._discard(key)
+            return None
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_bytes <= 0:
+            return
+        body = jsoncodec.dumps(value)
+        if len(body) > self.max_bytes:
+            return
+        path = self._path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Temporal + rename: otro proceso nunca lee una entrada a medias
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=key + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._load()
+            self._total += len(body) - self._entries.pop(key, 0)
+            self._entries[key] = len(body)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                self._path(old_key).unlink(missing_ok=True)
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _load(self) -> None:
+        """Primer uso: inventario de las entradas en disco (llamar con el lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, path.stem, st.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total += size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
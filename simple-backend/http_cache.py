@@ -0,0 +1,103 @@
+"""
+Caché HTTP de Beergate Simple
+Ficheros estáticos (index.html, manifest, service worker, ingredients_info)
+cargados una vez en memoria, con ETag fuerte, variantes gzip/brotli ya
+comprimidas y recarga automática cuando cambia el fichero en disco
+"""
+import gzip
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # Sin brotli: solo gzip
+    brotli = None
+
+# Por debajo de este tamaño no compensa comprimir
+MIN_COMPRESS_SIZE = 1024
+
+
+def etag_matches(request: Request, *etags: str) -> bool:
+    """True si el If-None-Match de la petición incluye alguna de estas versiones"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or any(etag in tags for etag in etags)
+
+
+class Asset:
+    """Contenido de un fichero y sus variantes comprimidas: {codificación: (cuerpo, etag)}"""
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str, signature: tuple):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.signature = signature
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, tuple] = {"identity": (body, f'"{digest}"')}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = (data, f'"{digest}-{encoding}"')
+
+    def response(self, request: Request) -> Response:
+        """200 con la mejor codificación que acepte el cliente, o 304 si ya la tiene"""
+        encoding = self._negotiate(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request, *(tag for _, tag in self.variants.values())):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+    def _negotiate(self, accept_encoding: str) -> str:
+        accepted = set()
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0"):
+                accepted.add(name.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+
+class AssetCache:
+    """
+    Ficheros servidos desde memoria. Cada petición solo hace un stat(): si
+    cambian mtime o tamaño el fichero se vuelve a leer, hashear y comprimir.
+    """
+
+    def __init__(self):
+        self._assets: Dict[Path, Asset] = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path, media_type: str, cache_control: str = "no-cache",
+            transform: Optional[Callable[[bytes], bytes]] = None) -> Asset:
+        """Asset del fichero (FileNotFoundError si no existe); transform adapta el contenido"""
+        path = Path(file_path)
+        st = os.stat(path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        asset = self._assets.get(path)
+        if asset is not None and asset.signature == signature:
+            return asset
+
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is None or asset.signature != signature:
+                body = path.read_bytes()
+                if transform is not None:
+                    body = transform(body)
+                asset = self._assets[path] = Asset(body, media_type, cache_control, signature)
+                sizes = ", ".join(f"{encoding} {len(data)}" for encoding, (data, _) in asset.variants.items())
+                print(f"[ASSETS] {path.name} cargado ({sizes} bytes)")
+            return asset
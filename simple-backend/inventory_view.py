@@ -0,0 +1,139 @@
+"""
+Resumen del inventario para GET /inventory
+Agrupa los lotes por categoría y calcula su valoración de forma incremental
+(ver JsonStore.aggregate), guarda la respuesta ya serializada y filtra,
+pagina y proyecta los listados
+"""
+from typing import Dict, List, Optional, Tuple
+
+import jsoncodec
+
+# Unidades cuyo precio no es por unidad: los lúpulos en gramos se compran
+# y se anotan a precio por 100 g; kg, paquetes o unidades van a precio unitario
+PRICE_BASIS = {"g": 100}
+
+# Campos en los que busca el parámetro q de GET /inventory
+SEARCH_FIELDS = ('name', 'supplier', 'notes')
+
+
+def item_value(item: dict) -> float:
+    """Valor en euros de un lote según su unidad"""
+    cost = item.get('cost') or 0
+    quantity = item.get('quantity') or 0
+    return cost * quantity / PRICE_BASIS.get(item.get('unit'), 1)
+
+
+class InventoryView:
+    """
+    Categorías, recuentos y valoración del inventario.
+
+    El store llama a add/replace/remove con cada lote que cambia, así que el
+    coste de una escritura no depende del tamaño del inventario. snapshot()
+    se rehace solo tras un cambio.
+    """
+
+    def __init__(self):
+        self.records: list = []
+        self.by_category: Dict[str, Dict[str, dict]] = {}
+        self.value_by_category: Dict[str, float] = {}
+        self._snapshot: Optional[InventorySnapshot] = None
+
+    def add(self, record: dict) -> None:
+        cat = record.get('category', 'other')
+        self.by_category.setdefault(cat, {})[record.get('id')] = record
+        self.value_by_category[cat] = self.value_by_category.get(cat, 0) + item_value(record)
+        self._snapshot = None
+
+    def remove(self, record: dict) -> None:
+        cat = record.get('category', 'other')
+        bucket = self.by_category.get(cat, {})
+        bucket.pop(record.get('id'), None)
+        self.value_by_category[cat] = self.value_by_category.get(cat, 0) - item_value(record)
+        if not bucket:
+            self.by_category.pop(cat, None)
+            self.value_by_category.pop(cat, None)
+        self._snapshot = None
+
+    def replace(self, old: dict, new: dict) -> None:
+        if old.get('category', 'other') == new.get('category', 'other'):
+            # Mismo hueco dentro de la categoría: conserva el orden
+            cat = new.get('category', 'other')
+            self.by_category[cat][new.get('id')] = new
+            self.value_by_category[cat] += item_value(new) - item_value(old)
+            self._snapshot = None
+        else:
+            self.remove(old)
+            self.add(new)
+
+    def snapshot(self) -> "InventorySnapshot":
+        if self._snapshot is None:
+            self._snapshot = InventorySnapshot(
+                self.records,
+                {cat: list(items.values()) for cat, items in self.by_category.items()},
+                {
+                    "total_items": len(self.records),
+                    "total_value": round(sum(self.value_by_category.values()), 2),
+                    "count_by_category": {cat: len(items) for cat, items in self.by_category.items()},
+                    "value_by_category": {cat: round(value, 2) for cat, value in self.value_by_category.items()},
+                },
+            )
+        return self._snapshot
+
+
+class InventorySnapshot:
+    """Versión inmutable del inventario y sus agregados; el JSON completo se serializa una vez"""
+
+    def __init__(self, records: list, by_category: Dict[str, list], summary: dict):
+        self.records = records
+        self.by_category = by_category
+        self.summary = summary
+        self._body: Optional[bytes] = None
+
+    @property
+    def body(self) -> bytes:
+        """Respuesta completa de GET /inventory (items + by_category + agregados)"""
+        if self._body is None:
+            data = {"items": self.records, "by_category": self.by_category, **self.summary}
+            self._body = jsoncodec.dumps(data)
+        return self._body
+
+    def select(self, category: Optional[str] = None, supplier: Optional[str] = None,
+               expiring_before: Optional[str] = None, q: Optional[str] = None) -> List[dict]:
+        """
+        Lotes que cumplen todos los filtros indicados, en el orden del inventario.
+        expiring_before es una fecha ISO: solo lotes con caducidad anterior.
+        q busca sin distinguir mayúsculas en nombre, proveedor y notas.
+        """
+        items = self.by_category.get(category, []) if category else self.records
+        if supplier:
+            supplier = supplier.lower()
+            items = [item for item in items if (item.get('supplier') or '').lower() == supplier]
+        if expiring_before:
+            items = [item for item in items
+                     if item.get('expiry_date') and item['expiry_date'] < expiring_before]
+        if q:
+            q = q.lower()
+            items = [item for item in items
+                     if any(q in (item.get(field) or '').lower() for field in SEARCH_FIELDS)]
+        return items
+
+
+def paginate(items: List[dict], cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Página de `items` tras el lote con id `cursor` y cursor de la siguiente
+    (None si no hay más). ValueError si el cursor ya no está en la lista.
+    """
+    start = 0
+    if cursor:
+        start = next((i + 1 for i, item in enumerate(items) if item.get('id') == cursor), None)
+        if start is None:
+            raise ValueError(cursor)
+    end = len(items) if limit is None else start + limit
+    next_cursor = items[end - 1].get('id') if end < len(items) else None
+    return items[start:end], next_cursor
+
+
+def project(items: List[dict], fields: List[str]) -> List[dict]:
+    """Solo los campos pedidos de cada lote (el id siempre, para poder paginar)"""
+    keep = ['id'] + [field for field in fields if field != 'id']
+    return [{field: item[field] for field in keep if field in item} for item in items]
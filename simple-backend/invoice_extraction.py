@@ -0,0 +1,207 @@
+"""
+Extracción de texto de facturas (PDF, imágenes con OCR y texto plano)
+pdfplumber y Tesseract se ejecutan en un pool de procesos acotado para no
+bloquear el bucle de eventos de uvicorn mientras procesan un documento;
+las páginas de un PDF se reparten entre los procesos del pool. Los
+documentos se pasan por ruta (el temporal de la subida), no por contenido,
+para no copiarlos enteros a cada proceso
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
+
+# Tramos de páginas por proceso cuando se informa del progreso de un PDF
+PROGRESS_CHUNKS_PER_WORKER = 4
+
+# Subir al cambiar el texto que produce extract_text() (invalida la caché de texto)
+# 2: las imágenes pasan por ocr_preprocess antes de Tesseract
+EXTRACTOR_VERSION = 2
+
+
+class ExtractionTimeout(TimeoutError):
+    """Un documento ha superado el tiempo máximo de extracción"""
+
+
+def extract_text(filename: str, path: str, region: Optional[Tuple[float, float, float, float]] = None) -> str:
+    """
+    Texto del documento en `path` según la extensión de filename (se ejecuta
+    en un proceso del pool). En imágenes, `region` limita el OCR a esa parte
+    de la página (en fracciones), normalmente la tabla de líneas del proveedor.
+    """
+    name = filename.lower()
+    if name.endswith('.pdf'):
+        return extract_pdf_pages(path)
+
+    if name.endswith(IMAGE_EXTENSIONS):
+        from PIL import Image
+        import pytesseract
+        from ocr_preprocess import preprocess_image
+
+        with Image.open(path) as image:
+            # Grises, enderezada, recortada al texto y a ~300 DPI: una foto de
+            # 12 MP tal cual tarda mucho más en Tesseract sin leer mejor
+            prepared = preprocess_image(image, region)
+        return pytesseract.image_to_string(prepared, lang='spa+eng')
+
+    # Intentar leer como texto plano
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('latin-1', errors='ignore')
+
+
+def pdf_page_count(path: str) -> int:
+    """Número de páginas de un PDF (para repartirlas entre los procesos)"""
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(path: str, first: int = 0, last: Optional[int] = None) -> str:
+    """Texto de las páginas [first, last) de un PDF"""
+    import pdfplumber
+
+    text = ""
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[first:last]:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return text
+
+
+def page_ranges(n_pages: int, n_chunks: int) -> List[Tuple[int, int]]:
+    """Reparte n_pages en n_chunks tramos consecutivos de tamaño parecido"""
+    n_chunks = max(1, min(n_pages, n_chunks))
+    size, extra = divmod(n_pages, n_chunks)
+    ranges, first = [], 0
+    for chunk in range(n_chunks):
+        last = first + size + (1 if chunk < extra else 0)
+        ranges.append((first, last))
+        first = last
+    return ranges
+
+
+class _Deadline:
+    """Tiempo máximo de un documento: empieza a contar con su primera tarea"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.at: Optional[float] = None
+
+    def remaining(self, loop: asyncio.AbstractEventLoop) -> float:
+        """Segundos que le quedan (la primera llamada pone el reloj en marcha)"""
+        if self.at is None:
+            self.at = loop.time() + self.timeout
+        return self.at - loop.time()
+
+
+class ExtractionPool:
+    """
+    Pool de procesos para la extracción de texto.
+
+    - Como mucho `workers` tareas a la vez (un documento o un tramo de
+      páginas de un PDF); el resto espera su turno sin ocupar el bucle de
+      eventos, y el tiempo máximo cuenta desde que la tarea empieza, no
+      desde que entra en la cola. Un PDF repartido en tramos tiene un solo
+      tiempo máximo para todo el documento, desde que empieza su primera
+      tarea (si no, cada tramo podría tardar `timeout` segundos).
+    - Si una tarea supera `timeout` segundos se terminan los procesos del
+      pool (no se puede cancelar una tarea en curso) y se crea uno nuevo; las
+      tareas que estuvieran en curso en ese momento fallan también.
+    - workers=0 extrae en el propio proceso, como antes (solo para depurar).
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 60):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphores = {}
+
+    async def extract(self, filename: str, path: str, region: Optional[Tuple[float, float, float, float]] = None,
+                      progress: Optional[Callable[[int, int, str], None]] = None) -> str:
+        """
+        Texto del documento en `path`; las páginas de un PDF se extraen en
+        paralelo. progress(páginas, total de páginas, texto) se llama al
+        terminar cada tramo de páginas (una vez con 1, 1 si no es un PDF).
+        """
+        if self.workers > 1 and filename.lower().endswith('.pdf'):
+            deadline = _Deadline(self.timeout)
+            n_pages = await self.run(pdf_page_count, path, label=filename, deadline=deadline)
+            if n_pages > 1:
+                # Con alguien siguiendo el progreso, tramos más cortos (cada
+                # tramo vuelve a abrir el PDF, así que no de una página)
+                n_chunks = self.workers if progress is None else self.workers * PROGRESS_CHUNKS_PER_WORKER
+
+                async def extract_range(first: int, last: int) -> str:
+                    text = await self.run(extract_pdf_pages, path, first, last,
+                                          label=f"{filename} [{first + 1}-{last}]", deadline=deadline)
+                    if progress is not None:
+                        progress(last - first, n_pages, text)
+                    return text
+
+                parts = await asyncio.gather(*(
+                    extract_range(first, last) for first, last in page_ranges(n_pages, n_chunks)
+                ))
+                return "".join(parts)
+        text = await self.run(extract_text, filename, path, region, label=filename)
+        if progress is not None:
+            progress(1, 1, text)
+        return text
+
+    async def run(self, fn: Callable[..., Any], *args, label: str = "",
+                  deadline: Optional["_Deadline"] = None) -> Any:
+        """
+        Ejecuta fn(*args) en un proceso del pool (fn debe ser de nivel de
+        módulo). Con `deadline`, el tiempo máximo es el que le quede al
+        documento en vez de `timeout` segundos para esta tarea.
+        """
+        if self.workers <= 0:
+            return fn(*args)
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.workers)
+        async with self._semaphores[loop]:
+            if deadline is None:
+                deadline = _Deadline(self.timeout)
+            remaining = deadline.remaining(loop)
+            if remaining <= 0:
+                # Otro tramo del documento ya agotó el tiempo
+                raise ExtractionTimeout(f"{label or fn.__name__}: más de {self.timeout:g} s extrayendo el texto")
+            executor = self._get_executor()
+            future = loop.run_in_executor(executor, fn, *args)
+            try:
+                return await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                self._terminate(executor)
+                raise ExtractionTimeout(f"{label or fn.__name__}: más de {self.timeout:g} s extrayendo el texto")
+
+    def close(self) -> None:
+        """Detiene los procesos (apagado de la app)"""
+        if self._executor is not None:
+            self._terminate(self._executor)
+        self._semaphores.clear()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: hacer fork de un proceso con hilos (uvicorn, escritor del
+            # store) puede heredar locks tomados
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _terminate(self, executor: ProcessPoolExecutor) -> None:
+        if self._executor is executor:
+            self._executor = None
+        # ProcessPoolExecutor no permite matar un proceso concreto
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
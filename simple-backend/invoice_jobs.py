@@ -0,0 +1,230 @@
+"""
+Trabajos de análisis de facturas en segundo plano
+POST /analyze-invoice/jobs devuelve el id del trabajo al momento y el OCR
+sigue dentro del propio proceso (sin broker externo); el estado, con las
+páginas hechas y los items parciales de cada archivo, se consulta por
+sondeo o se sigue con server-sent events
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import jsoncodec
+
+# Cada cuánto se manda algo por SSE aunque no haya cambios (proxies y móviles
+# cortan las conexiones mudas) y cada cuánto se relee un trabajo de otro worker
+KEEPALIVE_SECONDS = 15
+POLL_SECONDS = 0.5
+
+
+class InvoiceJob:
+    """Estado de un trabajo: queued -> running -> done | error"""
+
+    def __init__(self, job_id: str, filenames: List[str]):
+        self.id = job_id
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.result: Optional[dict] = None
+        self.files = [
+            {"file": name, "status": "queued", "pages_done": 0, "pages_total": None, "items": [], "error": None}
+            for name in filenames
+        ]
+        self._changed = asyncio.Event()
+        self._on_change: Optional[Callable[["InvoiceJob"], None]] = None
+
+    def page_done(self, index: int, pages: int, pages_total: int, items: List[dict]) -> None:
+        """Un tramo de páginas del archivo `index` ya extraído, con sus items (provisionales)"""
+        entry = self.files[index]
+        entry["status"] = "running"
+        entry["pages_total"] = pages_total
+        entry["pages_done"] += pages
+        entry["items"] = entry["items"] + items
+        self._notify()
+
+    def file_done(self, index: int, items: List[dict], error: Optional[str]) -> None:
+        """Resultado definitivo de un archivo (sustituye a los items parciales)"""
+        entry = self.files[index]
+        entry["status"] = "error" if error else "done"
+        entry["pages_total"] = entry["pages_total"] or 1
+        entry["pages_done"] = entry["pages_total"]
+        entry["items"] = items
+        entry["error"] = error
+        self._notify()
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "files": self.files,
+            "pages_done": sum(entry["pages_done"] for entry in self.files),
+            "pages_total": sum(entry["pages_total"] or 1 for entry in self.files),
+            "items": [item for entry in self.files for item in entry["items"]],
+            "error": self.error,
+            "result": self.result,
+        }
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def _set_status(self, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        self.status = status
+        self.result = result
+        self.error = error
+        if status in ("done", "error"):
+            self.finished_at = time.time()
+        self._notify()
+
+    def _notify(self) -> None:
+        # Despertar a los que esperan y preparar el evento del siguiente cambio
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self._on_change is not None:
+            self._on_change(self)
+
+
+class JobQueue:
+    """
+    Trabajos en memoria del proceso.
+
+    - Como mucho `workers` trabajos a la vez; el resto espera en cola. Dentro
+      de un trabajo los documentos van al pool de extracción como siempre.
+    - Los trabajos terminados se olvidan a los `ttl` segundos.
+    - Con `persist_dir` (varios workers de uvicorn) cada cambio se guarda
+      también en <persist_dir>/<id>.json, para que cualquier worker pueda
+      responder por un trabajo que se está ejecutando en otro.
+    """
+
+    def __init__(self, workers: int = 2, ttl: float = 3600, persist_dir=None):
+        self.workers = workers
+        self.ttl = ttl
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._jobs: Dict[str, InvoiceJob] = {}
+        self._tasks = set()
+        self._semaphores = {}
+
+    def submit(self, filenames: List[str], run: Callable[[InvoiceJob], Awaitable[dict]]) -> InvoiceJob:
+        """Encola run(job), que va anotando el progreso en job y devuelve el resultado final"""
+        self._prune()
+        job = InvoiceJob(uuid.uuid4().hex, filenames)
+        if self.persist_dir is not None:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+            job._on_change = self._persist
+            self._persist(job)
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Estado del trabajo, o None si no existe (o ya caducó)"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self._read(job_id)
+
+    async def events(self, job_id: str) -> AsyncIterator[Optional[dict]]:
+        """
+        Estados sucesivos del trabajo hasta que termina (el último es el
+        final); None cada KEEPALIVE_SECONDS sin cambios.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            # De otro worker: releer su fichero
+            async for state in self._poll(job_id):
+                yield state
+            return
+        while True:
+            changed = job._changed
+            yield job.snapshot()
+            if job.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def close(self) -> None:
+        """Cancela los trabajos en curso (apagado de la app)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job: InvoiceJob, run: Callable[[InvoiceJob], Awaitable[dict]]) -> None:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.workers)
+        async with self._semaphores[loop]:
+            job._set_status("running")
+            try:
+                result = await run(job)
+            except Exception as e:
+                print(f"[JOBS] Trabajo {job.id} fallido: {e}")
+                job._set_status("error", error=str(e))
+            else:
+                job._set_status("done", result=result)
+
+    async def _poll(self, job_id: str) -> AsyncIterator[Optional[dict]]:
+        last, idle = None, 0.0
+        while True:
+            state = self._read(job_id)
+            if state is None:
+                return
+            if state != last:
+                yield state
+                last, idle = state, 0.0
+            elif idle >= KEEPALIVE_SECONDS:
+                yield None
+                idle = 0.0
+            if state["status"] in ("done", "error"):
+                return
+            await asyncio.sleep(POLL_SECONDS)
+            idle += POLL_SECONDS
+
+    def _prune(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.ttl:
+                del self._jobs[job_id]
+        if self.persist_dir is not None and self.persist_dir.exists():
+            for path in self.persist_dir.glob("*.json"):
+                try:
+                    if now - path.stat().st_mtime > self.ttl:
+                        path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, job_id: str) -> Optional[Path]:
+        # El id viene de la URL: solo hex, nada de rutas
+        if self.persist_dir is None or not job_id.isalnum():
+            return None
+        return self.persist_dir / f"{job_id}.json"
+
+    def _persist(self, job: InvoiceJob) -> None:
+        path = self._path(job.id)
+        fd, tmp_name = tempfile.mkstemp(dir=self.persist_dir, prefix=job.id + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(jsoncodec.dumps(job.snapshot()))
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _read(self, job_id: str) -> Optional[Any]:
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            return jsoncodec.loads(path.read_bytes())
+        except (FileNotFoundError, jsoncodec.DecodeError):
+            return None
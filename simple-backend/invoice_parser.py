@@ -0,0 +1,277 @@
+"""
+Parser de líneas de factura
+Clasifica las líneas (malta, lúpulo, levadura u otro) con una sola pasada
+de una expresión regular que combina todas las palabras clave y extrae
+cada item con los patrones precompilados del perfil del proveedor
+"""
+import re
+from typing import Callable, Dict, List, Optional
+
+# Subir al cambiar lo que devuelve parse_invoice_text(): las facturas ya
+# vistas se vuelven a parsear desde el texto en caché, sin repetir la extracción
+PARSER_VERSION = 1
+
+# Palabras que clasifican una línea, por categoría y en orden de prioridad:
+# una línea con "malta" y "lúpulo" es de malta
+LINE_KEYWORDS = {
+    "malt": ['malta', 'malt', 'carapils', 'amber'],
+    "hop": ['lúpulo', 'lupulo', 'hop', 'cascade', 'centennial', 'chinook', 'citra',
+            'mosaic', 'simcoe', 'amarillo', 'saaz', 'hallertau'],
+    "yeast": ['levadura', 'yeast', 'safale', 'saflager', 'wyeast', 'white labs'],
+    "other": ['clarificante', 'grifo', 'fermentador'],
+}
+CATEGORY_RANK = {category: rank for rank, category in enumerate(LINE_KEYWORDS)}
+KEYWORD_CATEGORY = {word: category for category, words in LINE_KEYWORDS.items() for word in words}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Alternancia de las palabras agrupada por prefijos comunes, como un árbol:
+    "m(?:alt(?:a)?|osaic)". En cada posición del texto se sigue una sola rama
+    en lugar de probar las palabras una a una. Si una palabra es prefijo de
+    otra gana la más larga (ninguna palabra clave es prefijo de una de otra
+    categoría).
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+KEYWORD_PATTERN = re.compile(_trie_pattern(list(KEYWORD_CATEGORY)))
+
+
+def classify_lines(text_lower: str) -> Dict[int, str]:
+    """
+    {número de línea: categoría} de las líneas con alguna palabra clave, en
+    una sola pasada sobre el texto en minúsculas. Cada búsqueda sigue en la
+    posición siguiente al inicio de la anterior, no al final, para ver también
+    palabras solapadas ("citramber" es malta); si hay varias gana la categoría
+    de más prioridad.
+    """
+    categories: Dict[int, str] = {}
+    line, line_start = 0, 0
+    search = KEYWORD_PATTERN.search
+    match = search(text_lower)
+    while match:
+        start = match.start()
+        line += text_lower.count('\n', line_start, start)
+        line_start = start
+        category = KEYWORD_CATEGORY[match.group()]
+        current = categories.get(line)
+        if current is None or CATEGORY_RANK[category] < CATEGORY_RANK[current]:
+            categories[line] = category
+        match = search(text_lower, start + 1)
+    return categories
+
+
+class SupplierProfile:
+    """Patrones y valores por defecto del formato de factura de un proveedor"""
+
+    def __init__(self, name: str, marker: str, **patterns):
+        self.name = name
+        # Texto que identifica las facturas del proveedor
+        self.marker = re.compile(marker, re.IGNORECASE)
+        # Tabla de líneas en las fotos de sus facturas, en fracciones de la
+        # zona con texto (izquierda, arriba, derecha, abajo); el OCR se limita
+        # a ella cuando se sabe de antemano el proveedor y el corte no pasa
+        # por encima de texto (ocr_preprocess). None: página entera
+        self.table_region = patterns.get("table_region")
+        # "Malta NOMBRE - CANTIDAD KG"
+        self.malt_item = re.compile(patterns.get(
+            "malt_item", r'(?:Malta|MALTA|Carapils|CARAPILS|Amber|AMBER)\s+(.+?)\s+-\s+(\d+(?:[.,]\d+)?)\s*(kg|g|KG|G)'
+        ), re.IGNORECASE)
+        # "precio € IVA% precio_unit € cantidad precio_total €"
+        self.price_with_vat = re.compile(patterns.get(
+            "price_with_vat", r'(\d+,\d+)\s+€\s+\d+,\d+\s+%\s+(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€'
+        ))
+        # "precio € cantidad precio_total €"
+        self.price = re.compile(patterns.get("price", r'(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€'))
+        self.hop_item = re.compile(patterns.get(
+            "hop_item", r'(?:Lúpulo|LÚPULO|Hop|HOP)\s+(.+?)\s+-?\s*(\d+)\s*g'
+        ), re.IGNORECASE)
+        self.yeast_item = re.compile(patterns.get(
+            "yeast_item", r'(?:Levadura|LEVADURA|Yeast|YEAST)\s+(.+)'
+        ), re.IGNORECASE)
+        self.quantity = re.compile(patterns.get("quantity", r'Cantidad:\s*(\d+)'))
+        self.pack_unit = re.compile(patterns.get(
+            "pack_unit", r'(\d+)\s+(pastillas|pastilla|g|ml|unidades)'
+        ), re.IGNORECASE)
+        self.name_suffix = re.compile(patterns.get("name_suffix", r'\s+(ENTERA|Entera|entera)$'))
+        # Costes estimados cuando la factura no trae precio
+        self.default_malt_cost = patterns.get("default_malt_cost", 3.0)
+        self.hop_cost_per_g = patterns.get("hop_cost_per_g", 0.05)
+        self.yeast_cost = patterns.get("yeast_cost", 3.5)
+        self.other_cost = patterns.get("other_cost", 3.0)
+
+
+# Medida sobre pedidos/Pedido Cocinista.pdf fotografiado: la tabla ocupa el
+# ancho entero del cuerpo y empieza a distinta altura en cada página, así que
+# solo se quitan la cabecera ("Pedido Cocinista") y el pie ("1 de 2", fecha)
+# que añade el navegador al imprimir (~9 % menos de imagen para el OCR)
+COCINISTA = SupplierProfile("Cocinista", marker=r'cocinista', table_region=(0.0, 0.025, 1.0, 0.975))
+
+# El primero cuyo marker aparezca en el texto; si ninguno, el primero
+PROFILES = [COCINISTA]
+
+
+def get_profile(name: Optional[str]) -> Optional[SupplierProfile]:
+    """Perfil por nombre de proveedor (sin distinguir mayúsculas), o None"""
+    if not name:
+        return None
+    name = name.strip().lower()
+    for profile in PROFILES:
+        if profile.name.lower() == name:
+            return profile
+    return None
+
+
+def detect_profile(text: str) -> SupplierProfile:
+    for profile in PROFILES:
+        if profile.marker.search(text):
+            return profile
+    return PROFILES[0]
+
+
+def _quantity_after(profile: SupplierProfile, lines: List[str], i: int) -> Optional[int]:
+    """Primer "Cantidad: N" en las tres líneas siguientes"""
+    for j in range(i + 1, min(i + 4, len(lines))):
+        match = profile.quantity.search(lines[j])
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _parse_malt(profile: SupplierProfile, lines: List[str], i: int, line: str, line_lower: str) -> Optional[dict]:
+    match = profile.malt_item.search(line)
+    if not match:
+        return None
+    name = match.group(1).strip()
+    base_quantity = float(match.group(2).replace(',', '.'))
+    unit = match.group(3).lower()
+
+    # La cantidad pedida y el total están al final de la línea o en las dos
+    # siguientes, tras los precios: "33,75 € 10,00 % 37,13 € 2 74,25 €"
+    context = ' '.join(lines[i:i + 3])
+    qty_count = 1
+    price_total = 0
+    price_match = profile.price_with_vat.search(context)
+    if price_match:
+        qty_count = int(price_match.group(3))
+        price_total = float(price_match.group(4).replace(',', '.'))
+    else:
+        price_match = profile.price.search(context)
+        if price_match:
+            qty_count = int(price_match.group(2))
+            price_total = float(price_match.group(3).replace(',', '.'))
+
+    if unit == 'g' and base_quantity >= 100:
+        base_quantity = base_quantity / 1000
+        unit = 'kg'
+    total_quantity = base_quantity * qty_count
+
+    # Precio por kg (precio total / cantidad total)
+    if price_total > 0 and total_quantity > 0:
+        price_per_kg = price_total / total_quantity
+    else:
+        price_per_kg = profile.default_malt_cost
+
+    return {
+        "name": profile.name_suffix.sub('', name).strip(),
+        "category": "malt",
+        "quantity": round(total_quantity, 2),
+        "unit": unit,
+        "cost": round(price_per_kg, 2)
+    }
+
+
+def _parse_hop(profile: SupplierProfile, lines: List[str], i: int, line: str, line_lower: str) -> Optional[dict]:
+    match = profile.hop_item.search(line)
+    if not match:
+        return None
+    quantity = int(match.group(2))
+    multiplier = _quantity_after(profile, lines, i)
+    if multiplier is not None:
+        quantity *= multiplier
+    return {
+        "name": match.group(1).strip(),
+        "category": "hop",
+        "quantity": quantity,
+        "unit": "g",
+        "cost": round(quantity * profile.hop_cost_per_g, 2)
+    }
+
+
+def _parse_yeast(profile: SupplierProfile, lines: List[str], i: int, line: str, line_lower: str) -> Optional[dict]:
+    match = profile.yeast_item.search(line)
+    if not match:
+        return None
+    quantity = _quantity_after(profile, lines, i) or 1
+    return {
+        "name": match.group(1).strip(),
+        "category": "yeast",
+        "quantity": quantity,
+        "unit": "pkt",
+        "cost": round(quantity * profile.yeast_cost, 2)
+    }
+
+
+def _parse_other(profile: SupplierProfile, lines: List[str], i: int, line: str, line_lower: str) -> Optional[dict]:
+    if 'clarificante' in line_lower:
+        name = "Clarificante para Cerveza"
+    elif 'grifo' in line_lower:
+        name = "Grifo para Fermentador"
+    else:
+        return None
+
+    # Formato ("10 pastillas", "25 g") y cantidad pedida en las líneas siguientes
+    context = ' '.join(lines[i:i + 4])
+    unit = "unidad"
+    unit_match = profile.pack_unit.search(context)
+    if unit_match:
+        unit = f"{unit_match.group(1)} {unit_match.group(2)}"
+    quantity = 1
+    price_match = profile.price.search(context)
+    if price_match:
+        quantity = int(price_match.group(2))
+    return {
+        "name": name,
+        "category": "other",
+        "quantity": quantity,
+        "unit": unit,
+        "cost": round(quantity * profile.other_cost, 2)
+    }
+
+
+# Categoría de la línea -> función que extrae el item (o None si no encaja)
+LINE_PARSERS: Dict[str, Callable[..., Optional[dict]]] = {
+    "malt": _parse_malt,
+    "hop": _parse_hop,
+    "yeast": _parse_yeast,
+    "other": _parse_other,
+}
+
+
+def parse_invoice_text(text: str, profile: Optional[SupplierProfile] = None) -> List[dict]:
+    """Ingredientes de una factura a partir de su texto, en el orden de las líneas"""
+    profile = profile or detect_profile(text)
+    text_lower = text.lower()
+    lines = text.split('\n')
+    lines_lower = text_lower.split('\n')
+    items = []
+    for i, category in classify_lines(text_lower).items():
+        item = LINE_PARSERS[category](profile, lines, i, lines[i], lines_lower[i])
+        if item is not None:
+            items.append(item)
+    return items
@@ -0,0 +1,149 @@
+"""
+Lectura incremental del JSON que va llegando token a token de la IA
+Solo interesa el objeto de primer nivel: en cuanto se cierra el valor de una
+de sus claves se devuelve ya parseado, y el texto de las claves de tipo
+cadena se va devolviendo según llega (para pintar style_analysis antes de
+que termine). Cada trozo se recorre una sola vez: solo se guarda lo que
+falta de la clave o el valor en curso, y el texto de una cadena a medias
+se decodifica por partes.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+# Eventos que devuelve feed():
+#   ("partial", clave, texto hasta ahora)  valor de tipo cadena a medias
+#   ("field", clave, valor)                valor completo
+Event = Tuple[str, str, Any]
+
+
+class JsonFieldStream:
+    """
+    stream = JsonFieldStream()
+    for chunk in tokens:
+        for kind, key, value in stream.feed(chunk): ...
+    stream.result()  # objeto completo al final
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        # Clave o valor del primer nivel que se está leyendo: los trozos ya
+        # leídos en `_captured` y, en el trozo actual, el índice donde empieza
+        # lo que falta (0 si viene de un trozo anterior)
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._captured: List[str] = []
+        # Valor de tipo cadena a medias: índice (en el trozo actual) desde el
+        # que falta decodificar, texto ya decodificado y un escape cortado
+        # al final del trozo anterior
+        self._string_start: Optional[int] = None
+        self._decoded = ""
+        self._undecoded = ""
+
+    def feed(self, chunk: str) -> List[Event]:
+        self._chunks.append(chunk)
+        events: List[Event] = []
+        for pos, char in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        # Fin de una clave del primer nivel
+                        self._key = json.loads(self._take(chunk, pos + 1))
+                        self._key_start = None
+                    elif self._depth == 1 and self._value_start is not None:
+                        self._finish(chunk, pos + 1, events)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = pos
+                    elif self._value_start is None:
+                        self._value_start = pos
+                        self._string_start = pos + 1
+            elif char in '{[':
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = pos
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._finish(chunk, pos + 1, events)
+                elif self._depth == 0 and self._value_start is not None:
+                    # Número, true/false/null justo antes de cerrar el objeto
+                    self._finish(chunk, pos, events)
+            elif self._depth == 1 and char == ',':
+                if self._value_start is not None:
+                    self._finish(chunk, pos, events)
+            elif self._depth == 1 and self._key is not None and self._value_start is None \
+                    and char not in ' \t\r\n:':
+                self._value_start = pos
+
+        if self._string_start is not None and self._decode(chunk[self._string_start:]):
+            events.append(("partial", self._key, self._decoded))
+        # Lo que queda de la clave o el valor sigue en el siguiente trozo
+        if self._key_start is not None:
+            self._captured.append(chunk[self._key_start:])
+            self._key_start = 0
+        elif self._value_start is not None:
+            self._captured.append(chunk[self._value_start:])
+            self._value_start = 0
+        if self._string_start is not None:
+            self._string_start = 0
+        return events
+
+    def result(self) -> Any:
+        """El JSON completo (json.JSONDecodeError si no lo está)"""
+        return json.loads("".join(self._chunks))
+
+    def _take(self, chunk: str, end: int) -> str:
+        """Texto de la clave o valor en curso hasta `end` del trozo actual"""
+        start = self._key_start if self._key_start is not None else self._value_start
+        self._captured.append(chunk[start:end])
+        raw = "".join(self._captured)
+        self._captured = []
+        return raw
+
+    def _finish(self, chunk: str, end: int, events: List[Event]) -> None:
+        raw = self._take(chunk, end).strip()
+        key = self._key
+        self._key = None
+        self._value_start = None
+        self._string_start = None
+        self._decoded = ""
+        self._undecoded = ""
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        events.append(("field", key, value))
+
+    def _decode(self, body: str) -> bool:
+        """
+        Decodifica el texto nuevo de la cadena a medias; True si ha crecido.
+        Un escape a medias (\\ o \\u00) al final, o la primera mitad de un
+        par suplente (\\ud83c), se deja para el siguiente trozo.
+        """
+        body = self._undecoded + body
+        for cut in range(0, 7):
+            try:
+                text = json.loads('"' + body[:len(body) - cut] + '"')
+            except json.JSONDecodeError:
+                continue
+            if text and '\ud800' <= text[-1] <= '\udbff':
+                cut += 6
+                text = text[:-1]
+            self._undecoded = body[len(body) - cut:] if cut else ""
+            self._decoded += text
+            return bool(text)
+        self._undecoded = body
+        return False
@@ -0,0 +1,38 @@
+"""
+Codificación JSON de Beergate Simple
+Usa orjson si está instalado y, si no, el módulo json estándar. Los ficheros
+de datos se guardan compactos; con BEERGATE_JSON_PRETTY=1 se guardan con
+sangría para poder leerlos y editarlos a mano
+"""
+import json
+import os
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # Sin orjson: mismo formato, más lento
+    orjson = None
+
+# Sangría en los ficheros de data/ (las respuestas HTTP van siempre compactas)
+PRETTY = os.getenv("BEERGATE_JSON_PRETTY", "").lower() in ("1", "true", "yes")
+
+# orjson.JSONDecodeError hereda de json.JSONDecodeError
+DecodeError = json.JSONDecodeError
+
+
+def dumps(data: Any, pretty: bool = False) -> bytes:
+    """JSON en UTF-8 (sin escapar tildes ni eñes)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
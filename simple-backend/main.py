@@ -2,17 +2,143 @@
 Beergate - Versión Simple
 Sistema de inventario cervecero con recomendaciones
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi import UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import UploadFile, File, Form
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from typing import Annotated, List, Optional
+from datetime import date, datetime
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import os
+import time
+import uuid
 from pathlib import Path
 
-app = FastAPI(title="Beergate Simple")
+import jsoncodec
+from http_cache import AssetCache, etag_matches
+from ai_client import create_ai_client
+from content_cache import ContentCache
+from invoice_extraction import EXTRACTOR_VERSION, ExtractionPool
+from invoice_jobs import InvoiceJob, JobQueue
+from invoice_parser import PARSER_VERSION, SupplierProfile, get_profile, parse_invoice_text
+from storage import create_store, dedupe_ids, lot_key
+from uploads import UploadTooLarge, spool_upload
+from inventory_view import InventoryView, paginate, project
+from json_stream import JsonFieldStream
+from semantic_cache import SemanticCache, fingerprint
+from recipe_prompt import build_messages, load_ingredients_info
+
+# Archivos de datos
+DATA_DIR = Path(os.getenv("BEERGATE_DATA_DIR", "data"))
+DATA_DIR.mkdir(exist_ok=True)
+INVENTORY_FILE = DATA_DIR / "inventory.json"
+PURCHASES_FILE = DATA_DIR / "purchases.json"
+CONVERSATIONS_FILE = DATA_DIR / "ai_conversations.json"
+BREWING_HISTORY_FILE = DATA_DIR / "brewing_history.json"
+
+SQLITE_DB_FILE = DATA_DIR / "beergate.db"
+
+# Almacén en memoria compartido por todo el proceso
+# BEERGATE_STORAGE=journal guarda inventario y compras como diario de cambios
+# BEERGATE_STORAGE=sqlite guarda todo en SQLITE_DB_FILE con búsquedas indexadas
+# WEB_CONCURRENCY > 1 (varios workers de uvicorn) coordina los ficheros entre procesos
+STORAGE_MODE = os.getenv("BEERGATE_STORAGE", "memory")
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+store = create_store(
+    STORAGE_MODE,
+    journaled=[INVENTORY_FILE, PURCHASES_FILE],
+    workers=WORKERS,
+    db_path=SQLITE_DB_FILE,
+    collections=[INVENTORY_FILE, PURCHASES_FILE, CONVERSATIONS_FILE, BREWING_HISTORY_FILE],
+)
+
+# index.html, manifest, service worker e ingredients_info servidos desde memoria
+assets = AssetCache()
+
+# Extracción de texto de facturas (pdfplumber / Tesseract) en procesos aparte
+extraction_pool = ExtractionPool(
+    workers=int(os.getenv("BEERGATE_OCR_WORKERS", "2")),
+    timeout=float(os.getenv("BEERGATE_OCR_TIMEOUT", "60")),
+)
+
+# Texto e items ya extraídos de cada factura, por SHA-256 de sus bytes
+invoice_cache = ContentCache(
+    DATA_DIR / "cache" / "invoices",
+    max_bytes=int(float(os.getenv("BEERGATE_INVOICE_CACHE_MB", "100")) * 1024 * 1024),
+)
+
+# Tamaño máximo de cada archivo subido a /analyze-invoice
+MAX_UPLOAD_BYTES = int(float(os.getenv("BEERGATE_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+
+# Análisis de facturas en segundo plano (POST /analyze-invoice/jobs); con
+# varios workers de uvicorn el estado se comparte por ficheros en data/jobs
+invoice_jobs = JobQueue(
+    workers=int(os.getenv("BEERGATE_INVOICE_JOBS", "2")),
+    persist_dir=DATA_DIR / "jobs" if WORKERS > 1 else None,
+)
+
+def optional_env(name: str, cast=str):
+    """Valor de la variable de entorno convertido con cast, o None si no está definida"""
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+# Cliente de IA compartido. BEERGATE_AI_PROVIDER elige el proveedor: 'openai'
+# (API key desde variable de entorno), 'local' (Ollama/llama.cpp en
+# OPENAI_BASE_URL) o 'fake' (sin red, para pruebas de carga); modelo, tiempo
+# máximo y concurrencia sin definir toman el valor por defecto del proveedor
+AI_PROVIDER = os.getenv("BEERGATE_AI_PROVIDER", "openai")
+ai_client = create_ai_client(
+    AI_PROVIDER,
+    # La clave de OpenAI no se manda a otros servidores
+    api_key=os.getenv("OPENAI_API_KEY", "") if AI_PROVIDER == "openai" else os.getenv("BEERGATE_AI_LOCAL_KEY", ""),
+    base_url=os.getenv("OPENAI_BASE_URL"),
+    model=optional_env("BEERGATE_AI_MODEL"),
+    timeout=optional_env("BEERGATE_AI_TIMEOUT", float),
+    concurrency=optional_env("BEERGATE_AI_CONCURRENCY", int),
+)
+
+# Tamaño máximo del prompt del recomendador (tokens) y de dónde sale la
+# relación ingrediente-estilo para elegir qué listar si no cabe todo
+AI_PROMPT_TOKENS = int(os.getenv("BEERGATE_AI_PROMPT_TOKENS", "2500"))
+INGREDIENTS_INFO_FILE = Path("ingredients_info.json")
+
+# Respuestas ya dadas por la IA, para peticiones casi iguales con el mismo
+# inventario (BEERGATE_AI_CACHE_SIZE=0 la desactiva)
+ai_cache = SemanticCache(
+    max_entries=int(os.getenv("BEERGATE_AI_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("BEERGATE_AI_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("BEERGATE_AI_CACHE_THRESHOLD", "0.9")),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STORAGE_MODE == "sqlite" and store.is_empty():
+        # Primera vez con SQLite: importar los data/*.json existentes
+        from sqlite_store import migrate_json_files
+        migrated = migrate_json_files(DATA_DIR, store)
+        print(f"[DATA] Migrados a SQLite: {migrated}")
+    
+    # Cargar los ficheros de datos una sola vez al arrancar
+    store.preload(INVENTORY_FILE, PURCHASES_FILE, CONVERSATIONS_FILE, BREWING_HISTORY_FILE)
+    ensure_unique_ids(INVENTORY_FILE)
+    ai_client.open()
+    yield
+    await ai_client.close()
+    await invoice_jobs.close()
+    extraction_pool.close()
+    # Volcar escrituras pendientes antes de salir
+    store.close()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con jsoncodec (orjson si está disponible)"""
+
+    def render(self, content) -> bytes:
+        return jsoncodec.dumps(content)
+
+app = FastAPI(title="Beergate Simple", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -23,14 +149,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Archivos de datos
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-INVENTORY_FILE = DATA_DIR / "inventory.json"
-PURCHASES_FILE = DATA_DIR / "purchases.json"
-CONVERSATIONS_FILE = DATA_DIR / "ai_conversations.json"
-BREWING_HISTORY_FILE = DATA_DIR / "brewing_history.json"
-
 # Modelos
 class IngredientCreate(BaseModel):
     name: str
@@ -55,14 +173,23 @@ class Purchase(BaseModel):
 
 # Funciones de datos
 def load_json(file_path):
-    if file_path.exists():
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    return []
+    """Documento cacheado en memoria (solo lectura)"""
+    return store.load(file_path)
 
 def save_json(file_path, data):
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    """Publica el documento en memoria y encola su escritura a disco"""
+    store.save(file_path, data)
+
+def ensure_unique_ids(file_path):
+    """Renumera ids repetidos (los generaba el antiguo <categoria>_<len + 1>)"""
+    with store.lock(file_path):
+        records = load_json(file_path)
+        fixed = dedupe_ids(records)
+        renamed = [(old, new) for old, new in zip(records, fixed) if old['id'] != new['id']]
+        for old, new in renamed:
+            print(f"[DATA] Id repetido en {file_path.name}: {new['name']} pasa de {old['id']} a {new['id']}")
+        if renamed:
+            save_json(file_path, fixed)
 
 # Endpoints
 
@@ -71,135 +198,233 @@ def root():
     return {"message": "Beergate Simple API", "version": "1.0"}
 
 @app.get("/index.html")
-def get_index():
+def get_index(request: Request):
     """Servir el frontend HTML"""
-    return FileResponse("index.html")
+    return assets.get("index.html", "text/html").response(request)
 
 @app.get("/manifest.json")
-def get_manifest():
+def get_manifest(request: Request):
     """Servir manifest.json para PWA"""
-    return FileResponse("manifest.json", media_type="application/json")
+    return assets.get("manifest.json", "application/json").response(request)
 
 @app.get("/service-worker.js")
-def get_service_worker():
+def get_service_worker(request: Request):
     """Servir service worker para PWA"""
-    return FileResponse("service-worker.js", media_type="application/javascript")
+    return assets.get("service-worker.js", "application/javascript").response(request)
 
 @app.get("/ingredients-info")
-def get_ingredients_info():
+def get_ingredients_info(request: Request):
     """Obtener información detallada de ingredientes para tooltips"""
     try:
-        with open("ingredients_info.json", "r", encoding="utf-8") as f:
-            return json.load(f)
+        # Se valida y compacta una vez por versión del fichero
+        asset = assets.get(
+            "ingredients_info.json", "application/json",
+            transform=lambda body: jsoncodec.dumps(jsoncodec.loads(body)),
+        )
     except FileNotFoundError:
         return {"malts": {}, "hops": {}, "yeasts": {}}
+    return asset.response(request)
 
 @app.get("/inventory")
-def get_inventory():
-    """Obtener todo el inventario"""
-    inventory = load_json(INVENTORY_FILE)
-    
-    # Agrupar por categoría
-    by_category = {}
-    for item in inventory:
-        cat = item.get('category', 'other')
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(item)
-    
-    return {
-        "items": inventory,
-        "by_category": by_category,
-        "total_items": len(inventory),
-        "total_value": sum(
-            (item.get('cost', 0) * item.get('quantity', 0) / 100 if item.get('category') == 'hop' else 
-             item.get('cost', 0) * item.get('quantity', 0))
-            for item in inventory
-        )
+def get_inventory(
+    request: Request,
+    category: Optional[str] = None,
+    supplier: Optional[str] = None,
+    expiring_before: Optional[date] = None,
+    q: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=1000)] = None,
+    cursor: Optional[str] = None,
+    summary: bool = False,
+):
+    """
+    Obtener el inventario (304 si el cliente ya tiene esta versión).
+
+    Sin parámetros devuelve todo: items, by_category y agregados.
+    - summary=true: solo los agregados (recuentos y valoración)
+    - category, supplier, expiring_before (YYYY-MM-DD), q (texto): filtros
+    - fields=id,name,quantity: solo esos campos de cada item
+    - limit y cursor: paginación; next_cursor es el cursor de la siguiente página
+    Con cualquiera de ellos la respuesta no incluye by_category.
+    """
+    etag = f'"{store.version(INVENTORY_FILE)}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # Agrupación por categoría y valoración mantenidas en cada escritura
+    with store.lock(INVENTORY_FILE):
+        etag = f'"{store.version(INVENTORY_FILE)}"'
+        snapshot = store.aggregate(INVENTORY_FILE, InventoryView)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if summary:
+        return FastJSONResponse(snapshot.summary, headers=headers)
+    if not any([category, supplier, expiring_before, q, fields, limit, cursor]):
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+    items = snapshot.select(category, supplier, expiring_before and expiring_before.isoformat(), q)
+    try:
+        page_items, next_cursor = paginate(items, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido: el item ya no está en el inventario")
+    if fields:
+        page_items = project(page_items, [field.strip() for field in fields.split(",") if field.strip()])
+
+    data = {
+        "items": page_items,
+        "count": len(page_items),
+        "total_matches": len(items),
+        "next_cursor": next_cursor,
+        **snapshot.summary,
     }
+    return Response(
+        content=jsoncodec.dumps(data),
+        media_type="application/json",
+        headers=headers,
+    )
+
+def merge_ingredients(ingredients: List[IngredientCreate]) -> List[dict]:
+    """
+    Fusiona varios ingredientes en el inventario en una sola pasada y un solo
+    guardado. Cada ingrediente se suma al lote con el mismo nombre y proveedor
+    (y caducidad, para lúpulos y levaduras) o crea un lote nuevo.
+    Devuelve por cada ingrediente {"name", "id", "action", "quantity"}.
+    """
+    results = []
+    with store.lock(INVENTORY_FILE):
+        pending = {}   # id -> lote ya modificado o creado en este lote de cambios
+        created = []   # ids de los lotes nuevos, en orden, para casar líneas repetidas
+        for ingredient in ingredients:
+            # Para lúpulos y levaduras, considerar también la fecha de caducidad;
+            # para maltas y otros, solo el proveedor
+            match_expiry = ingredient.category in ['hop', 'yeast']
+            if match_expiry:
+                existing = store.find_lot(INVENTORY_FILE, ingredient.name, ingredient.supplier, ingredient.expiry_date)
+            else:
+                existing = store.find_lot(INVENTORY_FILE, ingredient.name, ingredient.supplier)
+            if existing:
+                existing = pending.get(existing['id'], existing)
+            else:
+                key = (ingredient.name.lower(), ingredient.supplier or '', ingredient.expiry_date)
+                existing = next(
+                    (pending[lot_id] for lot_id in created
+                     if lot_key(pending[lot_id])[:2] == key[:2]
+                     and (not match_expiry or lot_key(pending[lot_id])[2] == key[2])),
+                    None,
+                )
+
+            if existing:
+                # Actualizar cantidad del item existente
+                item = dict(existing)
+                item['quantity'] += ingredient.quantity
+                item['cost'] = ingredient.cost or existing.get('cost', 0)
+                action = "merged"
+            else:
+                # Agregar nuevo item (diferente proveedor o fecha de caducidad)
+                item = ingredient.dict()
+                item['id'] = store.new_id(INVENTORY_FILE, ingredient.category, reserved=pending)
+                item['created_at'] = datetime.now().isoformat()
+                action = "created"
+                created.append(item['id'])
+
+            pending[item['id']] = item
+            results.append({"name": item['name'], "id": item['id'], "action": action, "quantity": item['quantity']})
+
+        store.put_many(INVENTORY_FILE, list(pending.values()))
+    return results
 
 @app.post("/inventory")
 def add_ingredient(ingredient: IngredientCreate):
     """Agregar un ingrediente al inventario"""
-    inventory = load_json(INVENTORY_FILE)
-    
-    # Buscar si ya existe con el mismo nombre, proveedor y fecha de caducidad
-    # Para lúpulos y levaduras, considerar también la fecha de caducidad
-    existing = None
-    for item in inventory:
-        if item['name'].lower() == ingredient.name.lower():
-            # Mismo nombre - verificar si es realmente el mismo item
-            same_supplier = item.get('supplier', '') == getattr(ingredient, 'supplier', '')
-            
-            # Para lúpulos y levaduras, también comparar fecha de caducidad
-            if ingredient.category in ['hop', 'yeast']:
-                same_expiry = item.get('expiry_date') == ingredient.expiry_date
-                if same_supplier and same_expiry:
-                    existing = item
-                    break
-            else:
-                # Para maltas y otros, solo verificar proveedor
-                if same_supplier:
-                    existing = item
-                    break
-    
-    if existing:
-        # Actualizar cantidad del item existente
-        existing['quantity'] += ingredient.quantity
-        existing['cost'] = ingredient.cost or existing.get('cost', 0)
-    else:
-        # Agregar nuevo item (diferente proveedor o fecha de caducidad)
-        new_item = ingredient.dict()
-        new_item['id'] = f"{ingredient.category}_{len(inventory) + 1}"
-        new_item['created_at'] = datetime.now().isoformat()
-        inventory.append(new_item)
-    
-    save_json(INVENTORY_FILE, inventory)
-    return {"message": "Ingrediente agregado", "inventory": inventory}
+    merge_ingredients([ingredient])
+    return {"message": "Ingrediente agregado", "inventory": load_json(INVENTORY_FILE)}
 
 @app.put("/inventory/{item_id}")
 def update_ingredient(item_id: str, updates: dict):
     """Actualizar campos de un ingrediente (quantity, cost, supplier, etc)"""
-    inventory = load_json(INVENTORY_FILE)
-    
-    item = next((i for i in inventory if i['id'] == item_id), None)
-    if not item:
-        raise HTTPException(status_code=404, detail="Ingrediente no encontrado")
-    
-    # Actualizar los campos proporcionados
-    for key, value in updates.items():
-        if key in ['quantity', 'cost', 'supplier', 'category', 'expiry_date']:
-            item[key] = value
-    
-    item['updated_at'] = datetime.now().isoformat()
-    save_json(INVENTORY_FILE, inventory)
+    with store.lock(INVENTORY_FILE):
+        item = store.get(INVENTORY_FILE, item_id)
+        if not item:
+            raise HTTPException(status_code=404, detail="Ingrediente no encontrado")
+        
+        # Actualizar los campos proporcionados
+        item = dict(item)
+        for key, value in updates.items():
+            if key in ['quantity', 'cost', 'supplier', 'category', 'expiry_date']:
+                item[key] = value
+        
+        item['updated_at'] = datetime.now().isoformat()
+        store.put(INVENTORY_FILE, item)
     return {"message": "Ingrediente actualizado", "item": item}
 
 @app.delete("/inventory/{item_id}")
 def delete_ingredient(item_id: str):
     """Eliminar un ingrediente"""
-    inventory = load_json(INVENTORY_FILE)
-    inventory = [i for i in inventory if i['id'] != item_id]
-    save_json(INVENTORY_FILE, inventory)
+    store.delete(INVENTORY_FILE, item_id)
     return {"message": "Ingrediente eliminado"}
 
+def purchase_errors(purchases: List[Purchase]) -> List[str]:
+    """Líneas de compra que no se pueden sumar al inventario"""
+    errors = []
+    for i, purchase in enumerate(purchases):
+        for j, item in enumerate(purchase.items):
+            where = f"compra {i} ({purchase.date}, {purchase.supplier}), línea {j}"
+            if not item.name.strip():
+                errors.append(f"{where}: falta el nombre")
+            if item.quantity < 0:
+                errors.append(f"{where}: cantidad no válida ({item.quantity})")
+    return errors
+
+def record_purchases(purchases: List[Purchase]) -> List[dict]:
+    """
+    Valida todas las compras antes de escribir nada y después guarda los
+    registros de compra con un solo guardado y el inventario con otro.
+    Devuelve por cada compra {"purchase", "items"} con el resultado de cada línea.
+    """
+    errors = purchase_errors(purchases)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    # Guardar compras
+    with store.lock(PURCHASES_FILE):
+        records = []
+        reserved = set()
+        for purchase in purchases:
+            record = purchase.dict()
+            record['id'] = store.new_id(PURCHASES_FILE, "purchase", reserved=reserved)
+            record['created_at'] = datetime.now().isoformat()
+            reserved.add(record['id'])
+            records.append(record)
+        store.put_many(PURCHASES_FILE, records)
+
+    # Actualizar inventario (todas las líneas de todas las compras a la vez)
+    results = merge_ingredients([item for purchase in purchases for item in purchase.items])
+
+    recorded = []
+    for record, purchase in zip(records, purchases):
+        recorded.append({"purchase": record, "items": results[:len(purchase.items)]})
+        results = results[len(purchase.items):]
+    return recorded
+
 @app.post("/purchases")
 def add_purchase(purchase: Purchase):
     """Registrar una compra y actualizar inventario"""
-    purchases = load_json(PURCHASES_FILE)
-    
-    # Guardar compra
-    purchase_record = purchase.dict()
-    purchase_record['id'] = f"purchase_{len(purchases) + 1}"
-    purchase_record['created_at'] = datetime.now().isoformat()
-    purchases.append(purchase_record)
-    save_json(PURCHASES_FILE, purchases)
-    
-    # Actualizar inventario
-    for item in purchase.items:
-        add_ingredient(item)
-    
-    return {"message": "Compra registrada", "purchase": purchase_record}
+    recorded = record_purchases([purchase])[0]
+    return {"message": "Compra registrada", **recorded}
+
+@app.post("/purchases/bulk")
+def add_purchases_bulk(purchases: List[Purchase]):
+    """Registrar varias compras (p.ej. facturas históricas) con un único guardado"""
+    if not purchases:
+        raise HTTPException(status_code=422, detail="No hay compras que registrar")
+    recorded = record_purchases(purchases)
+    items = [result for entry in recorded for result in entry["items"]]
+    return {
+        "message": f"{len(recorded)} compras registradas",
+        "purchases": recorded,
+        "merged": sum(1 for result in items if result["action"] == "merged"),
+        "created": sum(1 for result in items if result["action"] == "created"),
+    }
 
 @app.get("/purchases")
 def get_purchases():
@@ -288,228 +513,77 @@ def get_recommendations():
         "total_recipes": len(recipes)
     }
 
-@app.post("/analyze-invoice")
-async def analyze_invoice(files: List[UploadFile] = File(...)):
-    """Analizar facturas subidas y extraer ingredientes usando OCR y patrones"""
-    import re
-    import io
-    from PIL import Image
-    import pytesseract
-    import pdfplumber
-    
-    extracted_items = []
-    
-    for file in files:
-        try:
-            content = await file.read()
-            text = ""
-            
-            # Detectar tipo de archivo y extraer texto
-            if file.filename.lower().endswith('.pdf'):
-                # Procesar PDF
-                with pdfplumber.open(io.BytesIO(content)) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-            
-            elif file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')):
-                # Procesar imagen con OCR
-                image = Image.open(io.BytesIO(content))
-                text = pytesseract.image_to_string(image, lang='spa+eng')
-            
-            elif file.filename.lower().endswith('.xcf'):
-                # XCF es formato GIMP, no podemos procesarlo directamente
-                return {
-                    "items": [],
-                    "error": "❌ Archivos .xcf (GIMP) no soportados\n\n📋 Solución:\n1. Abre el archivo en GIMP\n2. Ve a Archivo → Exportar como...\n3. Guarda como PNG o JPG\n4. Sube el archivo exportado aquí\n\nO bien, si tienes la factura en PDF, súbela directamente.",
-                    "confidence": 0.0
-                }
-            
-            elif file.filename.lower().endswith(('.doc', '.docx')):
-                # Retornar mensaje para Word
-                return {
-                    "items": [],
-                    "error": "❌ Formato Word no soportado. Exporta como PDF e intenta de nuevo.",
-                    "confidence": 0.0
-                }
-            
-            else:
-                # Intentar leer como texto plano
-                try:
-                    text = content.decode('utf-8')
-                except:
-                    text = content.decode('latin-1', errors='ignore')
-            
-            # ESTRATEGIA: Buscar líneas con estructura de factura
-            # Formato típico: "NOMBRE DEL PRODUCTO ... Cantidad: X Precio: Y"
-            lines = text.split('\n')
-            
-            # Patrones para líneas de items
-            # Buscar patrones como "MALTA PALE ALE - 25 KG" seguido de cantidad
-            item_patterns = [
-                # Formato: Malta NOMBRE - CANTIDAD KG/G ... Cantidad: X
-                r'Malta\s+(.+?)\s+-\s+(\d+(?:[.,]\d+)?)\s*(kg|g)\s+.*?Cantidad:\s*(\d+)',
-                # Formato: MALTA NOMBRE ... Cantidad: X
-                r'MALTA\s+(.+?)\s+.*?Cantidad:\s*(\d+)',
-                # Formato general: palabra clave + nombre + cantidad
-                r'(Carapils|Amber|Clarificante|Grifo)\s+(.+?)\s+.*?Cantidad:\s*(\d+)',
-            ]
-            
-            # Diccionario para mapear nombres a categorías
-            malt_keywords = ['malta', 'malt', 'pale', 'pilsner', 'munich', 'vienna', 'wheat', 'trigo', 
-                           'crystal', 'caramel', 'chocolate', 'cara', 'melano', 'aroma', 'biscuit',
-                           'amber', 'carapils']
-            hop_keywords = ['lúpulo', 'lupulo', 'hop', 'cascade', 'centennial', 'chinook', 'citra', 
-                          'mosaic', 'simcoe', 'amarillo', 'saaz', 'hallertau']
-            yeast_keywords = ['levadura', 'yeast', 'safale', 'saflager', 'wyeast', 'white labs']
-            
-            # Buscar items línea por línea con contexto
-            i = 0
-            while i < len(lines):
-                line = lines[i]
-                line_lower = line.lower()
-                
-                # Buscar patrones de malta con cantidad en la misma línea o siguiente
-                if 'malta' in line_lower or 'malt' in line_lower or 'carapils' in line_lower or 'amber' in line_lower:
-                    # Intentar extraer nombre y cantidad
-                    # Formato: "Malta NOMBRE - CANTIDAD KG"
-                    match = re.search(r'(?:Malta|MALTA|Carapils|CARAPILS|Amber|AMBER)\s+(.+?)\s+-\s+(\d+(?:[.,]\d+)?)\s*(kg|g|KG|G)', line, re.IGNORECASE)
-                    if match:
-                        name = match.group(1).strip()
-                        quantity_str = match.group(2).replace(',', '.')
-                        unit = match.group(3).lower()
-                        
-                        # Buscar cantidad: está en el mismo contexto, formato "Cantidad: ... número"
-                        # El número suele estar al final después de precios
-                        # Ejemplo: "33,75 € 10,00 % 37,13 € 2 74,25 €"
-                        # Donde: precio base, IVA%, precio unitario, cantidad, precio total
-                        context = ' '.join(lines[i:min(i+3, len(lines))])
-                        
-                        # Buscar patrón más específico que incluye el IVA
-                        # Formato: "precio € IVA% precio_unit € cantidad precio_total €"
-                        qty_match = re.search(r'(\d+,\d+)\s+€\s+\d+,\d+\s+%\s+(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
-                        qty_count = 1
-                        price_total = 0
-                        if qty_match:
-                            qty_count = int(qty_match.group(3))
-                            price_total = float(qty_match.group(4).replace(',', '.'))
-                        else:
-                            # Patrón alternativo sin IVA
-                            qty_match = re.search(r'(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
-                            if qty_match:
-                                qty_count = int(qty_match.group(2))
-                                price_total = float(qty_match.group(3).replace(',', '.'))
-                        
-                        # Calcular cantidad total
-                        base_quantity = float(quantity_str)
-                        if unit == 'g' and base_quantity >= 100:
-                            base_quantity = base_quantity / 1000
-                            unit = 'kg'
-                        
-                        total_quantity = base_quantity * qty_count
-                        
-                        # Calcular precio por kg (precio total / cantidad total)
-                        if price_total > 0 and total_quantity > 0:
-                            price_per_kg = price_total / total_quantity
-                        else:
-                            price_per_kg = 3.0  # Estimación por defecto
-                        
-                        # Limpiar nombre
-                        name = re.sub(r'\s+(ENTERA|Entera|entera)$', '', name).strip()
-                        
-                        extracted_items.append({
-                            "name": name,
-                            "category": "malt",
-                            "quantity": round(total_quantity, 2),
-                            "unit": unit,
-                            "cost": round(price_per_kg, 2)
-                        })
-                
-                # Buscar lúpulos
-                elif any(kw in line_lower for kw in hop_keywords):
-                    match = re.search(r'(?:Lúpulo|LÚPULO|Hop|HOP)\s+(.+?)\s+-?\s*(\d+)\s*g', line, re.IGNORECASE)
-                    if match:
-                        name = match.group(1).strip()
-                        quantity = int(match.group(2))
-                        
-                        # Buscar multiplicador de cantidad
-                        for j in range(i+1, min(i+4, len(lines))):
-                            qty_match = re.search(r'Cantidad:\s*(\d+)', lines[j])
-                            if qty_match:
-                                quantity *= int(qty_match.group(1))
-                                break
-                        
-                        extracted_items.append({
-                            "name": name,
-                            "category": "hop",
-                            "quantity": quantity,
-                            "unit": "g",
-                            "cost": round(quantity * 0.05, 2)
-                        })
-                
-                # Buscar levaduras
-                elif any(kw in line_lower for kw in yeast_keywords):
-                    match = re.search(r'(?:Levadura|LEVADURA|Yeast|YEAST)\s+(.+)', line, re.IGNORECASE)
-                    if match:
-                        name = match.group(1).strip()
-                        quantity = 1
-                        
-                        for j in range(i+1, min(i+4, len(lines))):
-                            qty_match = re.search(r'Cantidad:\s*(\d+)', lines[j])
-                            if qty_match:
-                                quantity = int(qty_match.group(1))
-                                break
-                        
-                        extracted_items.append({
-                            "name": name,
-                            "category": "yeast",
-                            "quantity": quantity,
-                            "unit": "pkt",
-                            "cost": round(quantity * 3.5, 2)
-                        })
-                
-                # Buscar clarificantes y otros ingredientes
-                elif 'clarificante' in line_lower or 'grifo' in line_lower or 'fermentador' in line_lower:
-                    # Buscar nombre del producto
-                    if 'clarificante' in line_lower:
-                        name = "Clarificante para Cerveza"
-                    elif 'grifo' in line_lower:
-                        name = "Grifo para Fermentador"
-                    else:
-                        continue
-                    
-                    quantity = 1
-                    unit = "unidad"
-                    
-                    # Buscar cantidad y unidad en el contexto
-                    context = ' '.join(lines[i:min(i+4, len(lines))])
-                    
-                    # Buscar patrones como "10 pastillas", "25 g", etc.
-                    unit_match = re.search(r'(\d+)\s+(pastillas|pastilla|g|ml|unidades)', context, re.IGNORECASE)
-                    if unit_match:
-                        unit = f"{unit_match.group(1)} {unit_match.group(2)}"
-                    
-                    # Buscar cantidad pedida (patrón de precio)
-                    qty_match = re.search(r'(\d+,\d+)\s+€\s+(\d+)\s+(\d+,\d+)\s+€', context)
-                    if qty_match:
-                        quantity = int(qty_match.group(2))
-                    
-                    extracted_items.append({
-                        "name": name,
-                        "category": "other",
-                        "quantity": quantity,
-                        "unit": unit,
-                        "cost": round(quantity * 3.0, 2)
-                    })
-                
-                i += 1
-            
-        except Exception as e:
-            print(f"Error procesando {file.filename}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
+def unsupported_format(filename: str) -> Optional[str]:
+    """Motivo por el que no se puede analizar el archivo, o None"""
+    lower_name = filename.lower()
+    if lower_name.endswith('.xcf'):
+        # XCF es formato GIMP, no podemos procesarlo directamente
+        return f"❌ {filename}: archivos .xcf (GIMP) no soportados\n\n📋 Solución:\n1. Abre el archivo en GIMP\n2. Ve a Archivo → Exportar como...\n3. Guarda como PNG o JPG\n4. Sube el archivo exportado aquí\n\nO bien, si tienes la factura en PDF, súbela directamente."
+    if lower_name.endswith(('.doc', '.docx')):
+        return f"❌ {filename}: formato Word no soportado. Exporta como PDF e intenta de nuevo."
+    return None
+
+async def spool_invoices(files: List[UploadFile]):
+    """[(archivo en disco o None, motivo si no se puede analizar)] de cada subida"""
+    spooled = []
+    try:
+        for file in files:
+            error = unsupported_format(file.filename)
+            if error:
+                spooled.append((None, error))
+                continue
+            try:
+                # A disco por bloques, con el SHA-256 calculado por el camino
+                spooled.append((await spool_upload(file, MAX_UPLOAD_BYTES), None))
+            except UploadTooLarge as e:
+                spooled.append((None, f"❌ {file.filename}: {e}"))
+    except BaseException:
+        # Error de lectura o petición cancelada: fuera los temporales ya copiados
+        close_spooled(spooled)
+        raise
+    return spooled
+
+def close_spooled(spooled) -> None:
+    """Borra los temporales de spool_invoices (se puede llamar más de una vez)"""
+    for upload, _ in spooled:
+        if upload is not None:
+            upload.close()
+
+async def analyze_file(upload, profile: Optional[SupplierProfile] = None, progress=None):
+    """
+    Items de un archivo de factura ya copiado a disco y, si no se pudo
+    procesar, el motivo. Con el perfil del proveedor el OCR de fotos se
+    limita a su tabla de líneas; progress se pasa a extraction_pool.extract().
+    """
+    filename = upload.filename
+    try:
+        digest = upload.digest
+        region = profile.table_region if profile else None
+        scope = f".{profile.name.lower()}" if profile else ""
+        text_key = f"{digest}.text.e{EXTRACTOR_VERSION}" + (scope if region else "")
+        items_key = f"{digest}.items.e{EXTRACTOR_VERSION}.p{PARSER_VERSION}{scope}"
+        items = invoice_cache.get(items_key)
+        if items is not None:
+            return items, None
+        
+        text = invoice_cache.get(text_key)
+        if text is None:
+            # PDF, imagen (OCR) o texto plano, fuera del bucle de eventos
+            text = await extraction_pool.extract(filename, upload.path, region, progress)
+            invoice_cache.put(text_key, text)
+        items = parse_invoice_text(text, profile)
+        invoice_cache.put(items_key, items)
+        return items, None
+    except Exception as e:
+        print(f"Error procesando {filename}: {e}")
+        import traceback
+        traceback.print_exc()
+        return [], f"❌ {filename}: no se pudo procesar ({e})"
+
+def invoice_analysis(filenames: List[str], results, profile: Optional[SupplierProfile] = None) -> dict:
+    """Respuesta de /analyze-invoice a partir de los (items, error) de cada archivo"""
+    extracted_items = [item for items, _ in results for item in items]
+    errors = [{"file": name, "error": error} for name, (_, error) in zip(filenames, results) if error]
     
     # Eliminar duplicados
     unique_items = []
@@ -521,6 +595,13 @@ async def analyze_invoice(files: List[UploadFile] = File(...)):
             unique_items.append(item)
     
     if not unique_items:
+        if errors:
+            return {
+                "items": [],
+                "error": "\n\n".join(e["error"] for e in errors),
+                "errors": errors,
+                "confidence": 0.0
+            }
         return {
             "items": [],
             "note": "⚠️ No se detectaron ingredientes cerveceros en los archivos. Verifica el formato y contenido.",
@@ -529,26 +610,255 @@ async def analyze_invoice(files: List[UploadFile] = File(...)):
     
     return {
         "items": unique_items,
-        "supplier": "Cocinista",
+        "supplier": profile.name if profile else "Cocinista",
         "total": sum(item['cost'] * item['quantity'] for item in unique_items),
         "confidence": 0.8,
-        "note": f"✅ Se extrajeron {len(unique_items)} items. Revisa las cantidades y costos antes de guardar."
+        "note": f"✅ Se extrajeron {len(unique_items)} items. Revisa las cantidades y costos antes de guardar.",
+        "errors": errors
     }
 
+async def analyze_spooled(spooled, profile: Optional[SupplierProfile] = None, job: Optional[InvoiceJob] = None):
+    """(items, error) de cada archivo, en paralelo; con job se va anotando el progreso"""
+    async def analyze(index, upload, error):
+        if upload is None:
+            result = [], error
+        else:
+            progress = None
+            if job is not None:
+                def progress(pages, total, text):
+                    # Items provisionales de cada tramo de páginas según se extrae
+                    job.page_done(index, pages, total, parse_invoice_text(text, profile))
+            with upload:
+                result = await analyze_file(upload, profile, progress)
+        if job is not None:
+            job.file_done(index, *result)
+        return result
+    
+    try:
+        return await asyncio.gather(*(analyze(index, upload, error) for index, (upload, error) in enumerate(spooled)))
+    finally:
+        # Si se cancela, los análisis que no llegaron a empezar no han borrado su temporal
+        close_spooled(spooled)
+
+@app.post("/analyze-invoice")
+async def analyze_invoice(files: List[UploadFile] = File(...), supplier: Optional[str] = Form(None)):
+    """
+    Analizar facturas subidas y extraer ingredientes usando OCR y patrones.
+    Los archivos (y las páginas de cada PDF) se procesan en paralelo y los
+    items se devuelven en el orden de los archivos; si alguno falla se
+    conservan los de los demás y el motivo va en "errors".
+    """
+    # Proveedor elegido en el formulario (opcional); si no, se detecta por el texto
+    profile = get_profile(supplier)
+    results = await analyze_spooled(await spool_invoices(files), profile)
+    return invoice_analysis([file.filename for file in files], results, profile)
+
+@app.post("/analyze-invoice/jobs", status_code=202)
+async def submit_invoice_job(files: List[UploadFile] = File(...), supplier: Optional[str] = Form(None)):
+    """
+    Como /analyze-invoice, pero responde en cuanto los archivos están en
+    disco, sin esperar al OCR. El progreso (páginas hechas e items parciales
+    de cada archivo) y al final el resultado de /analyze-invoice, en "result",
+    se consultan en GET /analyze-invoice/{job_id} o se siguen en
+    GET /analyze-invoice/{job_id}/events.
+    """
+    profile = get_profile(supplier)
+    filenames = [file.filename for file in files]
+    # Copiar antes de responder: las subidas se cierran con la petición
+    spooled = await spool_invoices(files)
+    
+    async def run(job: InvoiceJob) -> dict:
+        results = await analyze_spooled(spooled, profile, job)
+        return invoice_analysis(filenames, results, profile)
+    
+    try:
+        job = invoice_jobs.submit(filenames, run)
+    except BaseException:
+        close_spooled(spooled)
+        raise
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/analyze-invoice/{job.id}",
+        "events_url": f"/analyze-invoice/{job.id}/events",
+    }
+
+@app.get("/analyze-invoice/{job_id}")
+def get_invoice_job(job_id: str):
+    """Estado de un trabajo: status (queued, running, done, error), progreso y result al terminar"""
+    state = invoice_jobs.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return state
+
+@app.get("/analyze-invoice/{job_id}/events")
+async def invoice_job_events(job_id: str):
+    """
+    Server-sent events con el estado del trabajo: "progress" en cada cambio
+    y "done" con el estado final (también si ha fallado).
+    """
+    if invoice_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    
+    async def stream():
+        async for state in invoice_jobs.events(job_id):
+            if state is None:
+                yield b": keepalive\n\n"
+                continue
+            event = "done" if state["status"] in ("done", "error") else "progress"
+            yield b"event: " + event.encode() + b"\ndata: " + jsoncodec.dumps(state) + b"\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # =============================================
 # RECOMENDADOR DE RECETAS CON IA
 # =============================================
 
-from openai import OpenAI
-import os
+import openai
 
-# API Key de OpenAI (carga desde variable de entorno)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 WATER_PROFILE_FILE = DATA_DIR / "water_profile.json"
 
 class RecipeRequest(BaseModel):
     user_prompt: str  # Lo que el usuario quiere hacer
 
+def timestamped_id(prefix: str) -> str:
+    """<prefijo>_<fecha>_<hora>_<sufijo aleatorio>: único aunque haya varios en el mismo segundo"""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def recommender_context(user_prompt: str) -> dict:
+    """Inventario, caducidades y perfil de agua, los mensajes para la IA y su huella para la caché"""
+    # Cargar datos
+    inventory = load_json(INVENTORY_FILE)
+    print(f"[AI] Inventario cargado: {len(inventory)} items")
+    
+    # Cargar perfil de agua con manejo de errores
+    water_profile = {}
+    if WATER_PROFILE_FILE.exists():
+        water_profile = load_json(WATER_PROFILE_FILE)
+        print(f"[AI] Perfil de agua cargado")
+    else:
+        print(f"[AI] WARNING: No se encontró water_profile.json, usando valores por defecto")
+        water_profile = {
+            "parameters": {"ph": 6.1, "calcium": 13.7, "magnesium": 3.6, "sodium": 12.28, 
+                          "chloride": 14.4, "sulfate": 8.3, "bicarbonate": 0, "carbonate": 31.33},
+            "derived": {"total_hardness_ppm": 48.2, "residual_alkalinity": 23.9}
+        }
+    
+    # Analizar inventario
+    hops_inventory = [item for item in inventory if item['category'] == 'hop']
+    malts_inventory = [item for item in inventory if item['category'] == 'malt']
+    yeast_inventory = [item for item in inventory if item['category'] == 'yeast']
+    
+    # Detectar ingredientes próximos a caducar
+    today = datetime.now()
+    expiring_soon = []
+    for item in hops_inventory + yeast_inventory:
+        if item.get('expiry_date'):
+            expiry = datetime.strptime(item['expiry_date'], '%Y-%m-%d')
+            days_to_expire = (expiry - today).days
+            if days_to_expire < 60:  # Menos de 2 meses
+                expiring_soon.append({
+                    'name': item['name'],
+                    'category': item['category'],
+                    'quantity': item['quantity'],
+                    'days_to_expire': days_to_expire,
+                    'expiry_date': item['expiry_date']
+                })
+    
+    # Ordenar por fecha de caducidad
+    expiring_soon.sort(key=lambda x: x['days_to_expire'])
+    
+    # Prompt acotado: prefijo fijo y los ingredientes más útiles para la petición
+    prompt = build_messages(
+        user_prompt,
+        {"malt": malts_inventory, "hop": hops_inventory, "yeast": yeast_inventory},
+        expiring_soon,
+        water_profile,
+        load_ingredients_info(INGREDIENTS_INFO_FILE),
+        max_tokens=AI_PROMPT_TOKENS,
+        model=ai_client.model,
+    )
+    print(f"[AI] Prompt de ~{prompt.tokens} tokens ({prompt.prefix_tokens} fijos): "
+          f"{prompt.listed} ingredientes listados, {prompt.omitted} omitidos")
+    print(f"[AI] Ingredientes caducando pronto: {len(expiring_soon)}")
+    return {
+        "messages": prompt.messages,
+        "malts": malts_inventory,
+        "hops": hops_inventory,
+        "yeasts": yeast_inventory,
+        "expiring": expiring_soon,
+        # Todo lo que ve la IA aparte de la petición del usuario
+        "fingerprint": fingerprint(
+            ai_client.model,
+            [(m["name"], m["quantity"]) for m in malts_inventory],
+            [(h["name"], h["quantity"], h.get("expiry_date")) for h in hops_inventory],
+            [(y["name"], y["quantity"], y.get("expiry_date")) for y in yeast_inventory],
+            expiring_soon,
+            water_profile,
+        ),
+    }
+
+
+def save_recommendation(user_prompt: str, ai_response: dict, context: dict) -> dict:
+    """Guarda la conversación (para ML futuro) y devuelve la respuesta del recomendador"""
+    malts_inventory, hops_inventory, yeast_inventory = context["malts"], context["hops"], context["yeasts"]
+    expiring_soon = context["expiring"]
+    conversation_record = {
+        "id": timestamped_id("conv"),
+        "timestamp": datetime.now().isoformat(),
+        "user_prompt": user_prompt,
+        "ai_response": ai_response,
+        "context": {
+            "inventory_snapshot": {
+                "malts": [{"name": m["name"], "quantity": m["quantity"]} for m in malts_inventory],
+                "hops": [{"name": h["name"], "quantity": h["quantity"], "expiry": h.get("expiry_date")} for h in hops_inventory],
+                "yeasts": [{"name": y["name"], "quantity": y["quantity"], "expiry": y.get("expiry_date")} for y in yeast_inventory]
+            },
+            "expiring_items": expiring_soon,
+            "water_profile": "Valsaín"
+        },
+        "recipe_generated": ai_response.get("recipe", {}),
+        "style_requested": ai_response.get("recommended_style", ""),
+        "applied_to_inventory": False
+    }
+    
+    # Guardar en archivo de conversaciones
+    store.put(CONVERSATIONS_FILE, conversation_record)
+    print(f"[AI] Conversación guardada: {conversation_record['id']}")
+    
+    return {
+        "success": True,
+        "recommendation": ai_response,
+        "conversation_id": conversation_record['id'],
+        "water_profile_used": "Fuente Valsaín",
+        "inventory_analyzed": {
+            "malts": len(malts_inventory),
+            "hops": len(hops_inventory),
+            "yeasts": len(yeast_inventory)
+        },
+        "expiring_items_count": len(expiring_soon)
+    }
+
+def sse_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + jsoncodec.dumps(data) + b"\n\n"
+
+def cached_recommendation(user_prompt: str, context: dict) -> Optional[dict]:
+    """Respuesta del recomendador desde la caché semántica, o None si no hay una parecida"""
+    hit = ai_cache.get(user_prompt, context["fingerprint"])
+    if hit is None:
+        return None
+    print(f"[AI] Respuesta desde caché (similitud {hit.similarity:.2f}, ahorrados {hit.saved_seconds:.1f} s)")
+    result = save_recommendation(user_prompt, hit.response, context)
+    result["cache"] = {"hit": True, "similarity": round(hit.similarity, 3),
+                       "saved_seconds": round(hit.saved_seconds, 3)}
+    return result
+
+@app.get("/ai-recipe-recommender/cache")
+async def ai_recipe_recommender_cache():
+    """Estadísticas de la caché semántica: tasa de acierto y tiempo de IA ahorrado"""
+    return ai_cache.stats()
+
 @app.post("/ai-recipe-recommender")
 async def ai_recipe_recommender(request: RecipeRequest):
     """
@@ -561,188 +871,30 @@ async def ai_recipe_recommender(request: RecipeRequest):
     """
     try:
         print(f"[AI] Recibiendo solicitud: {request.user_prompt}")
+        context = recommender_context(request.user_prompt)
         
-        # Cargar datos
-        inventory = load_json(INVENTORY_FILE)
-        print(f"[AI] Inventario cargado: {len(inventory)} items")
+        cached = cached_recommendation(request.user_prompt, context)
+        if cached is not None:
+            return cached
         
-        # Cargar perfil de agua con manejo de errores
-        water_profile = {}
-        if WATER_PROFILE_FILE.exists():
-            water_profile = load_json(WATER_PROFILE_FILE)
-            print(f"[AI] Perfil de agua cargado")
-        else:
-            print(f"[AI] WARNING: No se encontró water_profile.json, usando valores por defecto")
-            water_profile = {
-                "parameters": {"ph": 6.1, "calcium": 13.7, "magnesium": 3.6, "sodium": 12.28, 
-                              "chloride": 14.4, "sulfate": 8.3, "bicarbonate": 0, "carbonate": 31.33},
-                "derived": {"total_hardness_ppm": 48.2, "residual_alkalinity": 23.9}
-            }
-        
-        # Analizar inventario
-        hops_inventory = [item for item in inventory if item['category'] == 'hop']
-        malts_inventory = [item for item in inventory if item['category'] == 'malt']
-        yeast_inventory = [item for item in inventory if item['category'] == 'yeast']
-        
-        # Detectar ingredientes próximos a caducar
-        today = datetime.now()
-        expiring_soon = []
-        for item in hops_inventory + yeast_inventory:
-            if item.get('expiry_date'):
-                expiry = datetime.strptime(item['expiry_date'], '%Y-%m-%d')
-                days_to_expire = (expiry - today).days
-                if days_to_expire < 60:  # Menos de 2 meses
-                    expiring_soon.append({
-                        'name': item['name'],
-                        'category': item['category'],
-                        'quantity': item['quantity'],
-                        'days_to_expire': days_to_expire,
-                        'expiry_date': item['expiry_date']
-                    })
-        
-        # Ordenar por fecha de caducidad
-        expiring_soon.sort(key=lambda x: x['days_to_expire'])
-        
-        # Construir prompt para GPT
-        system_prompt = """Eres un maestro cervecero experto con amplio conocimiento en:
-- Estilos de cerveza BJCP
-- Formulación de recetas
-- Química del agua cervecera
-- Concursos internacionales de homebrewing
-- Combinaciones de lúpulos y maltas
-
-Tu tarea es ayudar al cervecero a crear la mejor receta posible usando su inventario actual,
-priorizando ingredientes que caducan pronto, y ajustando el perfil de agua."""
-
-        user_context = f"""
-SOLICITUD DEL USUARIO:
-{request.user_prompt}
-
-INVENTARIO ACTUAL:
-
-Maltas disponibles:
-{chr(10).join([f"- {item['name']}: {item['quantity']} kg" for item in malts_inventory])}
-
-Lúpulos disponibles:
-{chr(10).join([f"- {item['name']}: {item['quantity']} g (caduca: {item.get('expiry_date', 'N/A')})" for item in hops_inventory])}
-
-Levaduras disponibles:
-{chr(10).join([f"- {item['name']}: {item['quantity']} pkt (caduca: {item.get('expiry_date', 'N/A')})" for item in yeast_inventory])}
-
-INGREDIENTES PRÓXIMOS A CADUCAR (prioridad alta):
-{chr(10).join([f"- {item['name']} ({item['category']}): {item['quantity']} {'g' if item['category'] == 'hop' else 'pkt'} - Caduca en {item['days_to_expire']} días ({item['expiry_date']})" for item in expiring_soon]) if expiring_soon else "Ninguno"}
-
-PERFIL DE AGUA (Fuente Valsaín):
-- pH: {water_profile.get('parameters', {}).get('ph', 'N/A')}
-- Calcio: {water_profile.get('parameters', {}).get('calcium', 0)} ppm
-- Magnesio: {water_profile.get('parameters', {}).get('magnesium', 0)} ppm
-- Sodio: {water_profile.get('parameters', {}).get('sodium', 0)} ppm
-- Cloruros: {water_profile.get('parameters', {}).get('chloride', 0)} ppm
-- Sulfatos: {water_profile.get('parameters', {}).get('sulfate', 0)} ppm
-- Bicarbonatos: {water_profile.get('parameters', {}).get('bicarbonate', 0)} ppm
-- Carbonatos: {water_profile.get('parameters', {}).get('carbonate', 0)} ppm
-- Dureza total: {water_profile.get('derived', {}).get('total_hardness_ppm', 0)} ppm
-- Alcalinidad residual: {water_profile.get('derived', {}).get('residual_alkalinity', 0)} ppm
-
-INSTRUCCIONES:
-1. Analiza el estilo de cerveza que quiere hacer el usuario
-2. Sugiere si es adecuado o recomienda un estilo mejor basado en su inventario
-3. Prioriza el uso de ingredientes que caducan pronto
-4. Recomienda los mejores lúpulos de su inventario para ese estilo
-5. Busca en tu conocimiento recetas ganadoras de concursos similares (menciona el concurso y año)
-6. Proporciona una receta completa con cantidades específicas
-7. Calcula las sales minerales necesarias para ajustar el agua de Valsaín al perfil del estilo
-8. Indica qué ingredientes se deducirán del inventario
-
-FORMATO DE RESPUESTA:
-Devuelve un JSON con esta estructura:
-{{
-  "style_analysis": "Análisis del estilo solicitado vs disponibilidad",
-  "recommended_style": "Estilo recomendado (puede ser el mismo o uno mejor)",
-  "expiring_priority": ["Lista de ingredientes a usar por caducidad"],
-  "hop_recommendations": ["Lúpulos recomendados del inventario para este estilo"],
-  "competition_inspiration": {{
-    "competition": "Nombre del concurso",
-    "year": "Año",
-    "brewer": "Nombre del cervecero (si se conoce)",
-    "style": "Estilo ganador",
-    "notes": "Notas sobre la receta ganadora"
-  }},
-  "recipe": {{
-    "name": "Nombre de la receta",
-    "style": "Estilo BJCP",
-    "batch_size": 20,
-    "og": 1.050,
-    "fg": 1.012,
-    "abv": 5.0,
-    "ibu": 35,
-    "srm": 10,
-    "malts": [
-      {{"name": "Malta Pale Ale", "amount_kg": 4.5, "percentage": 90}},
-      {{"name": "Malta Crystal", "amount_kg": 0.5, "percentage": 10}}
-    ],
-    "hops": [
-      {{"name": "Cascade", "amount_g": 30, "time_min": 60, "use": "Boil"}},
-      {{"name": "Citra", "amount_g": 50, "time_min": 0, "use": "Dry Hop"}}
-    ],
-    "yeast": {{
-      "name": "US-05",
-      "amount": 1,
-      "temp_range": "18-20°C"
-    }},
-    "mash": {{
-      "temperature": 66,
-      "time": 60,
-      "water_liters": 13
-    }},
-    "boil_time": 60
-  }},
-  "water_adjustments": {{
-    "target_profile": {{
-      "calcium": 100,
-      "magnesium": 10,
-      "sodium": 15,
-      "chloride": 75,
-      "sulfate": 150,
-      "bicarbonate": 50
-    }},
-    "salts_needed": [
-      {{"name": "Sulfato de Calcio (Gypsum)", "amount_g": 3.5, "reason": "Aumentar sulfatos para amargor seco"}},
-      {{"name": "Cloruro de Calcio", "amount_g": 2.0, "reason": "Aumentar cloruros para cuerpo"}},
-      {{"name": "Ácido Láctico 88%", "amount_ml": 1.5, "reason": "Bajar pH a 5.4"}}
-    ],
-    "final_ph_target": 5.4
-  }},
-  "inventory_deductions": [
-    {{"item": "Malta Pale Ale", "amount": 4.5, "unit": "kg"}},
-    {{"item": "Cascade", "amount": 30, "unit": "g"}},
-    {{"item": "US-05", "amount": 1, "unit": "pkt"}}
-  ]
-}}
-"""
-
-        print(f"[AI] Construyendo prompt con {len(malts_inventory)} maltas, {len(hops_inventory)} lúpulos, {len(yeast_inventory)} levaduras")
-        print(f"[AI] Ingredientes caducando pronto: {len(expiring_soon)}")
-        
-        # Llamar a OpenAI
-        print(f"[AI] Llamando a OpenAI GPT-4o...")
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        # Llamar a la IA
+        print(f"[AI] Llamando a {ai_client.label} {ai_client.model}...")
+        started = time.perf_counter()
         
         try:
-            completion = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_context}
-                ],
+            completion = await ai_client.chat(
+                messages=context["messages"],
                 temperature=0.7,
                 response_format={"type": "json_object"}
             )
-            print(f"[AI] Respuesta recibida de OpenAI")
+            print(f"[AI] Respuesta recibida de {ai_client.label}")
             
+        except openai.APITimeoutError:
+            print(f"[AI] ERROR: {ai_client.label} no respondió en {ai_client.timeout:g} s")
+            raise HTTPException(status_code=504, detail=f"{ai_client.label} no respondió a tiempo, inténtalo de nuevo")
         except Exception as openai_error:
-            print(f"[AI] ERROR en llamada a OpenAI: {str(openai_error)}")
-            raise HTTPException(status_code=500, detail=f"Error al comunicarse con OpenAI: {str(openai_error)}")
+            print(f"[AI] ERROR en llamada a {ai_client.label}: {str(openai_error)}")
+            raise HTTPException(status_code=500, detail=f"Error al comunicarse con {ai_client.label}: {str(openai_error)}")
         
         # Parsear respuesta
         try:
@@ -752,44 +904,8 @@ Devuelve un JSON con esta estructura:
             print(f"[AI] ERROR al parsear JSON: {str(json_error)}")
             raise HTTPException(status_code=500, detail=f"Error al parsear respuesta de IA: {str(json_error)}")
         
-        # Guardar conversación para ML futuro
-        conversation_record = {
-            "id": f"conv_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "timestamp": datetime.now().isoformat(),
-            "user_prompt": request.user_prompt,
-            "ai_response": ai_response,
-            "context": {
-                "inventory_snapshot": {
-                    "malts": [{"name": m["name"], "quantity": m["quantity"]} for m in malts_inventory],
-                    "hops": [{"name": h["name"], "quantity": h["quantity"], "expiry": h.get("expiry_date")} for h in hops_inventory],
-                    "yeasts": [{"name": y["name"], "quantity": y["quantity"], "expiry": y.get("expiry_date")} for y in yeast_inventory]
-                },
-                "expiring_items": expiring_soon,
-                "water_profile": "Valsaín"
-            },
-            "recipe_generated": ai_response.get("recipe", {}),
-            "style_requested": ai_response.get("recommended_style", ""),
-            "applied_to_inventory": False
-        }
-        
-        # Guardar en archivo de conversaciones
-        conversations = load_json(CONVERSATIONS_FILE)
-        conversations.append(conversation_record)
-        save_json(CONVERSATIONS_FILE, conversations)
-        print(f"[AI] Conversación guardada: {conversation_record['id']}")
-        
-        return {
-            "success": True,
-            "recommendation": ai_response,
-            "conversation_id": conversation_record['id'],
-            "water_profile_used": "Fuente Valsaín",
-            "inventory_analyzed": {
-                "malts": len(malts_inventory),
-                "hops": len(hops_inventory),
-                "yeasts": len(yeast_inventory)
-            },
-            "expiring_items_count": len(expiring_soon)
-        }
+        ai_cache.put(request.user_prompt, context["fingerprint"], ai_response, time.perf_counter() - started)
+        return save_recommendation(request.user_prompt, ai_response, context)
         
     except HTTPException:
         raise
@@ -799,53 +915,106 @@ Devuelve un JSON con esta estructura:
         print(f"[AI] ERROR GENERAL: {error_detail}")
         raise HTTPException(status_code=500, detail=error_detail)
 
+@app.post("/ai-recipe-recommender/stream")
+async def ai_recipe_recommender_stream(request: RecipeRequest):
+    """
+    El mismo recomendador como server-sent events, según va escribiendo la IA:
+    - "token": {"delta"} cada trozo de texto tal cual llega
+    - "partial": {"field", "text"} texto de un campo de tipo cadena a medias
+      (style_analysis, recommended_style...)
+    - "field": {"field", "value"} cada campo del primer nivel al cerrarse
+      (hop_recommendations, recipe...), ya parseado
+    - "done": la misma respuesta que POST /ai-recipe-recommender
+    - "error": {"status", "detail"}
+    Si la respuesta está en caché llegan solo los "field" y "done", de golpe.
+    """
+    print(f"[AI] Recibiendo solicitud (streaming): {request.user_prompt}")
+    context = recommender_context(request.user_prompt)
+    
+    async def stream():
+        cached = cached_recommendation(request.user_prompt, context)
+        if cached is not None:
+            for key, value in cached["recommendation"].items():
+                yield sse_event("field", {"field": key, "value": value})
+            yield sse_event("done", cached)
+            return
+        
+        fields = JsonFieldStream()
+        started = time.perf_counter()
+        try:
+            async for delta in ai_client.chat_stream(
+                messages=context["messages"],
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            ):
+                yield sse_event("token", {"delta": delta})
+                for kind, key, value in fields.feed(delta):
+                    if kind == "partial":
+                        yield sse_event("partial", {"field": key, "text": value})
+                    else:
+                        yield sse_event("field", {"field": key, "value": value})
+            ai_response = fields.result()
+        except openai.APITimeoutError:
+            print(f"[AI] ERROR: {ai_client.label} no respondió en {ai_client.timeout:g} s")
+            yield sse_event("error", {"status": 504, "detail": f"{ai_client.label} no respondió a tiempo, inténtalo de nuevo"})
+            return
+        except json.JSONDecodeError as json_error:
+            print(f"[AI] ERROR al parsear JSON: {str(json_error)}")
+            yield sse_event("error", {"status": 500, "detail": f"Error al parsear respuesta de IA: {str(json_error)}"})
+            return
+        except Exception as openai_error:
+            print(f"[AI] ERROR en llamada a {ai_client.label}: {str(openai_error)}")
+            yield sse_event("error", {"status": 500, "detail": f"Error al comunicarse con {ai_client.label}: {str(openai_error)}"})
+            return
+        print("[AI] Respuesta completa recibida por streaming")
+        ai_cache.put(request.user_prompt, context["fingerprint"], ai_response, time.perf_counter() - started)
+        yield sse_event("done", save_recommendation(request.user_prompt, ai_response, context))
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/apply-recipe")
 async def apply_recipe(recipe_data: dict):
     """
     Aplica una receta al inventario, deduciendo los ingredientes usados
     """
     try:
-        inventory = load_json(INVENTORY_FILE)
-        
         deductions = recipe_data.get('inventory_deductions', [])
         
-        for deduction in deductions:
-            item_name = deduction['item']
-            amount = deduction['amount']
-            unit = deduction['unit']
-            
-            # Buscar el item en el inventario
-            for item in inventory:
-                if item['name'].lower() == item_name.lower():
+        # Deducir ingredientes y guardar inventario actualizado
+        with store.lock(INVENTORY_FILE):
+            for deduction in deductions:
+                item_name = deduction['item']
+                amount = deduction['amount']
+                unit = deduction['unit']
+                
+                # Buscar el item en el inventario
+                item = store.find_lot(INVENTORY_FILE, item_name)
+                if item:
                     # Deducir cantidad
-                    item['quantity'] -= amount
-                    if item['quantity'] < 0:
-                        item['quantity'] = 0
-                    break
-        
-        # Guardar inventario actualizado
-        save_json(INVENTORY_FILE, inventory)
+                    item = dict(item)
+                    item['quantity'] = max(item['quantity'] - amount, 0)
+                    store.put(INVENTORY_FILE, item)
         
         # Guardar receta en historial
         recipes_file = DATA_DIR / "my_recipes.json"
-        recipes = load_json(recipes_file)
-        
-        recipe_record = {
-            "id": f"recipe_{len(recipes) + 1}",
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "recipe": recipe_data.get('recipe', {}),
-            "water_adjustments": recipe_data.get('water_adjustments', {}),
-            "deductions_applied": deductions
-        }
-        
-        recipes.append(recipe_record)
-        save_json(recipes_file, recipes)
+        with store.lock(recipes_file):
+            recipes = load_json(recipes_file)
+            
+            recipe_record = {
+                "id": f"recipe_{len(recipes) + 1}",
+                "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "recipe": recipe_data.get('recipe', {}),
+                "water_adjustments": recipe_data.get('water_adjustments', {}),
+                "deductions_applied": deductions
+            }
+            
+            save_json(recipes_file, recipes + [recipe_record])
         
         # Guardar en historial de elaboraciones (para ML)
-        brewing_history = load_json(BREWING_HISTORY_FILE)
-        
         brew_record = {
-            "id": f"brew_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "id": timestamped_id("brew"),
             "timestamp": datetime.now().isoformat(),
             "recipe_id": recipe_record['id'],
             "style": recipe_data.get('recipe', {}).get('style', 'Unknown'),
@@ -867,18 +1036,14 @@ async def apply_recipe(recipe_data: dict):
             "notes": ""
         }
         
-        brewing_history.append(brew_record)
-        save_json(BREWING_HISTORY_FILE, brewing_history)
+        store.put(BREWING_HISTORY_FILE, brew_record)
         
         # Marcar conversación como aplicada
         if recipe_data.get('conversation_id'):
-            conversations = load_json(CONVERSATIONS_FILE)
-            for conv in conversations:
-                if conv.get('id') == recipe_data.get('conversation_id'):
-                    conv['applied_to_inventory'] = True
-                    conv['brew_id'] = brew_record['id']
-                    break
-            save_json(CONVERSATIONS_FILE, conversations)
+            with store.lock(CONVERSATIONS_FILE):
+                conv = store.get(CONVERSATIONS_FILE, recipe_data.get('conversation_id'))
+                if conv:
+                    store.put(CONVERSATIONS_FILE, {**conv, 'applied_to_inventory': True, 'brew_id': brew_record['id']})
         
         return {
             "success": True,
@@ -901,9 +1066,10 @@ async def get_ai_conversations(limit: Optional[int] = 50):
     Útil para análisis de patrones y entrenamiento ML
     """
     try:
-        conversations = load_json(CONVERSATIONS_FILE)
         # Ordenar por fecha (más recientes primero)
-        conversations.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        conversations = sorted(
+            load_json(CONVERSATIONS_FILE), key=lambda x: x.get('timestamp', ''), reverse=True
+        )
         return {
             "success": True,
             "total": len(conversations),
@@ -951,17 +1117,15 @@ async def update_brew_status(brew_id: str, status: str, notes: Optional[str] = "
     Estados: planned, brewing, fermenting, bottled, finished
     """
     try:
-        history = load_json(BREWING_HISTORY_FILE)
-        
-        for brew in history:
-            if brew.get('id') == brew_id:
+        with store.lock(BREWING_HISTORY_FILE):
+            brew = store.get(BREWING_HISTORY_FILE, brew_id)
+            if brew:
+                brew = dict(brew)
                 brew['status'] = status
                 if notes:
                     brew['notes'] += f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M')}] {notes}"
                 brew['last_updated'] = datetime.now().isoformat()
-                break
-        
-        save_json(BREWING_HISTORY_FILE, history)
+                store.put(BREWING_HISTORY_FILE, brew)
         
         return {
             "success": True,
@@ -1044,11 +1208,7 @@ class IspindelReading(BaseModel):
 async def get_ispindel_data():
     """Obtener datos almacenados del iSpindel"""
     try:
-        if ISPINDEL_DATA_FILE.exists():
-            with open(ISPINDEL_DATA_FILE, 'r') as f:
-                data = json.load(f)
-            return {"success": True, "data": data}
-        return {"success": True, "data": []}
+        return {"success": True, "data": load_json(ISPINDEL_DATA_FILE)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error leyendo datos iSpindel: {str(e)}")
 
@@ -1066,12 +1226,6 @@ async def get_latest_ispindel():
             
             data = response.json()
             
-            # Guardar en histórico local
-            readings = []
-            if ISPINDEL_DATA_FILE.exists():
-                with open(ISPINDEL_DATA_FILE, 'r') as f:
-                    readings = json.load(f)
-            
             # Añadir nueva lectura
             reading = {
                 "timestamp": data.get("ts"),
@@ -1083,14 +1237,11 @@ async def get_latest_ispindel():
                 "name": data.get("name")
             }
             
-            readings.append(reading)
-            
+            # Guardar en histórico local
             # Mantener solo últimas 48 horas (aprox 288 lecturas cada 10 min)
-            if len(readings) > 300:
-                readings = readings[-300:]
-            
-            with open(ISPINDEL_DATA_FILE, 'w') as f:
-                json.dump(readings, f, indent=2)
+            with store.lock(ISPINDEL_DATA_FILE):
+                readings = (load_json(ISPINDEL_DATA_FILE) + [reading])[-300:]
+                save_json(ISPINDEL_DATA_FILE, readings)
             
             return {
                 "success": True,
@@ -1107,11 +1258,7 @@ async def get_latest_ispindel():
 async def get_ispindel_history(hours: int = 48):
     """Obtener histórico de lecturas para gráficos"""
     try:
-        if not ISPINDEL_DATA_FILE.exists():
-            return {"success": True, "data": []}
-        
-        with open(ISPINDEL_DATA_FILE, 'r') as f:
-            readings = json.load(f)
+        readings = load_json(ISPINDEL_DATA_FILE)
         
         # Filtrar por tiempo
         from datetime import datetime, timedelta
@@ -1137,5 +1284,5 @@ async def get_ispindel_history(hours: int = 48):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS)
 
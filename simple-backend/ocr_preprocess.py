@@ -0,0 +1,234 @@
+"""
+Preparación de fotos y escaneos de facturas antes del OCR
+Una foto de móvil de 12 MP llega a Tesseract a resolución completa, torcida
+y con mesa alrededor. Aquí se pasa a grises, se endereza, se recorta a la
+zona con texto (o a la tabla de líneas si se conoce el proveedor) y se
+reduce a la resolución a la que Tesseract lee bien. Solo usa Pillow.
+"""
+import statistics
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Altura en píxeles de una línea de texto (con ascendentes y descendentes)
+# a la que Tesseract reconoce bien: letra de 10 pt a unos 300 DPI
+TARGET_LINE_HEIGHT = 40
+# Si no se puede medir el texto: lado largo de un A4 a 300 DPI
+MAX_SIDE = 3508
+# Ancho de la copia reducida con la que se analiza la página
+ANALYSIS_WIDTH = 1000
+# Ángulos probados al enderezar, en grados
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+# Margen alrededor de la zona con texto, en fracción del tamaño
+CROP_MARGIN = 0.02
+# Una fila o columna tiene tinta si su media pasa de este valor (0-255, ~1 %)
+INK_THRESHOLD = 2
+# Grosor mínimo (en la copia reducida) de un tramo de texto
+MIN_RUN = 4
+# Fracción de tinta a partir de la cual una fila o columna es un canto del papel
+EDGE_COVERAGE = 0.35
+# Un corte de arriba o abajo de la región tiene que caer en un hueco sin
+# tinta de al menos estas alturas de línea (más que el interlineado)
+REGION_MIN_GAP = 3
+
+Region = Tuple[float, float, float, float]  # (izquierda, arriba, derecha, abajo) en fracciones
+
+
+def preprocess_image(image: Image.Image, region: Optional[Region] = None) -> Image.Image:
+    """
+    Imagen en grises lista para pytesseract:
+    1. Orientación EXIF y escala de grises
+    2. Enderezado: el ángulo con el perfil de filas más marcado
+    3. Recorte a la zona con tinta y, si se pasa `region` (la tabla de
+       líneas del proveedor, en fracciones de esa zona), a esa parte; si el
+       corte pasara por encima de texto se queda la zona entera
+    4. Reducción hasta que las líneas de texto midan TARGET_LINE_HEIGHT
+       (nunca se amplía)
+    """
+    gray = ImageOps.exif_transpose(image).convert('L')
+    # Todo se decide sobre una copia reducida; la imagen completa solo se
+    # reduce, gira y recorta una vez al final (reducir antes de girar es
+    # mucho más barato con 12 MP)
+    scale = min(1.0, ANALYSIS_WIDTH / gray.width)
+    small = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                        Image.Resampling.BOX) if scale < 1 else gray
+    ink = _ink_mask(small)
+
+    angle = _skew_angle(ink)
+    if angle:
+        ink = ink.rotate(angle, resample=Image.Resampling.NEAREST, expand=True, fillcolor=0)
+    text_ink = _without_edges(ink)
+    box = _text_box(text_ink)
+    if box is None:
+        box = (0, 0, ink.width, ink.height)
+    else:
+        # El margen no pasa de los cortes de la región (ya caen en blanco)
+        limits = (0, 0, ink.width, ink.height)
+        if region is not None:
+            cut = _region_box(text_ink, box, region)
+            if cut is not None:
+                limits = tuple(c if c != b else l for c, b, l in zip(cut, box, limits))
+                box = cut
+        mx, my = round(ink.width * CROP_MARGIN), round(ink.height * CROP_MARGIN)
+        box = (max(limits[0], box[0] - mx), max(limits[1], box[1] - my),
+               min(limits[2], box[2] + mx), min(limits[3], box[3] + my))
+
+    # Sin los bordes: los cantos del papel en una foto son tinta en todas las filas
+    line_height = _line_height(ink.crop(_fraction_box(box, (0.1, 0, 0.9, 1))))
+    if line_height:
+        factor = TARGET_LINE_HEIGHT * scale / line_height
+    else:
+        factor = MAX_SIDE * scale / max(box[2] - box[0], box[3] - box[1], 1)
+    if factor < 1:
+        gray = gray.resize((max(1, round(gray.width * factor)), max(1, round(gray.height * factor))),
+                           Image.Resampling.LANCZOS)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+
+    # Coordenadas de la copia reducida -> imagen final
+    fx, fy = gray.width / ink.width, gray.height / ink.height
+    left, top, right, bottom = box
+    return gray.crop((round(left * fx), round(top * fy), round(right * fx), round(bottom * fy)))
+
+
+def _ink_mask(gray: Image.Image) -> Image.Image:
+    """
+    255 donde hay tinta, 0 en el resto. Umbral local (más oscuro que la media
+    de alrededor) para aguantar las sombras y el degradado de las fotos.
+    """
+    gray = ImageOps.autocontrast(gray, cutoff=1)
+    background = gray.filter(ImageFilter.BoxBlur(max(2, gray.width // 60)))
+    darker = ImageChops.subtract(background, gray)
+    mask = darker.point(lambda p: 255 if p > 12 else 0)
+    # Quitar puntos sueltos (grano, polvo)
+    return mask.filter(ImageFilter.MedianFilter(3))
+
+
+def _row_profile(mask: Image.Image) -> List[int]:
+    """Cantidad de tinta de cada fila (media de la fila, 0-255)"""
+    return list(mask.resize((1, mask.height), Image.Resampling.BOX).getdata())
+
+
+def _column_profile(mask: Image.Image) -> List[int]:
+    return list(mask.resize((mask.width, 1), Image.Resampling.BOX).getdata())
+
+
+def _runs(profile: List[int], min_length: int) -> List[Tuple[int, int]]:
+    """Tramos [inicio, fin) de al menos min_length posiciones seguidas con tinta"""
+    runs = []
+    start = None
+    for position, value in enumerate(profile + [0]):
+        if value > INK_THRESHOLD:
+            if start is None:
+                start = position
+        elif start is not None:
+            if position - start >= min_length:
+                runs.append((start, position))
+            start = None
+    return runs
+
+
+def _skew_angle(ink: Image.Image) -> float:
+    """
+    Ángulo que deja las líneas de texto horizontales: con el texto recto las
+    filas alternan entre mucha tinta (línea) y casi nada (interlineado), y el
+    perfil de filas cambia más bruscamente.
+    """
+    def sharpness(angle: float) -> int:
+        rotated = ink.rotate(angle, resample=Image.Resampling.NEAREST, expand=True, fillcolor=0) if angle else ink
+        profile = _row_profile(rotated)
+        return sum((b - a) ** 2 for a, b in zip(profile, profile[1:]))
+
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    angles = [i * DESKEW_STEP for i in range(-steps, steps + 1)]
+    # Ante empates, el menor giro
+    return max(angles, key=lambda angle: (sharpness(angle), -abs(angle)))
+
+
+def _text_box(ink: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Caja de las líneas de texto (sin margen) en la tinta ya sin cantos: del
+    primer al último tramo de filas con tinta y, dentro de ellas, de
+    columnas. Las rayas sueltas son más finas que una línea de texto y
+    quedan fuera.
+    """
+    min_length = max(MIN_RUN, ink.width // 200)
+    rows = _runs(_row_profile(ink), min_length)
+    if not rows:
+        return None
+    top, bottom = rows[0][0], rows[-1][1]
+    columns = _runs(_column_profile(ink.crop((0, top, ink.width, bottom))), min_length)
+    if not columns:
+        return None
+    return columns[0][0], top, columns[-1][1], bottom
+
+
+def _region_box(ink: Image.Image, box: Tuple[int, int, int, int], region: Region) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Parte `region` de la caja de texto `box`, o None si el corte se llevaría
+    texto: tinta a los lados de la región (en su alto), o un corte de arriba
+    o abajo que no cae en un hueco de REGION_MIN_GAP líneas (entre dos
+    líneas de la tabla, no entre la cabecera y la tabla). Así una foto con
+    otra maquetación, o sin la cabecera y el pie de la impresión, se lee
+    entera en vez de a trozos.
+    """
+    left, top, right, bottom = _fraction_box(box, region)
+    sides = _column_profile(ink.crop((box[0], top, left, bottom))) if left > box[0] else []
+    if right < box[2]:
+        sides += _column_profile(ink.crop((right, top, box[2], bottom)))
+    if any(value > INK_THRESHOLD for value in sides):
+        return None
+
+    line_height = _line_height(ink.crop(box))
+    rows = _row_profile(ink.crop((left, box[1], right, box[3])))
+    for cut, side in ((top, box[1]), (bottom - 1, box[3] - 1)):
+        if cut != side and (not line_height or _gap_at(rows, cut - box[1]) < REGION_MIN_GAP * line_height):
+            return None
+    return left, top, right, bottom
+
+
+def _gap_at(profile: List[int], position: int) -> int:
+    """Largo del tramo sin tinta que contiene `position` (0 si ahí hay tinta)"""
+    if not 0 <= position < len(profile) or profile[position] > INK_THRESHOLD:
+        return 0
+    start = end = position
+    while start > 0 and profile[start - 1] <= INK_THRESHOLD:
+        start -= 1
+    while end < len(profile) - 1 and profile[end + 1] <= INK_THRESHOLD:
+        end += 1
+    return end - start + 1
+
+
+def _without_edges(ink: Image.Image) -> Image.Image:
+    """
+    Borra las filas y columnas casi llenas de tinta: ya enderezada la foto,
+    son los cantos del papel (o rayas de la tabla, que no hacen falta para
+    encontrar el texto).
+    """
+    limit = EDGE_COVERAGE * 255
+    ink = ink.copy()
+    for x, value in enumerate(_column_profile(ink)):
+        if value > limit:
+            ink.paste(0, (max(0, x - 2), 0, min(ink.width, x + 3), ink.height))
+    for y, value in enumerate(_row_profile(ink)):
+        if value > limit:
+            ink.paste(0, (0, max(0, y - 2), ink.width, min(ink.height, y + 3)))
+    return ink
+
+
+def _fraction_box(box: Tuple[int, int, int, int], region: Region) -> Tuple[int, int, int, int]:
+    """Parte `region` (en fracciones) de la caja `box`"""
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    r_left, r_top, r_right, r_bottom = region
+    return (left + round(r_left * width), top + round(r_top * height),
+            left + round(r_right * width), top + round(r_bottom * height))
+
+
+def _line_height(ink: Image.Image) -> Optional[float]:
+    """Altura mediana de las líneas de texto (tramos de filas con tinta), o None si hay pocas"""
+    heights = [end - start for start, end in _runs(_row_profile(ink), 2)]
+    if len(heights) < 3:
+        return None
+    return statistics.median(heights)
@@ -0,0 +1,276 @@
+"""
+Prompt del recomendador de recetas con tamaño acotado
+Antes se listaban todas las maltas, lúpulos y levaduras, el perfil de agua
+entero y el esquema de respuesta en un único mensaje: el prompt (y con él la
+latencia y el coste) crecía con el inventario.
+
+- SYSTEM_PROMPT (rol, instrucciones y formato de respuesta) es siempre el
+  mismo texto y va primero, para que la caché de prompts del proveedor
+  reutilice ese prefijo entre peticiones.
+- Después, agua e inventario en líneas cortas, y la petición del usuario al
+  final (lo único que cambia entre dos peticiones con el mismo inventario).
+- Si el inventario no cabe en max_tokens se listan los ingredientes más
+  útiles para lo que se pide: primero los que caducan pronto, luego los que
+  nombra la petición o van con el estilo pedido (ingredients_info.json).
+  Los elegidos se escriben en orden fijo (categoría y nombre), no por
+  puntuación, para no romper el prefijo entre peticiones.
+- Tokens contados con tiktoken si está instalado y tiene su vocabulario;
+  si no, con una estimación por palabras algo por encima de lo real.
+"""
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from semantic_cache import normalize_prompt
+
+# Menos de estos días para caducar: prioridad alta
+EXPIRY_DAYS = 60
+
+UNITS = {"malt": "kg", "hop": "g", "yeast": "pkt"}
+CATEGORY_TITLES = {"malt": "Maltas", "hop": "Lúpulos", "yeast": "Levaduras"}
+INFO_SECTIONS = {"malt": "malts", "hop": "hops", "yeast": "yeasts"}
+
+# Palabras del nombre de un ingrediente que no sirven para saber si la petición lo nombra
+GENERIC_NAME_WORDS = frozenset("malta malt lupulo hop levadura yeast tipo safale saflager".split())
+
+RESPONSE_EXAMPLE = {
+    "style_analysis": "Análisis del estilo solicitado vs disponibilidad",
+    "recommended_style": "Estilo recomendado (puede ser el mismo o uno mejor)",
+    "expiring_priority": ["Lista de ingredientes a usar por caducidad"],
+    "hop_recommendations": ["Lúpulos recomendados del inventario para este estilo"],
+    "competition_inspiration": {
+        "competition": "Nombre del concurso",
+        "year": "Año",
+        "brewer": "Nombre del cervecero (si se conoce)",
+        "style": "Estilo ganador",
+        "notes": "Notas sobre la receta ganadora",
+    },
+    "recipe": {
+        "name": "Nombre de la receta",
+        "style": "Estilo BJCP",
+        "batch_size": 20, "og": 1.050, "fg": 1.012, "abv": 5.0, "ibu": 35, "srm": 10,
+        "malts": [
+            {"name": "Malta Pale Ale", "amount_kg": 4.5, "percentage": 90},
+            {"name": "Malta Crystal", "amount_kg": 0.5, "percentage": 10},
+        ],
+        "hops": [
+            {"name": "Cascade", "amount_g": 30, "time_min": 60, "use": "Boil"},
+            {"name": "Citra", "amount_g": 50, "time_min": 0, "use": "Dry Hop"},
+        ],
+        "yeast": {"name": "US-05", "amount": 1, "temp_range": "18-20°C"},
+        "mash": {"temperature": 66, "time": 60, "water_liters": 13},
+        "boil_time": 60,
+    },
+    "water_adjustments": {
+        "target_profile": {"calcium": 100, "magnesium": 10, "sodium": 15, "chloride": 75,
+                           "sulfate": 150, "bicarbonate": 50},
+        "salts_needed": [
+            {"name": "Sulfato de Calcio (Gypsum)", "amount_g": 3.5, "reason": "Aumentar sulfatos para amargor seco"},
+            {"name": "Cloruro de Calcio", "amount_g": 2.0, "reason": "Aumentar cloruros para cuerpo"},
+            {"name": "Ácido Láctico 88%", "amount_ml": 1.5, "reason": "Bajar pH a 5.4"},
+        ],
+        "final_ph_target": 5.4,
+    },
+    "inventory_deductions": [
+        {"item": "Malta Pale Ale", "amount": 4.5, "unit": "kg"},
+        {"item": "Cascade", "amount": 30, "unit": "g"},
+        {"item": "US-05", "amount": 1, "unit": "pkt"},
+    ],
+}
+
+SYSTEM_PROMPT = """Eres un maestro cervecero experto con amplio conocimiento en:
+- Estilos de cerveza BJCP
+- Formulación de recetas
+- Química del agua cervecera
+- Concursos internacionales de homebrewing
+- Combinaciones de lúpulos y maltas
+
+Tu tarea es ayudar al cervecero a crear la mejor receta posible usando su inventario actual,
+priorizando ingredientes que caducan pronto, y ajustando el perfil de agua.
+
+INSTRUCCIONES:
+1. Analiza el estilo de cerveza que quiere hacer el usuario
+2. Sugiere si es adecuado o recomienda un estilo mejor basado en su inventario
+3. Prioriza el uso de ingredientes que caducan pronto (marcados con CADUCA PRONTO)
+4. Recomienda los mejores lúpulos de su inventario para ese estilo
+5. Busca en tu conocimiento recetas ganadoras de concursos similares (menciona el concurso y año)
+6. Proporciona una receta completa con cantidades específicas
+7. Calcula las sales minerales necesarias para ajustar el agua de Valsaín al perfil del estilo
+8. Indica qué ingredientes se deducirán del inventario
+Si se omiten ingredientes del inventario por espacio, usa solo los listados.
+
+FORMATO DE RESPUESTA:
+Devuelve un JSON con esta estructura:
+""" + json.dumps(RESPONSE_EXAMPLE, ensure_ascii=False, separators=(",", ":"))
+
+WATER_FIELDS = [
+    ("parameters", "ph", "pH"), ("parameters", "calcium", "Ca"), ("parameters", "magnesium", "Mg"),
+    ("parameters", "sodium", "Na"), ("parameters", "chloride", "Cl"), ("parameters", "sulfate", "SO4"),
+    ("parameters", "bicarbonate", "HCO3"), ("parameters", "carbonate", "CO3"),
+    ("derived", "total_hardness_ppm", "dureza total"), ("derived", "residual_alkalinity", "alcalinidad residual"),
+]
+
+
+class PromptParts(NamedTuple):
+    messages: List[dict]
+    tokens: int         # total estimado de los mensajes
+    prefix_tokens: int  # parte fija (SYSTEM_PROMPT)
+    listed: int         # ingredientes listados
+    omitted: int        # ingredientes que no cupieron
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:  # Sin tiktoken o sin poder descargar su vocabulario
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Aproximación: un token por cada ~4 letras de cada palabra, uno por signo
+    return sum(1 + (len(piece) - 1) // 4 for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+@lru_cache(maxsize=2)
+def _load_ingredients_info(path: str, mtime: float) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def load_ingredients_info(path: Path) -> dict:
+    """ingredients_info.json (se relee si cambia); vacío si no existe"""
+    try:
+        return _load_ingredients_info(str(path), path.stat().st_mtime)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def find_ingredient_info(name: str, category: str, ingredients_info: dict) -> Optional[dict]:
+    """Igual que findIngredientInfo del frontend: la clave dentro del nombre o al revés"""
+    name_lower = name.lower()
+    first_word = name_lower.split(" ")[0] if name_lower else ""
+    for key, info in ingredients_info.get(INFO_SECTIONS.get(category, ""), {}).items():
+        if key.lower() in name_lower or (first_word and first_word in key.lower()):
+            return info
+    return None
+
+
+def _style_terms(style: str) -> List[str]:
+    """"American Pale Ale" -> ["american pale ale", "apa"]"""
+    phrase = normalize_prompt(style)
+    words = phrase.split()
+    terms = [phrase] if phrase else []
+    if len(words) > 1:
+        terms.append("".join(word[0] for word in words))
+    return terms
+
+
+def relevance(item: dict, category: str, request: str, days_to_expire: Optional[int],
+              ingredients_info: dict) -> float:
+    """Cuánto interesa listar el ingrediente para esta petición (request ya normalizada)"""
+    score = 0.0
+    padded = f" {request} "
+    name_words = [word for word in normalize_prompt(item["name"]).split()
+                  if len(word) > 2 and word not in GENERIC_NAME_WORDS]
+    if name_words and all(f" {word} " in padded for word in name_words):
+        score += 4  # la petición lo nombra ("una APA con Citra")
+    info = find_ingredient_info(item["name"], category, ingredients_info)
+    if info:
+        styles = [term for style in info.get("styles", []) for term in _style_terms(style)]
+        matches = sum(1 for term in styles if f" {term} " in padded)
+        if matches:
+            score += 2 + 0.5 * (matches - 1)
+    if days_to_expire is not None and days_to_expire < 0:
+        score += 1  # ya caducado: se puede aprovechar, pero sin urgencia
+    elif days_to_expire is not None and days_to_expire < EXPIRY_DAYS:
+        score += 2 + 2 * (1 - days_to_expire / EXPIRY_DAYS)
+    return score
+
+
+def _item_line(item: dict, category: str, days_to_expire: Optional[int]) -> str:
+    line = f"- {item['name']}: {item['quantity']:g} {item.get('unit') or UNITS[category]}"
+    if category != "malt" and item.get("expiry_date"):
+        line += f", caduca {item['expiry_date']}"
+        if days_to_expire is not None and days_to_expire < 0:
+            line += f" (CADUCADO hace {-days_to_expire} días)"
+        elif days_to_expire is not None and days_to_expire < EXPIRY_DAYS:
+            line += f" (en {days_to_expire} días, CADUCA PRONTO)"
+    return line
+
+
+def water_line(water_profile: dict) -> str:
+    values = []
+    for section, key, label in WATER_FIELDS:
+        value = water_profile.get(section, {}).get(key)
+        if value is not None:
+            values.append(f"{label} {value:g}" if isinstance(value, (int, float)) else f"{label} {value}")
+    return "AGUA (Fuente Valsaín, ppm): " + ", ".join(values)
+
+
+def build_messages(user_prompt: str, inventory: Dict[str, List[dict]], expiring: List[dict],
+                   water_profile: dict, ingredients_info: dict, max_tokens: int = 2500,
+                   model: str = "gpt-4o") -> PromptParts:
+    """
+    inventory: {"malt": [...], "hop": [...], "yeast": [...]} con los items del inventario
+    expiring: los que caducan pronto, con days_to_expire (recommender_context)
+    """
+    days = {(entry["category"], entry["name"], entry.get("expiry_date")): entry["days_to_expire"]
+            for entry in expiring}
+    request = normalize_prompt(user_prompt)
+
+    prefix_tokens = count_tokens(SYSTEM_PROMPT, model)
+    head = water_line(water_profile) + "\n\nINVENTARIO:"
+    tail = f"\n\nSOLICITUD DEL USUARIO:\n{user_prompt}"
+    # ~4 tokens por mensaje de formato de chat, y una línea para avisar de omitidos
+    budget = max_tokens - prefix_tokens - count_tokens(head + tail, model) - 8 - 20
+
+    # Mejores primero dentro de cada categoría; luego se van turnando las categorías
+    ranked = {}
+    for category, items in inventory.items():
+        scored = []
+        for index, item in enumerate(items):
+            if not item.get("quantity"):
+                continue  # sin existencias: no sirve para la receta
+            item_days = days.get((category, item["name"], item.get("expiry_date")))
+            line = _item_line(item, category, item_days)
+            score = relevance(item, category, request, item_days, ingredients_info)
+            scored.append((-score, -item["quantity"], index, line))
+        ranked[category] = [(entry[2], entry[3]) for entry in sorted(scored)]
+    available = sum(len(lines) for lines in ranked.values())
+
+    chosen = {category: set() for category in ranked}
+    for rank in range(max((len(lines) for lines in ranked.values()), default=0)):
+        for category, lines in ranked.items():
+            if rank < len(lines):
+                index, line = lines[rank]
+                cost = count_tokens(line, model) + 1
+                if cost <= budget:
+                    chosen[category].add(index)
+                    budget -= cost
+
+    sections = [head]
+    listed = 0
+    for category, lines in ranked.items():
+        selected = sorted(line for index, line in lines if index in chosen[category])
+        listed += len(selected)
+        sections.append(f"{CATEGORY_TITLES.get(category, category)}:\n" + ("\n".join(selected) or "- (ninguno)"))
+    omitted = available - listed
+    if omitted:
+        sections.append(f"(+{omitted} ingredientes menos relevantes para esta petición no listados)")
+    user_content = "\n".join(sections) + tail
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+    tokens = prefix_tokens + count_tokens(user_content, model) + 8
+    return PromptParts(messages, tokens, prefix_tokens, listed, omitted)
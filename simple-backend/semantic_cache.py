@@ -0,0 +1,164 @@
+"""
+Caché semántica de respuestas de la IA
+"una IPA con lo que tengo" y "Hazme una IPA con lo que tengo!" piden lo
+mismo: si el inventario no ha cambiado, la segunda puede reutilizar la
+respuesta de la primera sin otra llamada a GPT-4o.
+
+- Clave: embedding de la petición normalizada + huella del contexto
+  (inventario, caducidades, agua). La huella tiene que coincidir exacta;
+  el embedding, con similitud coseno >= threshold.
+- El embedding es léxico (n-gramas de caracteres y palabras con hashing,
+  sin las palabras de relleno) y no necesita modelo ni red. Un embedding
+  de frases pondría "una IPA" y "una APA" casi iguales; este no.
+- Caducidad por TTL y expulsión LRU al pasar de max_entries.
+- stats(): aciertos, fallos, tasa de acierto y segundos de IA ahorrados.
+"""
+import copy
+import hashlib
+import json
+import math
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+Vector = Dict[int, float]  # disperso: posición -> peso, norma 1
+
+EMBEDDING_DIMS = 1024
+
+# Palabras que no cambian lo que se pide (artículos, verbos de petición, "lo que tengo")
+FILLER_WORDS = frozenset("""
+    a al algo alguna alguno como con cual cerveza dame de del disponible disponibles el elaborar
+    en es esta este favor gustaria haz hacer hazme ingredientes inventario la las lo los me mi
+    mis mismo para por preparar puedes que quiero quisiera receta se sea su sus tenga tengo
+    tienes un una uno unos unas usando usar y
+""".split())
+
+
+class CacheHit(NamedTuple):
+    response: Any
+    similarity: float
+    saved_seconds: float  # lo que tardó la IA en dar la respuesta original
+
+
+def normalize_prompt(text: str) -> str:
+    """Minúsculas, sin tildes ni signos, espacios simples"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def prompt_embedding(text: str) -> Vector:
+    """Palabras con contenido y sus trigramas, repartidos por hashing en EMBEDDING_DIMS"""
+    words = normalize_prompt(text).split()
+    content = [word for word in words if word not in FILLER_WORDS] or words
+    vector: Vector = {}
+
+    def add(feature: str, weight: float) -> None:
+        index = zlib.crc32(feature.encode()) % EMBEDDING_DIMS
+        vector[index] = vector.get(index, 0.0) + weight
+
+    for word in content:
+        # La palabra entera pesa más que sus trozos: "ipa" y "apa" comparten "pa "
+        add("w:" + word, 2.0)
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            add("c:" + padded[i:i + 3], 1.0)
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {index: weight / norm for index, weight in vector.items()}
+
+
+def cosine(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(index, 0.0) for index, weight in a.items())
+
+
+def fingerprint(*parts) -> str:
+    """Huella estable de los datos que acompañan a la petición"""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SemanticCache:
+    """Respuestas guardadas por (huella de contexto, embedding de la petición); max_entries=0 la desactiva"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600, threshold: float = 0.9,
+                 embed: Callable[[str], Vector] = prompt_embedding):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.embed = embed
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()  # del menos al más usado
+        self._by_context: Dict[str, set] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.evictions = 0
+
+    def get(self, prompt: str, context: str) -> Optional[CacheHit]:
+        if self.max_entries <= 0:
+            return None
+        vector = self.embed(prompt)
+        now = time.time()
+        best_id, best_similarity = None, -1.0
+        for entry_id in list(self._by_context.get(context, ())):
+            entry = self._entries[entry_id]
+            if now - entry["created"] > self.ttl:
+                self._remove(entry_id)
+                continue
+            similarity = cosine(vector, entry["vector"])
+            if similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None or best_similarity < self.threshold:
+            self.misses += 1
+            return None
+        entry = self._entries[best_id]
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        self.saved_seconds += entry["latency"]
+        return CacheHit(copy.deepcopy(entry["response"]), best_similarity, entry["latency"])
+
+    def put(self, prompt: str, context: str, response: Any, latency: float) -> None:
+        """Guarda la respuesta que la IA tardó `latency` segundos en dar"""
+        if self.max_entries <= 0:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = {
+            "vector": self.embed(prompt),
+            "context": context,
+            "response": copy.deepcopy(response),
+            "created": time.time(),
+            "latency": latency,
+        }
+        self._by_context.setdefault(context, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "evictions": self.evictions,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+        }
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_context[entry["context"]]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_context[entry["context"]]
@@ -0,0 +1,289 @@
+"""
+Motor SQLite para Beergate Simple
+Guarda las colecciones (inventario, compras, conversaciones, elaboraciones)
+como filas indexadas y el resto de ficheros JSON como documentos
+
+Uso como migrador de una sola vez desde data/*.json:
+    python sqlite_store.py [--data-dir data] [--db data/beergate.db] [--force]
+"""
+import argparse
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import jsoncodec
+from storage import ANY, JsonStore, dedupe_ids, lot_key
+
+# Ficheros que son colecciones de registros con 'id' (el resto son documentos)
+COLLECTIONS = ("inventory.json", "purchases.json", "ai_conversations.json", "brewing_history.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection  TEXT NOT NULL,
+    id          TEXT NOT NULL,
+    pos         INTEGER NOT NULL,
+    name_key    TEXT,
+    supplier    TEXT,
+    expiry_date TEXT,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS records_lot ON records (collection, name_key, supplier, expiry_date);
+CREATE INDEX IF NOT EXISTS records_pos ON records (collection, pos);
+
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS versions (
+    name    TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class SqliteStore(JsonStore):
+    """
+    JsonStore respaldado por SQLite (modo WAL).
+
+    - Los ficheros de `collections` son tablas de registros con clave primaria
+      (colección, id) e índice por (nombre en minúsculas, proveedor, caducidad),
+      así get() y find_lot() son búsquedas O(log n) y put()/delete() escriben
+      una sola fila en lugar del fichero entero.
+    - El resto de ficheros se guardan como documentos JSON completos.
+    - Los listados completos se siguen sirviendo desde la caché en memoria.
+      Cada escritura incrementa la versión del fichero en la tabla versions;
+      en modo multiproceso la caché se recarga cuando otro worker la cambia.
+
+    name_key se calcula en Python con str.lower(): el lower() de SQLite solo
+    convierte ASCII y no casaría "LÚPULO" con "lúpulo".
+    """
+
+    def __init__(self, db_path, collections=(), shared: bool = False):
+        super().__init__(shared=shared)
+        self._db_path = Path(db_path)
+        self._collections = {Path(p).name for p in collections}
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        super().close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def is_empty(self) -> bool:
+        """True si todavía no se ha guardado ningún fichero (base de datos nueva)"""
+        return self._conn().execute("SELECT 1 FROM versions LIMIT 1").fetchone() is None
+
+    # ------------------------------------------------------------------
+    # Búsquedas indexadas
+    # ------------------------------------------------------------------
+
+    def get(self, file_path, record_id: str) -> Optional[dict]:
+        name = Path(file_path).name
+        if name not in self._collections:
+            return super().get(file_path, record_id)
+        row = self._conn().execute(
+            "SELECT data FROM records WHERE collection = ? AND id = ?", (name, record_id)
+        ).fetchone()
+        return jsoncodec.loads(row[0]) if row else None
+
+    def find_lot(self, file_path, name: str, supplier: Any = ANY, expiry_date: Any = ANY) -> Optional[dict]:
+        collection = Path(file_path).name
+        if collection not in self._collections:
+            return super().find_lot(file_path, name, supplier, expiry_date)
+
+        sql = "SELECT pos, data FROM records WHERE collection = ? AND name_key = ?"
+        params = [collection, name.lower()]
+        if supplier is not ANY:
+            sql += " AND supplier IS ?"
+            params.append(supplier)
+        if expiry_date is not ANY:
+            sql += " AND expiry_date IS ?"
+            params.append(expiry_date)
+
+        # Sin ORDER BY pos: el planificador elegiría records_pos y recorrería
+        # toda la colección. Los lotes con el mismo nombre son pocos.
+        rows = self._conn().execute(sql, params).fetchall()
+        return jsoncodec.loads(min(rows)[1]) if rows else None
+
+    # ------------------------------------------------------------------
+    # Lectura / escritura
+    # ------------------------------------------------------------------
+
+    def _signature(self, path: Path) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT version FROM versions WHERE name = ?", (path.name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _read_file(self, path: Path, default) -> Any:
+        conn = self._conn()
+        if path.name in self._collections:
+            rows = conn.execute(
+                "SELECT data FROM records WHERE collection = ? ORDER BY pos", (path.name,)
+            ).fetchall()
+            return [jsoncodec.loads(data) for (data,) in rows]
+
+        row = conn.execute("SELECT data FROM documents WHERE name = ?", (path.name,)).fetchone()
+        return jsoncodec.loads(row[0]) if row else default()
+
+    def _commit(self, path: Path, data: Any, op: Optional[dict] = None) -> None:
+        name = path.name
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if name not in self._collections:
+                conn.execute(
+                    "INSERT INTO documents (name, data) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                    (name, jsoncodec.dumps(data).decode('utf-8')),
+                )
+            elif op is None:
+                conn.execute("DELETE FROM records WHERE collection = ?", (name,))
+                conn.executemany(
+                    "INSERT INTO records (collection, id, pos, name_key, supplier, expiry_date, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [_row(name, pos, record) for pos, record in enumerate(data)],
+                )
+            else:
+                for sub_op in op["ops"] if op["op"] == "batch" else [op]:
+                    if sub_op["op"] == "put":
+                        self._upsert(conn, name, sub_op["record"])
+                    elif sub_op["op"] == "delete":
+                        conn.execute(
+                            "DELETE FROM records WHERE collection = ? AND id = ?",
+                            (name, sub_op["id"]),
+                        )
+                    else:
+                        raise ValueError(f"Operación desconocida: {sub_op['op']}")
+
+            conn.execute(
+                "INSERT INTO versions (name, version) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+                (name,),
+            )
+            version = conn.execute(
+                "SELECT version FROM versions WHERE name = ?", (name,)
+            ).fetchone()[0]
+
+        self._data[path] = data
+        self._signatures[path] = version
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, collection: str, record: dict) -> None:
+        """Reemplaza el registro conservando su posición, o lo añade al final"""
+        row = conn.execute(
+            "SELECT pos FROM records WHERE collection = ? AND id = ?", (collection, record['id'])
+        ).fetchone()
+        if row:
+            pos = row[0]
+        else:
+            pos = conn.execute(
+                "SELECT COALESCE(MAX(pos), -1) + 1 FROM records WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO records (collection, id, pos, name_key, supplier, expiry_date, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _row(collection, pos, record),
+        )
+
+    # ------------------------------------------------------------------
+    # Conexiones (una por hilo)
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False solo para poder cerrarlas todas en close()
+            conn = sqlite3.connect(
+                self._db_path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self) -> "_Transaction":
+        return _Transaction(self._conn())
+
+
+class _Transaction:
+    """COMMIT al salir del with, ROLLBACK si hubo excepción"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _row(collection: str, pos: int, record: dict) -> tuple:
+    name_key = supplier = expiry_date = None
+    if 'name' in record:
+        name_key, supplier, expiry_date = lot_key(record)
+    return (
+        collection, record['id'], pos, name_key, supplier, expiry_date,
+        jsoncodec.dumps(record).decode('utf-8'),
+    )
+
+
+def migrate_json_files(data_dir, store: SqliteStore, force: bool = False) -> dict:
+    """
+    Importa los data/*.json a SQLite (una sola vez). Los ids repetidos de las
+    colecciones se renumeran, porque en SQLite son clave primaria. Devuelve
+    {fichero: número de registros importados}.
+    """
+    data_dir = Path(data_dir)
+    if not force and not store.is_empty():
+        return {}
+
+    migrated = {}
+    for json_file in sorted(data_dir.glob("*.json")):
+        data = JsonStore._read_file(json_file, list)
+        if json_file.name in store._collections:
+            data = dedupe_ids(data)
+        with store.lock(json_file):
+            store.save(json_file, data)
+        migrated[json_file.name] = len(data) if isinstance(data, list) else 1
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrar data/*.json a SQLite")
+    parser.add_argument("--data-dir", default="data", help="Directorio con los JSON")
+    parser.add_argument("--db", default=None, help="Base de datos (por defecto <data-dir>/beergate.db)")
+    parser.add_argument("--force", action="store_true", help="Reimportar aunque la base ya tenga datos")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_path = Path(args.db) if args.db else data_dir / "beergate.db"
+    store = SqliteStore(db_path, COLLECTIONS)
+    try:
+        migrated = migrate_json_files(data_dir, store, force=args.force)
+    finally:
+        store.close()
+
+    if not migrated:
+        print(f"⚠️ {db_path} ya tiene datos; usa --force para reimportar")
+        return
+    for name, count in migrated.items():
+        print(f"✅ {name}: {count} registros")
+    print(f"📦 Migración completada en {db_path}")
+
+
+if __name__ == "__main__":
+    main()
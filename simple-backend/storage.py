@@ -0,0 +1,754 @@
+"""
+Almacenamiento en memoria para Beergate Simple
+Carga cada fichero JSON una sola vez, sirve las lecturas desde memoria
+y persiste los cambios a disco desde un único hilo escritor
+"""
+import bisect
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import jsoncodec
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, solo modo de un proceso
+    fcntl = None
+
+
+# Comodín para los filtros opcionales de find_lot()
+ANY = object()
+
+
+class JsonStore:
+    """
+    Caché de documentos JSON (uno por fichero) con escritura diferida.
+
+    - load() devuelve el documento cacheado: es de solo lectura, no mutarlo.
+    - edit() entrega una copia de trabajo bajo el lock del fichero y, al salir,
+      la publica como nuevo documento y la encola para escritura.
+    - Un único hilo escritor vuelca a disco; si llegan varios cambios del mismo
+      fichero antes de escribirlo, solo se escribe la última versión.
+    - Toda escritura es atómica: temporal + fsync + rename.
+
+    Con shared=True (varios workers de uvicorn sobre los mismos ficheros) el
+    lock de cada fichero es además un flock sobre <fichero>.lock, la caché se
+    recarga si otro proceso ha cambiado el fichero y las escrituras son
+    síncronas dentro del lock.
+    """
+
+    def __init__(self, shared: bool = False):
+        if shared and fcntl is None:
+            raise RuntimeError("El modo multiproceso necesita fcntl (POSIX)")
+        self._shared = shared
+        self._data: Dict[Path, Any] = {}
+        self._defaults: Dict[Path, Callable[[], Any]] = {}
+        self._signatures: Dict[Path, Optional[tuple]] = {}
+        self._indexes: Dict[Path, _RecordIndex] = {}
+        self._aggregates: Dict[Path, Dict[Callable[[], Any], Any]] = {}
+        self._versions: Dict[Path, tuple] = {}
+        self._boot = os.urandom(4).hex()
+        self._generation = 0
+        self._locks: Dict[Path, "_FileLock"] = {}
+        self._registry_lock = threading.Lock()
+
+        self._pending: Dict[Path, Any] = {}
+        self._writing = 0
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def lock(self, file_path) -> "_FileLock":
+        """Lock por fichero para secuencias leer-modificar-escribir"""
+        path = Path(file_path)
+        with self._registry_lock:
+            if path not in self._locks:
+                self._locks[path] = _FileLock(
+                    path, self._refresh if self._shared else None
+                )
+            return self._locks[path]
+
+    def load(self, file_path, default: Callable[[], Any] = list) -> Any:
+        """Documento cacheado (se lee de disco solo la primera vez)"""
+        path = Path(file_path)
+        try:
+            data = self._data[path]
+            if not self._shared or self._signature(path) == self._signatures.get(path):
+                return data
+        except KeyError:
+            pass
+
+        # Primera lectura, o (multiproceso) otro worker ha escrito el fichero:
+        # al tomar el lock se recarga
+        with self.lock(path):
+            if path not in self._data:
+                self._defaults[path] = default
+                self._load_from_disk(path)
+            return self._data[path]
+
+    def version(self, file_path) -> str:
+        """
+        Etiqueta de la versión publicada del documento (para ETag): cambia con
+        cada escritura. En modo multiproceso sale de la firma en disco, así
+        que todos los workers dan la misma etiqueta para los mismos datos.
+        """
+        path = Path(file_path)
+        if self._shared:
+            with self.lock(path):
+                self.load(path)
+                signature = repr((path.name, self._signatures.get(path)))
+                return hashlib.sha1(signature.encode()).hexdigest()[:16]
+
+        data = self.load(path)
+        with self._registry_lock:
+            tagged = self._versions.get(path)
+            # Se guarda el propio documento (no su id()) para que no se reutilice
+            if tagged is None or tagged[0] is not data:
+                self._generation += 1
+                tagged = self._versions[path] = (data, f"{self._boot}-{self._generation}")
+            return tagged[1]
+
+    def aggregate(self, file_path, factory: Callable[[], Any]) -> Any:
+        """
+        Resumen de una colección mantenido de forma incremental.
+
+        factory() crea la vista: un objeto con add(record), replace(old, new),
+        remove(record) y snapshot(). put_many() y delete() le pasan solo los
+        registros que cambian; si el documento se sustituye entero (save,
+        recarga de otro worker) la vista se reconstruye. Devuelve snapshot().
+        """
+        path = Path(file_path)
+        with self.lock(path):
+            records = self.load(path)
+            views = self._aggregates.setdefault(path, {})
+            view = views.get(factory)
+            if view is None or view.records is not records:
+                view = factory()
+                for record in records:
+                    view.add(record)
+                view.records = records
+                views[factory] = view
+            return view.snapshot()
+
+    def preload(self, *file_paths) -> None:
+        """Carga en memoria los ficheros indicados (arranque de la app)"""
+        for file_path in file_paths:
+            self.load(file_path)
+
+    def invalidate(self, file_path) -> None:
+        """Olvida el documento cacheado; la próxima lectura irá a disco"""
+        path = Path(file_path)
+        with self.lock(path):
+            self._data.pop(path, None)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def save(self, file_path, data: Any) -> None:
+        """Publica un documento nuevo y lo encola para escritura"""
+        path = Path(file_path)
+        with self.lock(path):
+            self._commit(path, data)
+
+    def put(self, file_path, record: dict) -> dict:
+        """Inserta o reemplaza (por 'id') un registro de una colección"""
+        self.put_many(file_path, [record])
+        return record
+
+    def put_many(self, file_path, records: List[dict]) -> List[dict]:
+        """Inserta o reemplaza varios registros con un único guardado"""
+        if not records:
+            return records
+        path = Path(file_path)
+        ops = [{"op": "put", "record": record} for record in records]
+        op = ops[0] if len(ops) == 1 else {"op": "batch", "ops": ops}
+
+        with self.lock(path):
+            current = self.load(path)
+            index = self._index(path, current)
+            updated = list(current)
+            changes = []
+            try:
+                for record in records:
+                    pos = index.by_id.get(record['id'])
+                    if pos is None:
+                        index.add(len(updated), record)
+                        updated.append(record)
+                        changes.append((None, record))
+                    else:
+                        index.replace(pos, updated[pos], record)
+                        changes.append((updated[pos], record))
+                        updated[pos] = record
+                self._commit(path, updated, op)
+            except BaseException:
+                # El índice ya no corresponde al documento publicado
+                self._indexes.pop(path, None)
+                raise
+            index.records = updated
+
+            for view in self._views(path, current):
+                for old, new in changes:
+                    if old is None:
+                        view.add(new)
+                    else:
+                        view.replace(old, new)
+                view.records = updated
+        return records
+
+    def delete(self, file_path, record_id: str) -> bool:
+        """Elimina los registros con ese 'id'; False si no había ninguno"""
+        path = Path(file_path)
+        op = {"op": "delete", "id": record_id}
+        with self.lock(path):
+            records = self.load(path)
+            remaining = _apply_op(records, op)
+            if len(remaining) == len(records):
+                return False
+            # Las posiciones cambian: el índice se reconstruye en la próxima búsqueda
+            self._commit(path, remaining, op)
+
+            for view in self._views(path, records):
+                for record in records:
+                    if record.get('id') == record_id:
+                        view.remove(record)
+                view.records = remaining
+        return True
+
+    def get(self, file_path, record_id: str) -> Optional[dict]:
+        """Registro de una colección por 'id' (índice hash)"""
+        path = Path(file_path)
+        with self.lock(path):
+            records = self.load(path)
+            pos = self._index(path, records).by_id.get(record_id)
+            return None if pos is None else records[pos]
+
+    def find_lot(self, file_path, name: str, supplier: Any = ANY, expiry_date: Any = ANY) -> Optional[dict]:
+        """
+        Primer lote con ese nombre (sin distinguir mayúsculas) y, si se
+        indican, el mismo proveedor y fecha de caducidad.
+        """
+        path = Path(file_path)
+        with self.lock(path):
+            records = self.load(path)
+            index = self._index(path, records)
+            if supplier is not ANY and expiry_date is not ANY:
+                positions = index.by_lot.get((name.lower(), supplier, expiry_date), ())
+            else:
+                positions = index.by_name.get(name.lower(), ())
+            for pos in positions:
+                _, lot_supplier, lot_expiry = lot_key(records[pos])
+                if supplier is not ANY and lot_supplier != supplier:
+                    continue
+                if expiry_date is not ANY and lot_expiry != expiry_date:
+                    continue
+                return records[pos]
+            return None
+
+    def new_id(self, file_path, prefix: str, reserved=()) -> str:
+        """Primer id libre <prefijo>_<n>, empezando por el tamaño de la colección + 1"""
+        n = len(self.load(file_path)) + 1
+        while f"{prefix}_{n}" in reserved or self.get(file_path, f"{prefix}_{n}") is not None:
+            n += 1
+        return f"{prefix}_{n}"
+
+    @contextmanager
+    def edit(self, file_path, default: Callable[[], Any] = list) -> Iterator[Any]:
+        """
+        Copia de trabajo de un documento para modificarlo.
+
+        Las listas se copian registro a registro (copia superficial de cada
+        dict), así que se pueden modificar los campos de primer nivel sin
+        afectar a lecturas concurrentes del documento publicado.
+        """
+        path = Path(file_path)
+        with self.lock(path):
+            working = _working_copy(self.load(path, default))
+            yield working
+            self.save(path, working)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todas las escrituras pendientes estén en disco"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._writing, timeout
+            )
+
+    def close(self) -> None:
+        """Vuelca lo pendiente y detiene el hilo escritor"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _commit(self, path: Path, data: Any, op: Optional[dict] = None) -> None:
+        """Publica el documento y lo persiste (aquí: volcado completo diferido)"""
+        self._data[path] = data
+        if self._shared:
+            # Otros procesos deben ver el cambio al soltar el lock
+            self._write_file(path, data)
+            self._signatures[path] = self._signature(path)
+        else:
+            self._enqueue(path, data)
+
+    def _enqueue(self, path: Path, data: Any) -> None:
+        with self._cond:
+            if self._closed:
+                # Ya no hay escritor: escribir de forma síncrona
+                self._write_file(path, data)
+                return
+            self._pending[path] = data
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="beergate-store-writer", daemon=True
+                )
+                self._writer.start()
+            self._cond.notify_all()
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending and self._closed:
+                    return
+                batch = self._pending
+                self._pending = {}
+                self._writing += 1
+
+            try:
+                for path, data in batch.items():
+                    try:
+                        self._write_file(path, data)
+                    except Exception as e:
+                        print(f"[STORE] Error escribiendo {path}: {e}")
+            finally:
+                with self._cond:
+                    self._writing -= 1
+                    self._cond.notify_all()
+
+    def _views(self, path: Path, records: list) -> list:
+        """Vistas de aggregate() al día con `records`; el resto se descartan"""
+        views = self._aggregates.get(path, {})
+        for factory, view in list(views.items()):
+            if view.records is not records:
+                del views[factory]
+        return list(views.values())
+
+    def _index(self, path: Path, records: list) -> "_RecordIndex":
+        """Índice de la colección; se reconstruye si el documento ha cambiado entero"""
+        index = self._indexes.get(path)
+        if index is None or index.records is not records:
+            index = self._indexes[path] = _RecordIndex(records)
+        return index
+
+    # ------------------------------------------------------------------
+    # Disco
+    # ------------------------------------------------------------------
+
+    def _load_from_disk(self, path: Path) -> None:
+        """(Re)carga un documento; llamar con el lock del fichero"""
+        self._signatures[path] = self._signature(path)
+        self._data[path] = self._read_file(path, self._defaults.get(path, list))
+
+    def _refresh(self, path: Path) -> None:
+        """Al tomar el lock entre procesos: recargar si otro worker escribió"""
+        if path in self._data and self._signature(path) != self._signatures.get(path):
+            self._load_from_disk(path)
+
+    def _signature(self, path: Path) -> Optional[tuple]:
+        """Versión actual en disco, para detectar escrituras de otros procesos"""
+        return _signature(path)
+
+    @staticmethod
+    def _read_file(path: Path, default: Callable[[], Any]) -> Any:
+        if path.exists():
+            with open(path, 'rb') as f:
+                return jsoncodec.loads(f.read())
+        return default()
+
+    @staticmethod
+    def _write_file(path: Path, data: Any) -> None:
+        _atomic_write_json(path, data)
+
+
+class _RecordIndex:
+    """
+    Índices hash de una colección (lista de registros con 'id'):
+    id -> posición, lote completo (nombre, proveedor, caducidad) -> posiciones
+    y nombre -> posiciones. Las listas de posiciones están ordenadas, así que
+    la primera es la del lote que encontraría un recorrido secuencial.
+    """
+
+    def __init__(self, records: list):
+        self.records = records
+        self.by_id: Dict[Any, int] = {}
+        self.by_lot: Dict[tuple, List[int]] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        for pos, record in enumerate(records):
+            self.add(pos, record)
+
+    def add(self, pos: int, record: dict) -> None:
+        self.by_id.setdefault(record.get('id'), pos)
+        if 'name' in record:
+            key = lot_key(record)
+            bisect.insort(self.by_lot.setdefault(key, []), pos)
+            bisect.insort(self.by_name.setdefault(key[0], []), pos)
+
+    def replace(self, pos: int, old: dict, new: dict) -> None:
+        """Mismo id en la misma posición; solo pueden cambiar los campos del lote"""
+        if 'name' in old:
+            key = lot_key(old)
+            _discard(self.by_lot, key, pos)
+            _discard(self.by_name, key[0], pos)
+        if 'name' in new:
+            key = lot_key(new)
+            bisect.insort(self.by_lot.setdefault(key, []), pos)
+            bisect.insort(self.by_name.setdefault(key[0], []), pos)
+
+
+def _discard(index: Dict[Any, List[int]], key: Any, pos: int) -> None:
+    positions = index.get(key)
+    if positions and pos in positions:
+        positions.remove(pos)
+        if not positions:
+            del index[key]
+
+
+class _FileLock:
+    """
+    Lock reentrante por fichero. En modo multiproceso, el primer acquire de
+    cada hilo toma también un flock exclusivo sobre <fichero>.lock y llama a
+    on_acquire para refrescar la caché.
+    """
+
+    def __init__(self, path: Path, on_acquire: Optional[Callable[[Path], None]] = None):
+        self._path = path
+        self._on_acquire = on_acquire
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        self._rlock.acquire()
+        self._depth += 1
+        if self._depth == 1 and self._on_acquire is not None:
+            try:
+                self._fd = os.open(_lock_path(self._path), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                self._on_acquire(self._path)
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+    def __enter__(self) -> "_FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class JournalStore(JsonStore):
+    """
+    JsonStore con diario de solo-añadir para algunas colecciones.
+
+    Cada put/delete sobre un fichero con diario se escribe como una línea JSON
+    en <fichero>.journal (coste O(1)) en lugar de reescribir el fichero entero.
+    Un put_many() es una sola línea: tras una caída se aplica entero o nada.
+    Al arrancar se reconstruye el estado cargando el snapshot y reproduciendo
+    el diario. Cada `compact_every` operaciones el diario se rota a
+    <fichero>.journal.compacting y el hilo escritor vuelca un snapshot nuevo
+    (escritura atómica); al terminar se borra el diario rotado. Las
+    operaciones son idempotentes, así que reproducir un diario ya incluido en
+    el snapshot no altera el resultado.
+
+    Un reemplazo completo (save) escribe su snapshot en el acto: la
+    compactación todavía en cola se descarta, y si el hilo escritor ya la
+    tenía entre manos no llega a escribirla (cada snapshot lleva un número
+    de secuencia y uno más antiguo que el último escrito no se vuelca).
+    """
+
+    def __init__(self, journaled, compact_every: int = 500):
+        super().__init__(shared=False)
+        self._journaled = {Path(p) for p in journaled}
+        self._compact_every = compact_every
+        self._journal_ops: Dict[Path, int] = {}
+        self._journal_handles: Dict[Path, Any] = {}
+        # Snapshots escritos por fichero; serializa los síncronos con los del hilo escritor
+        self._snapshots: Dict[Path, int] = {}
+        self._snapshot_lock = threading.Lock()
+
+    def close(self) -> None:
+        """Compacta los diarios pendientes y cierra los ficheros"""
+        super().close()
+        for path in self._journaled:
+            with self.lock(path):
+                if self._journal_ops.get(path) and path in self._data:
+                    self._write_snapshot(path, self._data[path])
+                self._close_journal(path)
+
+    # ------------------------------------------------------------------
+    # Carga: snapshot + reproducción del diario
+    # ------------------------------------------------------------------
+
+    def _read_file(self, path: Path, default: Callable[[], Any]) -> Any:
+        data = JsonStore._read_file(path, default)
+        if path not in self._journaled:
+            return data
+
+        replayed = 0
+        for journal in (_compacting_path(path), _journal_path(path)):
+            for op in _read_journal(journal):
+                data = _apply_op(data, op)
+                replayed += 1
+
+        if replayed:
+            print(f"[STORE] {path.name}: {replayed} operaciones reproducidas del diario")
+            self._write_snapshot(path, data)
+        return data
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def _commit(self, path: Path, data: Any, op: Optional[dict] = None) -> None:
+        if path not in self._journaled:
+            return super()._commit(path, data, op)
+
+        if op is None:
+            # Reemplazo completo del documento: snapshot nuevo y diario vacío
+            self._data[path] = data
+            self._write_snapshot(path, data)
+            return
+
+        # Primero el diario (durabilidad), luego publicar en memoria
+        handle = self._journal_handle(path)
+        handle.write(jsoncodec.dumps(op) + b"\n")
+        handle.flush()
+        os.fsync(handle.fileno())
+        self._data[path] = data
+
+        self._journal_ops[path] = self._journal_ops.get(path, 0) + 1
+        if self._journal_ops[path] >= self._compact_every:
+            self._start_compaction(path, data)
+
+    def _start_compaction(self, path: Path, data: Any) -> None:
+        """Rota el diario y encola el snapshot para el hilo escritor"""
+        compacting = _compacting_path(path)
+        if compacting.exists():
+            # Todavía se está escribiendo el snapshot anterior
+            return
+        self._close_journal(path)
+        os.replace(_journal_path(path), compacting)
+        self._journal_ops[path] = 0
+        with self._snapshot_lock:
+            after = self._snapshots.get(path, 0)
+        self._enqueue(path, _Compaction(data, after))
+
+    def _write_file(self, path: Path, data: Any) -> None:
+        if path not in self._journaled:
+            return JsonStore._write_file(path, data)
+        with self._snapshot_lock:
+            if data.after != self._snapshots.get(path, 0):
+                # Un save() ya escribió un snapshot más nuevo (y borró el diario rotado)
+                return
+            # Snapshot de compactación: ya incluye todo lo del diario rotado
+            _atomic_write_json(path, data.records)
+            _compacting_path(path).unlink(missing_ok=True)
+            self._snapshots[path] = data.after + 1
+
+    def _write_snapshot(self, path: Path, data: Any) -> None:
+        """Snapshot síncrono que deja el diario vacío (llamar con el lock)"""
+        with self._cond:
+            # La compactación en cola es más antigua que este snapshot
+            self._pending.pop(path, None)
+        with self._snapshot_lock:
+            self._close_journal(path)
+            _atomic_write_json(path, data)
+            _journal_path(path).unlink(missing_ok=True)
+            _compacting_path(path).unlink(missing_ok=True)
+            self._journal_ops[path] = 0
+            self._snapshots[path] = self._snapshots.get(path, 0) + 1
+
+    def _journal_handle(self, path: Path):
+        if path not in self._journal_handles:
+            self._journal_handles[path] = open(_journal_path(path), 'ab')
+        return self._journal_handles[path]
+
+    def _close_journal(self, path: Path) -> None:
+        handle = self._journal_handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+
+
+class _Compaction(NamedTuple):
+    """Snapshot de compactación en cola: `records` tras el snapshot número `after`"""
+    records: Any
+    after: int
+
+
+def create_store(mode: str = "memory", journaled=(), workers: int = 1,
+                 db_path=None, collections=()) -> JsonStore:
+    """Almacén según BEERGATE_STORAGE: 'memory' (por defecto), 'journal' o 'sqlite'"""
+    if mode == "sqlite":
+        from sqlite_store import SqliteStore
+        return SqliteStore(db_path, collections, shared=workers > 1)
+    if mode == "journal":
+        if workers > 1:
+            raise ValueError("El modo journal solo admite un worker")
+        return JournalStore(journaled)
+    if mode == "memory":
+        return JsonStore(shared=workers > 1)
+    raise ValueError(f"Modo de almacenamiento desconocido: {mode}")
+
+
+def lot_key(record: dict) -> tuple:
+    """(nombre en minúsculas, proveedor, caducidad): identifica un lote del inventario"""
+    return (record['name'].lower(), record.get('supplier', ''), record.get('expiry_date'))
+
+
+def next_id(records, prefix: str) -> str:
+    """Primer id libre con el formato <prefijo>_<n>"""
+    taken = {r.get('id') for r in records}
+    n = len(records) + 1
+    while f"{prefix}_{n}" in taken:
+        n += 1
+    return f"{prefix}_{n}"
+
+
+def dedupe_ids(records: list) -> list:
+    """
+    Renumera los ids repetidos (los generaba el antiguo <categoria>_<len + 1>).
+    El prefijo del id nuevo es la categoría del registro o el del id original.
+    """
+    seen = set()
+    fixed = []
+    for record in records:
+        if record.get('id') in seen:
+            prefix = record.get('category') or record['id'].rsplit('_', 1)[0]
+            record = {**record, 'id': next_id(fixed + records[len(fixed):], prefix)}
+        seen.add(record.get('id'))
+        fixed.append(record)
+    return fixed
+
+
+def _apply_op(records: list, op: dict) -> list:
+    """Aplica una operación de colección y devuelve la lista nueva"""
+    if op["op"] == "batch":
+        for sub_op in op["ops"]:
+            records = _apply_op(records, sub_op)
+        return records
+    if op["op"] == "put":
+        record = op["record"]
+        records = list(records)
+        for pos, current in enumerate(records):
+            if current.get('id') == record.get('id'):
+                records[pos] = record
+                return records
+        records.append(record)
+        return records
+    if op["op"] == "delete":
+        return [r for r in records if r.get('id') != op["id"]]
+    raise ValueError(f"Operación desconocida: {op['op']}")
+
+
+def _journal_path(path: Path) -> Path:
+    return path.with_name(path.name + ".journal")
+
+
+def _compacting_path(path: Path) -> Path:
+    return path.with_name(path.name + ".journal.compacting")
+
+
+def _read_journal(journal: Path) -> Iterator[dict]:
+    """Operaciones de un diario; una última línea a medias (caída) se ignora"""
+    if not journal.exists():
+        return
+    with open(journal, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield jsoncodec.loads(line)
+            except jsoncodec.DecodeError:
+                print(f"[STORE] {journal.name}: línea {line_number} incompleta, se descarta")
+                return
+
+
+def _lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+def _signature(path: Path) -> Optional[tuple]:
+    """Identidad de la versión en disco (cambia con cada rename atómico)"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _atomic_write_json(path: Path, data: Any) -> None:
+    """
+    Escribe en un temporal del mismo directorio, hace fsync y lo renombra
+    sobre el destino: nunca queda un fichero a medias, ni tras un corte de luz.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        # mkstemp crea el temporal con 0600: conservar los permisos del original
+        try:
+            os.chmod(tmp_name, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(tmp_name, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(jsoncodec.dumps(data, pretty=jsoncodec.PRETTY))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Persiste la entrada del directorio tras un rename (no existe en Windows)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _working_copy(data: Any) -> Any:
+    if isinstance(data, list):
+        return [dict(item) if isinstance(item, dict) else item for item in data]
+    if isinstance(data, dict):
+        return dict(data)
+    return data
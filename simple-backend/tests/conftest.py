@@ -0,0 +1,20 @@
+"""Ajustes de los tests: datos en un directorio temporal, IA simulada y sin caché semántica"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_DATA_DIR = tempfile.mkdtemp(prefix="beergate-tests-")
+for name in ("inventory.json", "water_profile.json"):
+    shutil.copy(BACKEND_DIR / "data" / name, _DATA_DIR)
+
+# Antes de que nada importe main (lee la configuración al importarse)
+os.environ.update(
+    BEERGATE_DATA_DIR=_DATA_DIR,
+    BEERGATE_STORAGE="memory",
+    BEERGATE_AI_PROVIDER="fake",
+    BEERGATE_AI_CACHE_SIZE="0",
+)
+os.chdir(BACKEND_DIR)  # ingredients_info.json
@@ -0,0 +1,93 @@
+"""
+AIClient contra el servidor local compatible con OpenAI de
+benchmarks/bench_ai_latency.py: el bucle de eventos sigue atendiendo
+mientras se espera a la IA, no van más llamadas a la vez que `concurrency`
+y si la IA no contesta a tiempo la respuesta es un 504.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from ai_client import AIClient
+from bench_ai_latency import StubOpenAI, start_stub
+
+
+@pytest.fixture
+def stub():
+    """Arranca la IA local con el retardo dado y devuelve su base_url"""
+    servers = []
+
+    def start(delay):
+        server, base_url = start_stub(delay)
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def recommend_all(client, n_requests):
+    """Códigos de respuesta de n_requests recetas pedidas a la vez"""
+    def recommend(i):
+        return client.post("/ai-recipe-recommender", json={"user_prompt": f"Una APA número {i}"}).status_code
+
+    with ThreadPoolExecutor(max_workers=n_requests) as executor:
+        return list(executor.map(recommend, range(n_requests)))
+
+
+def test_inventory_responds_while_waiting_for_ai(stub, monkeypatch):
+    delay = 1.0
+    monkeypatch.setattr(main, "ai_client", AIClient(base_url=stub(delay), concurrency=4))
+    latencies = []
+    done = threading.Event()
+
+    with TestClient(main.app) as client:
+        client.get("/inventory")
+
+        def poll():
+            while not done.is_set():
+                start = time.perf_counter()
+                client.get("/inventory?summary=true")
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        try:
+            statuses = recommend_all(client, 4)
+        finally:
+            done.set()
+            poller.join()
+
+    assert statuses == [200] * 4
+    assert len(latencies) > 10
+    # Con la llamada bloqueando el bucle, cada GET esperaba a la IA entera
+    assert max(latencies) < delay / 2
+
+
+def test_concurrency_cap(stub, monkeypatch):
+    monkeypatch.setattr(main, "ai_client", AIClient(base_url=stub(0.3), concurrency=2))
+
+    with TestClient(main.app) as client:
+        statuses = recommend_all(client, 6)
+
+    assert statuses == [200] * 6
+    assert StubOpenAI.max_in_flight == 2
+
+
+def test_timeout_returns_504(stub, monkeypatch):
+    monkeypatch.setattr(main, "ai_client", AIClient(base_url=stub(1.0), timeout=0.2, max_retries=0))
+
+    with TestClient(main.app) as client:
+        start = time.perf_counter()
+        response = client.post("/ai-recipe-recommender", json={"user_prompt": "Una stout seca"})
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 504
+    assert "no respondió a tiempo" in response.json()["detail"]
+    assert elapsed < 1.0
@@ -0,0 +1,50 @@
+"""ExtractionPool: tiempo máximo de un PDF repartido en tramos de páginas"""
+import asyncio
+import time
+
+import pytest
+
+import invoice_extraction
+from invoice_extraction import ExtractionPool, ExtractionTimeout
+
+PAGE_SECONDS = 0.5
+
+
+# De nivel de módulo: los procesos del pool las importan desde aquí
+def eight_pages(path):
+    return 8
+
+
+def slow_pages(path, first, last):
+    time.sleep(PAGE_SECONDS)
+    return f"{first}-{last}\n"
+
+
+@pytest.fixture
+def slow_pdf(monkeypatch):
+    monkeypatch.setattr(invoice_extraction, "pdf_page_count", eight_pages)
+    monkeypatch.setattr(invoice_extraction, "extract_pdf_pages", slow_pages)
+
+
+async def extract(pool):
+    try:
+        # Con progreso: 8 tramos de una página en 2 procesos, 4 rondas
+        return await pool.extract("factura.pdf", "factura.pdf", progress=lambda *args: None)
+    finally:
+        pool.close()
+
+
+def test_ranges_share_the_document_timeout(slow_pdf):
+    # Cada tramo cabe de sobra en el tiempo máximo; el documento entero no
+    pool = ExtractionPool(workers=2, timeout=3 * PAGE_SECONDS)
+
+    with pytest.raises(ExtractionTimeout):
+        asyncio.run(extract(pool))
+
+
+def test_document_within_timeout(slow_pdf):
+    pool = ExtractionPool(workers=2, timeout=30)
+
+    text = asyncio.run(extract(pool))
+
+    assert text.splitlines() == [f"{page}-{page + 1}" for page in range(8)]
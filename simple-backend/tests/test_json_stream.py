@@ -0,0 +1,37 @@
+"""JsonFieldStream con la respuesta de la IA cortada en trozos arbitrarios"""
+import json
+
+from json_stream import JsonFieldStream
+
+RESPONSE = {
+    "style_analysis": "Una IPA \"clara\" con lúpulo 🍺,\nsin \\ raros",
+    "abv": 6.5,
+    "hop_recommendations": [{"name": "Citra", "notes": "fruta, }"}],
+    "recipe": {"steps": [1, {"boil": 60}]},
+    "ready": True,
+}
+
+
+def feed_by(size, text):
+    stream = JsonFieldStream()
+    events = [event for i in range(0, len(text), size) for event in stream.feed(text[i:i + size])]
+    return stream, events
+
+
+def test_fields_and_partials_for_any_chunk_size():
+    for ensure_ascii in (True, False):
+        text = json.dumps(RESPONSE, ensure_ascii=ensure_ascii)
+        for size in range(1, 9):
+            stream, events = feed_by(size, text)
+
+            assert {key: value for kind, key, value in events if kind == "field"} == RESPONSE
+            partials = [value for kind, key, value in events if kind == "partial"]
+            assert partials and all(RESPONSE["style_analysis"].startswith(text) for text in partials)
+            assert stream.result() == RESPONSE
+
+
+def test_partial_holds_back_half_an_escape():
+    stream = JsonFieldStream()
+    assert stream.feed('{"style_analysis": "IPA \\u00') == [("partial", "style_analysis", "IPA ")]
+    assert stream.feed('e1 \\ud83c') == [("partial", "style_analysis", "IPA á ")]
+    assert stream.feed('\\udf7a"}') == [("field", "style_analysis", "IPA á 🍺")]
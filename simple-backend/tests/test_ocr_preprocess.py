@@ -0,0 +1,27 @@
+"""Recorte a la tabla de líneas del proveedor (table_region) en ocr_preprocess"""
+import random
+
+from bench_ocr import make_photo, print_page
+from invoice_parser import COCINISTA
+from ocr_preprocess import preprocess_image
+
+TEXT = "\n".join(f"Malta MALTA PALE ALE {i} - 25 KG ENTERA 33,75 € 10,00 % 37,13 € 2 74,25 €" for i in range(30))
+
+
+def test_region_drops_print_header_and_footer():
+    photo = make_photo(random.Random(1), print_page(TEXT))
+
+    full = preprocess_image(photo)
+    table = preprocess_image(photo, COCINISTA.table_region)
+
+    assert table.width == full.width
+    assert table.height < full.height * 0.95
+
+
+def test_region_that_would_cut_text_keeps_whole_page():
+    page = print_page(TEXT)
+    # Sin la cabecera ni el pie del navegador el corte caería sobre la tabla
+    body = page.crop((0, page.height // 30, page.width, page.height - page.height // 30))
+    photo = make_photo(random.Random(1), body)
+
+    assert preprocess_image(photo, COCINISTA.table_region).size == preprocess_image(photo).size
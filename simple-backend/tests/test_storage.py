@@ -0,0 +1,67 @@
+"""JournalStore: un save() con una compactación a medias no pierde datos"""
+import threading
+
+import pytest
+
+import storage
+from storage import JournalStore
+
+FULL_SAVE = [{"id": "malt_1", "name": "Pale Ale", "quantity": 25}]
+
+
+@pytest.fixture
+def writer_gate(monkeypatch):
+    """Las escrituras del hilo escritor esperan a gate.set(); las síncronas no"""
+    gate = threading.Event()
+    write = storage._atomic_write_json
+
+    def gated_write(path, data):
+        if threading.current_thread().name == "beergate-store-writer":
+            assert gate.wait(10)
+        write(path, data)
+
+    monkeypatch.setattr(storage, "_atomic_write_json", gated_write)
+    return gate
+
+
+def reopened(path):
+    store = JournalStore([path])
+    try:
+        return store.load(path)
+    finally:
+        store.close()
+
+
+def compact_soon(store, path):
+    """Dos puts con compact_every=2: la compactación queda en manos del hilo escritor"""
+    store.put(path, {"id": "malt_1", "name": "Pale Ale", "quantity": 1})
+    store.put(path, {"id": "malt_2", "name": "Pilsner", "quantity": 2})
+
+
+def test_save_drops_queued_compaction(tmp_path, writer_gate):
+    path = tmp_path / "inventory.json"
+    store = JournalStore([path], compact_every=2)
+    # El escritor se queda atascado con otro fichero: la compactación espera en cola
+    store.save(tmp_path / "other.json", [])
+    compact_soon(store, path)
+
+    store.save(path, FULL_SAVE)
+    writer_gate.set()
+    store.close()
+
+    assert reopened(path) == FULL_SAVE
+
+
+def test_save_after_compaction_in_progress(tmp_path, writer_gate):
+    path = tmp_path / "inventory.json"
+    store = JournalStore([path], compact_every=2)
+    compact_soon(store, path)
+
+    saver = threading.Thread(target=store.save, args=(path, FULL_SAVE))
+    saver.start()
+    saver.join(0.2)
+    writer_gate.set()
+    saver.join()
+    store.close()
+
+    assert reopened(path) == FULL_SAVE
@@ -0,0 +1,91 @@
+"""spool_upload no deja temporales a medias cuando la copia se corta"""
+import asyncio
+import io
+import tempfile
+import threading
+
+import pytest
+from fastapi import UploadFile
+
+import main
+from uploads import CHUNK_SIZE, UploadTooLarge, spool_upload
+
+
+class FailingSource(io.BytesIO):
+    """Un bloque bien y luego error de lectura (cliente que se desconecta)"""
+
+    def read(self, size=-1):
+        if self.tell():
+            raise OSError("conexión cortada")
+        return super().read(size)
+
+
+class BlockedSource(io.BytesIO):
+    """El segundo bloque no llega hasta release.set()"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size=-1):
+        if self.tell():
+            self.reading.set()
+            assert self.release.wait(10)
+        return super().read(size)
+
+
+def spool(source, tmp_path, max_bytes=10 * CHUNK_SIZE):
+    return spool_upload(UploadFile(file=source, filename="factura.pdf"), max_bytes, str(tmp_path))
+
+
+def test_spooled_file_removed_on_close(tmp_path):
+    upload = asyncio.run(spool(io.BytesIO(b"%PDF" * 10), tmp_path))
+    assert upload.size == 40 and list(tmp_path.iterdir())
+
+    with upload:
+        pass
+
+    assert not list(tmp_path.iterdir())
+
+
+def test_too_large_leaves_nothing(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool(io.BytesIO(b"x" * (2 * CHUNK_SIZE)), tmp_path, max_bytes=CHUNK_SIZE))
+
+    assert not list(tmp_path.iterdir())
+
+
+def test_read_error_leaves_nothing(tmp_path):
+    with pytest.raises(OSError):
+        asyncio.run(spool(FailingSource(b"x" * (2 * CHUNK_SIZE)), tmp_path))
+
+    assert not list(tmp_path.iterdir())
+
+
+def test_cancelled_request_leaves_nothing(tmp_path):
+    source = BlockedSource(b"x" * (2 * CHUNK_SIZE))
+
+    async def cancel_mid_copy():
+        task = asyncio.create_task(spool(source, tmp_path))
+        await asyncio.to_thread(source.reading.wait, 10)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # La copia termina en su hilo después de la cancelación
+        source.release.set()
+        while list(tmp_path.iterdir()):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(cancel_mid_copy(), 10))
+
+
+def test_failed_upload_removes_the_ones_already_spooled(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    files = [UploadFile(file=io.BytesIO(b"%PDF"), filename="buena.pdf"),
+             UploadFile(file=FailingSource(b"x" * (2 * CHUNK_SIZE)), filename="cortada.pdf")]
+
+    with pytest.raises(OSError):
+        asyncio.run(main.spool_invoices(files))
+
+    assert not list(tmp_path.iterdir())
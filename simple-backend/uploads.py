@@ -0,0 +1,93 @@
+"""
+Subidas de ficheros en streaming
+Cada UploadFile se copia por bloques a un temporal en disco, calculando el
+SHA-256 por el camino y cortando en cuanto supera el tamaño máximo: una
+factura escaneada de 40 MB no llega a estar entera en memoria, y los
+procesos de extracción la abren desde la ruta
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """El fichero subido supera el tamaño máximo"""
+
+
+class SpooledUpload:
+    """Fichero subido ya copiado a disco; se borra con close() (o al salir del with)"""
+
+    def __init__(self, filename: str, path: str, size: int, digest: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+    def close(self) -> None:
+        _remove(self.path)
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+async def spool_upload(upload: UploadFile, max_bytes: int, directory: Optional[str] = None) -> SpooledUpload:
+    """
+    Copia la subida a un temporal de `directory` (el de tempfile por
+    defecto). UploadTooLarge si pasa de max_bytes; si la copia falla o se
+    cancela la petición, el temporal a medias se borra.
+    """
+    # Lectura y escritura en un hilo: bloques de 1 MB sin parar el bucle de eventos
+    copy = asyncio.ensure_future(asyncio.to_thread(_copy, upload.file, max_bytes, directory))
+    try:
+        path, size, digest = await asyncio.shield(copy)
+    except asyncio.CancelledError:
+        # El hilo no se puede parar: el temporal se borra cuando termine
+        copy.add_done_callback(_remove_copied)
+        raise
+    return SpooledUpload(upload.filename, path, size, digest)
+
+
+def _copy(source, max_bytes: int, directory: Optional[str]):
+    fd, path = tempfile.mkstemp(dir=directory, prefix="beergate-upload-")
+    sha256 = hashlib.sha256()
+    size = 0
+    copied = False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            source.seek(0)
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"supera el tamaño máximo de {max_bytes / (1024 * 1024):g} MB")
+                sha256.update(chunk)
+                f.write(chunk)
+        copied = True
+    finally:
+        # Tamaño máximo, error de lectura o de disco: fuera el temporal a medias
+        if not copied:
+            _remove(path)
+    return path, size, sha256.hexdigest()
+
+
+def _remove_copied(copy: "asyncio.Future") -> None:
+    if not copy.cancelled() and copy.exception() is None:
+        _remove(copy.result()[0])
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass